@@ -1,12 +1,42 @@
+import time
+
+_IMPORT_STARTED = time.perf_counter()
+
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from app.routers import health, rag
+from app.routers import admin, health, metrics, rag
+from app.utils.concurrency import run_blocking
+from app.utils.vector_store import SNAPSHOT_POLL_SECONDS, snapshots
+from app.utils.warmup import readiness
+import asyncio
+import os
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    readiness.mark_imported(time.perf_counter() - _IMPORT_STARTED)
+    # Warm up in the background: the server accepts requests right away, and
+    # /health/ready reports 503 until the model and indexes are loaded.
+    warmup = None
+    if os.getenv("WARMUP", "true").lower() == "true":
+        warmup = asyncio.ensure_future(run_blocking(readiness.run, rag.warmup_steps()))
+    else:
+        readiness.skip()
+    # swap to index snapshots published by src/main.py --snapshot without a restart
+    snapshots.start_watching(SNAPSHOT_POLL_SECONDS)
+    yield
+    snapshots.stop_watching()
+    if warmup is not None and not warmup.done():
+        warmup.cancel()
+
 
 app = FastAPI(
     title="Role-Based RAG API",
     description="Role-based Retrieval-Augmented Generation backend",
     version="0.1.0",
     docs_url="/docs",
+    lifespan=lifespan,
 )
 
 app.add_middleware(
@@ -18,7 +48,9 @@ app.add_middleware(
 )
 
 # Register routers
+app.include_router(admin.router)
 app.include_router(health.router)
+app.include_router(metrics.router)
 app.include_router(rag.router)
 
 @app.get("/")
@@ -0,0 +1,58 @@
+from fastapi import APIRouter, Depends, Header, HTTPException
+from typing import Optional
+from app.utils.concurrency import run_blocking
+from app.utils.vector_store import snapshots
+import hmac
+import os
+
+# Admin endpoints require it in the X-Admin-Token header; without it they are disabled
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled; set ADMIN_TOKEN to enable them")
+    if x_admin_token is None or not hmac.compare_digest(x_admin_token.encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+
+router = APIRouter(
+    prefix="/admin",
+    tags=["Admin"],
+    dependencies=[Depends(require_admin)],
+)
+
+
+@router.get(
+    "/snapshots",
+    summary="Index snapshots",
+    description="The live index snapshot, swap counters, and every snapshot on disk.",
+)
+def list_index_snapshots():
+    return snapshots.stats()
+
+
+@router.post(
+    "/snapshots/reload",
+    summary="Reload the published snapshot",
+    description="Swap to the snapshot named in snapshots/CURRENT now instead of at the next poll.",
+)
+async def reload_snapshot():
+    swapped = await run_blocking(snapshots.refresh)
+    return {"swapped": swapped, **snapshots.stats()}
+
+
+@router.post(
+    "/snapshots/{name}/activate",
+    summary="Activate a snapshot",
+    description=(
+        "Warm up a finished snapshot, publish it and swap to it, e.g. to roll back to the "
+        "previous ingestion. Requests already running finish on the snapshot they started on."
+    ),
+)
+async def activate_snapshot(name: str):
+    try:
+        await run_blocking(snapshots.activate, name)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    return snapshots.stats()
@@ -1,5 +1,8 @@
 from fastapi import APIRouter
+from fastapi.responses import JSONResponse
 from datetime import datetime
+from app.utils.vector_store import load_state
+from app.utils.warmup import readiness
 
 router = APIRouter(
     prefix="/health",
@@ -15,5 +18,16 @@ def health_check():
     return {
         "status": "ok",
         "services": "role-based-rag-api",
+        "ready": readiness.ready,
         "timestamp": datetime.utcnow().isoformat() + "Z"
-    }
\ No newline at end of file
+    }
+
+@router.get(
+    "/ready",
+    summary="Readiness Check",
+    description="200 once the embedding model and indexes are loaded and warmed up, 503 before. "
+                "Reports what is loaded and how long startup took.",
+)
+def readiness_check():
+    body = {**readiness.status(), "loaded": load_state()}
+    return JSONResponse(body, status_code=200 if readiness.ready else 503)
@@ -0,0 +1,17 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from app.utils.metrics import registry
+
+router = APIRouter(
+    prefix="/metrics",
+    tags=["System"]
+)
+
+@router.get(
+    "",
+    summary="Prometheus metrics",
+    description="Request and per-stage latency histograms, cache, fallback and chunk counters in Prometheus text format.",
+    response_class=PlainTextResponse,
+)
+def metrics():
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
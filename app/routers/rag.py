@@ -1,16 +1,143 @@
+from contextlib import contextmanager
 from fastapi import APIRouter, HTTPException
-from app.schemas.rag import RAGQuery, RAGResponse
+from fastapi.responses import StreamingResponse
+from app.schemas.rag import RAGBatchQuery, RAGQuery, RAGResponse
 from app.services.rag_service import RAGService
-from app.utils.vector_store import collection
-from app.utils.llm import LLMClient
+from app.utils.vector_store import (
+    embedding_function, vector_store, query_embedding_cache, ingest_version, hr_table, lexical_index, search_service,
+    snapshots, role_access, access_registry, resolve,
+)
+from app.utils.cache import AnswerCache, SemanticCache
+from app.utils.batcher import QueryBatcher
+from app.utils.llm import llm_from_env
+from app.utils.metrics import REQUEST_SECONDS, labelled_role, registry, role_label
+from app.utils.reranker import CrossEncoderReranker
+from src.retrieval import ROLE_HIERARCHY
+import json
+import os
 
 router = APIRouter(
     prefix="/rag",
     tags=["RAG"]
 )
-llm = LLMClient(model="gemini-2.5-flash")
+# LLM_BACKEND=local swaps Gemini for an offline stand-in with configurable latency
+llm = llm_from_env()
+
+answer_cache = AnswerCache(
+    max_size=int(os.getenv("ANSWER_CACHE_SIZE", "1024")),
+    version_fn=ingest_version,
+    access_fn=role_access,
+)
+
+# Opt-in: paraphrase matching can conflate close questions (e.g. Q3 vs Q4), so tune the threshold first
+semantic_cache = None
+if os.getenv("SEMANTIC_CACHE_ENABLED", "false").lower() == "true":
+    semantic_cache = SemanticCache(
+        threshold=float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95")),
+        max_entries_per_role=int(os.getenv("SEMANTIC_CACHE_SIZE", "512")),
+        version_fn=ingest_version,
+        access_fn=role_access,
+    )
+
+# Opt-in: needs the cross-encoder model; over-budget requests keep the vector / fused order
+reranker = None
+if os.getenv("RERANK_ENABLED", "false").lower() == "true":
+    reranker = CrossEncoderReranker(
+        model_name=os.getenv("RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2"),
+        budget_ms=float(os.getenv("RERANK_BUDGET_MS", "150")),
+        max_candidates=int(os.getenv("RERANK_CANDIDATES", "20")),
+        min_score=float(os.environ["RERANK_MIN_SCORE"]) if os.getenv("RERANK_MIN_SCORE") else None,
+        max_pending=int(os.getenv("RERANK_MAX_PENDING", "1")),
+    )
+
+rag_service = RAGService(
+    vector_store,
+    llm,
+    embedder=query_embedding_cache,
+    answer_cache=answer_cache,
+    semantic_cache=semantic_cache,
+    hr_table=hr_table,
+    # HYBRID_SEARCH=false falls back to vector-only retrieval
+    lexical_index=lexical_index if os.getenv("HYBRID_SEARCH", "true").lower() == "true" else None,
+    min_lexical_match=float(os.getenv("HYBRID_MIN_LEXICAL_MATCH", "0.5")),
+    reranker=reranker,
+    context_token_budget=int(os.getenv("CONTEXT_TOKEN_BUDGET", "3000")),
+)
+
+# Coalesce concurrent searches; BATCH_MAX_WAIT_MS=0 turns batching off
+BATCH_MAX_WAIT_MS = float(os.getenv("BATCH_MAX_WAIT_MS", "2"))
+if BATCH_MAX_WAIT_MS > 0:
+    rag_service.batcher = QueryBatcher(
+        rag_service._search,
+        query_embedding_cache,
+        max_wait_ms=BATCH_MAX_WAIT_MS,
+        max_batch_size=int(os.getenv("BATCH_MAX_SIZE", "32")),
+        snapshots=snapshots,
+    )
 
-rag_service = RAGService(collection, llm)
+
+def warmup_steps():
+    """
+    Startup warm-up, in order: load the embedding model and embed once, open the vector
+    store and run one search, load the BM25 files, then the optional reranker and the
+    LLM tokenizer. Each step would otherwise run on the first request that needs it.
+    """
+    def search():
+        with snapshots.pin():
+            rag_service._search("Employee_Level", 1, query_texts=["warm up"])
+
+    steps = {
+        "embedding_model": lambda: embedding_function(["warm up"]),
+        "vector_store": search,
+    }
+    if rag_service.lexical_index is not None:
+        steps["bm25_index"] = lambda: rag_service.lexical_index.search(
+            "God_Tier_Admins", ROLE_HIERARCHY["God_Tier_Admins"], "warm up", 1
+        )
+    if reranker is not None:
+        steps["reranker"] = reranker.warm
+    steps["llm_tokenizer"] = lambda: llm.count_tokens("warm up")
+    return steps
+
+
+def _component_counters():
+    """
+    Totals the caches, LLM client and reranker already keep, exported on /metrics.
+    """
+    samples = []
+    caches = {"query_embeddings": query_embedding_cache, "answers": answer_cache, "semantic": semantic_cache}
+    for name, cache in caches.items():
+        if cache is None:
+            continue
+        stats = cache.stats()
+        samples.append(("rag_cache_hits_total", "Cache hits by cache.", {"cache": name}, stats["hits"]))
+        samples.append(("rag_cache_misses_total", "Cache misses by cache.", {"cache": name}, stats["misses"]))
+
+    llm_stats = llm.stats()
+    for event in ("calls", "failures", "retries", "timeouts", "hedges", "hedge_wins"):
+        samples.append(("rag_llm_events_total", "LLM client calls, failures, retries, timeouts and hedges.",
+                        {"event": event}, llm_stats[event]))
+
+    if reranker is not None:
+        samples.append(("rag_rerank_fallbacks_total", "Reranks that fell back to retrieval order.", {},
+                        reranker.fallbacks))
+    return samples
+
+
+registry.register_collector(_component_counters)
+
+
+@contextmanager
+def _request(endpoint: str, role: str, snapshot=None):
+    """
+    Serve the request from one index snapshot (the active one by default) and time it.
+    The role's metric label is looked up once, and every pipeline stage inside is
+    recorded under it.
+    """
+    with snapshots.pin(snapshot):
+        label = role_label(role, resolve(access_registry))
+        with labelled_role(label), REQUEST_SECONDS.time(endpoint=endpoint, role=label):
+            yield
 
 
 @router.post(
@@ -19,36 +146,92 @@ rag_service = RAGService(collection, llm)
     summary="Role-based RAG query",
     description="Retrieves and answers using only documents authorized for the selected role."
 )
-def query_rag(payload: RAGQuery):
+async def query_rag(payload: RAGQuery):
+    usage = {}
     try:
-        answer, sources, context_chunks = rag_service.answer(
-            role=payload.role,
-            query=payload.query,
-        )
-        final_answer = rag_service.generate_answer(
-            documents=context_chunks,
-            query=payload.query,
-        )
+        # the whole request reads one index snapshot, even if a newer one goes live meanwhile
+        with _request("query", payload.role):
+            final_answer, sources = await rag_service.aquery(
+                role=payload.role,
+                query=payload.query,
+                usage=usage,
+            )
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
     return RAGResponse(
         answer=final_answer,
-        sources=sources
+        sources=sources,
+        prompt_tokens=usage.get("prompt_tokens"),
     )
 
+@router.post(
+    "/query/stream",
+    summary="Streaming role-based RAG query",
+    description=(
+        "Same as /rag/query, streamed as NDJSON: a `sources` event once retrieval finishes, "
+        "`token` events as the answer is generated, then a `done` event."
+    ),
+)
+async def query_rag_stream(payload: RAGQuery):
+    snapshot = snapshots.current()
+
+    async def events():
+        try:
+            with _request("query_stream", payload.role, snapshot):
+                async for event in rag_service.astream_query(
+                    role=payload.role,
+                    query=payload.query,
+                ):
+                    yield json.dumps(event) + "\n"
+        except Exception as e:
+            # headers are already sent, so report failures in-band
+            yield json.dumps({"type": "error", "detail": str(e)}) + "\n"
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
+@router.post(
+    "/batch",
+    summary="Batch role-based RAG queries",
+    description=(
+        "Answers a list of (role, query) items. All queries are embedded together and searched "
+        "per role in one call. Results are streamed as NDJSON in completion order, one line per "
+        "item, each carrying the item's `index`. Items that fail carry an `error`."
+    ),
+)
+async def query_rag_batch(payload: RAGBatchQuery):
+    items = [(item.role, item.query) for item in payload.items]
+    snapshot = snapshots.current()
+
+    async def results():
+        try:
+            with snapshots.pin(snapshot), REQUEST_SECONDS.time(endpoint="batch", role="all"):
+                roles = resolve(access_registry)
+                async for result in rag_service.abatch(
+                    items,
+                    n_results=payload.n_results,
+                    max_concurrency=payload.max_concurrency,
+                    role_labels={role: role_label(role, roles) for role, _ in items},
+                ):
+                    yield json.dumps(result) + "\n"
+        except Exception as e:
+            yield json.dumps({"type": "error", "detail": str(e)}) + "\n"
+
+    return StreamingResponse(results(), media_type="application/x-ndjson")
+
 @router.post(
     "/fetch_docs",
     response_model=RAGResponse,
     summary="Role-based RAG query docs",
     description="Retrieves the documents for a given query and role without generating an answer."
 )
-def fetch_docs(payload: RAGQuery):
+async def fetch_docs(payload: RAGQuery):
     try:
-        answer, sources, context_chunks = rag_service.answer(
-            role=payload.role,
-            query=payload.query,
-        )
+        with _request("fetch_docs", payload.role):
+            answer, sources, context_chunks = await rag_service.aanswer(
+                role=payload.role,
+                query=payload.query,
+            )
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -57,3 +240,60 @@ def fetch_docs(payload: RAGQuery):
         sources=sources
     )
 
+
+@router.get(
+    "/cache/stats",
+    summary="Cache statistics",
+    description="Hit rates and sizes of the query-embedding, answer and semantic caches.",
+)
+def cache_stats():
+    return {
+        "query_embeddings": query_embedding_cache.stats(),
+        "answers": answer_cache.stats(),
+        "semantic": semantic_cache.stats() if semantic_cache is not None else None,
+    }
+
+
+@router.get(
+    "/batcher/stats",
+    summary="Query batcher statistics",
+    description="Batch-size histogram of the request-coalescing embedding/search batcher.",
+)
+def batcher_stats():
+    return rag_service.batcher.stats() if rag_service.batcher is not None else None
+
+
+@router.get(
+    "/reranker/stats",
+    summary="Reranker statistics",
+    description="How often the cross-encoder reranked within its latency budget, and its cost per pair.",
+)
+def reranker_stats():
+    return reranker.stats() if reranker is not None else None
+
+
+@router.get(
+    "/llm/stats",
+    summary="LLM client statistics",
+    description="Backend calls, retries, timeouts, hedged requests and p50/p99 latency.",
+)
+def llm_stats():
+    return llm.stats()
+
+
+@router.get(
+    "/context/stats",
+    summary="Context packing statistics",
+    description="Prompt tokens per request and how many retrieved tokens the context packer dropped or collapsed.",
+)
+def context_stats():
+    return {"token_budget": rag_service.context_token_budget, **rag_service.context_stats.stats()}
+
+
+@router.get(
+    "/search_service/stats",
+    summary="Search service statistics",
+    description="Calls and reconnects from this worker, and the shared search service's own counters.",
+)
+def search_service_stats():
+    return search_service.stats() if search_service is not None else None
@@ -1,10 +1,18 @@
-from pydantic import BaseModel
-from typing import List
+from pydantic import BaseModel, Field
+from typing import List, Optional
 
 class RAGQuery(BaseModel):
     role: str
     query: str
 
+class RAGBatchQuery(BaseModel):
+    items: List[RAGQuery]
+    n_results: int = Field(5, ge=1, le=50)
+    # items answered at the same time; the LLM client's own limit still applies on top
+    max_concurrency: int = Field(8, ge=1, le=64)
+
 class RAGResponse(BaseModel):
     answer: str
-    sources: List[str]
\ No newline at end of file
+    sources: List[str]
+    # tokens sent to the LLM for this answer; 0 when served from cache or without generation
+    prompt_tokens: Optional[int] = None
\ No newline at end of file
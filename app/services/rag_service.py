@@ -1,7 +1,15 @@
-from typing import List, Dict, Any, Tuple
+from typing import List, Dict, Any, Optional, Tuple, AsyncIterator
+import asyncio
+import hashlib
 import re
-from app.utils.vector_store import collection
-from app.utils.llm import LLMClient
+import time
+from app.utils.concurrency import run_blocking
+from app.utils.llm import LLMClient, estimate_tokens
+from app.utils.metrics import (
+    DROPPED_CHUNKS, FALLBACK_ANSWERS, OVERFETCH_WASTE, RETRIEVED_CHUNKS, labelled_role, stage,
+)
+from app.utils.packing import ContextStats, collapse_near_duplicates, pack_by_relevance, rank_relevance
+from app.utils.vector_store import access_registry, resolve, search_store
 
 
 def _clean_and_dedpe_docs(documents: List[str]) -> List[str]:
@@ -13,8 +21,8 @@ def _clean_and_dedpe_docs(documents: List[str]) -> List[str]:
         if not doc:
             continue
 
-        # normalize characters
-        normalized_doc = re.sub(r"\s+", " ", doc).strip()
+        # normalize whitespace
+        normalized_doc = " ".join(doc.split())
 
         # skip tiny or duplicate chunks
         if len(normalized_doc) < 20:
@@ -28,27 +36,13 @@ def _clean_and_dedpe_docs(documents: List[str]) -> List[str]:
     return cleaned
 
 
-def _build_bounded_context(documents: List[str], max_chars: int) -> str:
+def _build_context(documents: List[str]) -> str:
     """
-    Combine docs into a single context string without exceeding max_chars.
+    Combine the packed docs into a single numbered context string.
     :param documents:
-    :param max_chars:
     :return:
     """
-
-    parts = []
-    total = 0
-
-    for i, doc in enumerate(documents, start=1):
-        chunk = f"[Chunk {i}]\n{doc}\n"
-
-        if total + len(chunk) > max_chars:
-            break
-
-        parts.append(chunk)
-        total += len(chunk)
-
-    return "\n".join(parts).strip()
+    return "\n".join(f"[Chunk {i}]\n{doc}\n" for i, doc in enumerate(documents, start=1)).strip()
 
 
 def _prompt_engineering(context: str, query: str) -> str:
@@ -83,6 +77,35 @@ def _prompt_engineering(context: str, query: str) -> str:
     """.strip()
 
 
+def _stream_pieces(text: str, words_per_piece: int = 8) -> List[str]:
+    """
+    Split an already complete answer into small pieces (whitespace preserved) so it
+    can be streamed the same way as LLM tokens.
+    """
+    words = re.findall(r"\s*\S+\s*", text or "")
+    return [
+        "".join(words[i:i + words_per_piece])
+        for i in range(0, len(words), words_per_piece)
+    ]
+
+
+def _reciprocal_rank_fusion(result_lists: List[List[Dict[str, Any]]], k: int = 60) -> List[Dict[str, Any]]:
+    """
+    Merge ranked hit lists by summing 1 / (k + rank) per chunk; a chunk found by several
+    retrievers keeps the fields of each (vector distance, bm25 score). Each hit gets its
+    fused score as "rrf".
+    """
+    fused = {}
+    for hits in result_lists:
+        for rank, hit in enumerate(hits, start=1):
+            merged = fused.setdefault(hit["id"], {"rrf": 0.0})
+            merged.update({key: value for key, value in hit.items() if value is not None and key != "rrf"})
+            merged.setdefault("distance", None)
+            merged["rrf"] += 1.0 / (k + rank)
+
+    return sorted(fused.values(), key=lambda h: h["rrf"], reverse=True)
+
+
 def _tokenize(text: str) -> set:
     """
     Basic tokenizer into lowercase word set.
@@ -92,9 +115,56 @@ def _tokenize(text: str) -> set:
 
 
 class RAGService:
-    def __init__(self, vector_store, llm):
+    def __init__(self, vector_store, llm, embedder=None, answer_cache=None, semantic_cache=None, batcher=None,
+                 hr_table=None, lexical_index=None, reranker=None, context_token_budget=3000,
+                 min_lexical_match=0.5):
         self.vector_store = vector_store
         self.llm = llm
+        # prompt context is packed to this many LLM tokens, counted with the LLM's tokenizer when it has one
+        self.context_token_budget = context_token_budget
+        self.count_tokens = getattr(llm, "count_tokens", None) or estimate_tokens
+        self.context_stats = ContextStats()
+        # optional QueryEmbeddingCache; without it the vector store embeds query text itself
+        self.embedder = embedder
+        # optional AnswerCache / SemanticCache for the full query() pipeline
+        self.answer_cache = answer_cache
+        self.semantic_cache = semantic_cache
+        # optional QueryBatcher used by the async paths
+        self.batcher = batcher
+        # optional HRTable answering aggregate questions over employee records
+        self.hr_table = hr_table
+        # optional BM25Index fused with vector hits for exact-term queries
+        self.lexical_index = lexical_index
+        # share of the query's IDF mass (bm25_match) a chunk the vector search missed must match
+        self.min_lexical_match = min_lexical_match
+        # optional CrossEncoderReranker; candidates are over-fetched for it, then cut to n_results
+        self.reranker = reranker
+
+    def _search(
+        self,
+        role: str,
+        n_results: int,
+        query_texts: Optional[List[str]] = None,
+        query_embeddings: Optional[List[Any]] = None,
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        Run an authorized search against the configured store (see app.utils.vector_store.search_store).
+        """
+        if query_embeddings is not None:
+            query = {"query_embeddings": query_embeddings}
+        elif self.embedder is not None:
+            with stage("embed"):
+                query = {"query_embeddings": self.embedder.embed(query_texts)}
+        else:
+            query = {"query_texts": query_texts}
+
+        # the role filter is part of the Chroma where-clause, so it is timed with the query
+        store = resolve(self.vector_store)
+        with stage("vector_search"):
+            results = search_store(store, role, n_results, **query)
+
+        RETRIEVED_CHUNKS.inc(sum(len(hits) for hits in results), retriever="vector")
+        return results
 
     def answer(self, role: str, query: str, n_results: int = 5) -> Tuple[str, List[str], List[str]]:
         """
@@ -105,59 +175,379 @@ class RAGService:
         :param n_results: Number of results to return
         :return: Tuple of (context_text, list of sources)
         """
-        # Fetch more results than needed to filter by role
-        fetch_count = n_results * 5
+        context_text, sources, context_chunks, _ = self._retrieve_context(role, query, n_results)
+        return context_text, sources, context_chunks
+
+    def _retrieve_context(self, role: str, query: str, n_results: int) -> Tuple[str, List[str], List[str], List[str]]:
+        """
+        Same as answer(), plus the IDs of the chunks that made it into the context.
+        """
+        # Role filter is applied inside the vector store query, so every hit is authorized
+        n_candidates = self._n_candidates(n_results)
+        hits = self._search(role, n_candidates, query_texts=[query])[0]
+        hits = self._hybrid(role, query, hits, n_candidates)
+        if self.reranker is not None:
+            with stage("rerank"):
+                reranked = self.reranker.rerank(query, hits, n_results)
+            OVERFETCH_WASTE.inc(len(hits) - len(reranked))
+            hits = reranked
+        return self._context_from_hits(role, self._table_hits(role, query) + hits)
+
+    async def _aretrieve_context(self, role: str, query: str, n_results: int) -> Tuple[str, List[str], List[str], List[str]]:
+        """
+        Async _retrieve_context(): goes through the batcher when configured, so concurrent
+        requests share one embedding call and one search per role.
+        """
+        if self.batcher is None:
+            return await run_blocking(self._retrieve_context, role, query, n_results)
 
-        results = collection.query(
-            query_texts=[query],
-            n_results=fetch_count,
-            include=["documents", "metadatas", "distances"]
+        hits, table_hits = await asyncio.gather(
+            self.batcher.search(role, query, self._n_candidates(n_results)),
+            run_blocking(self._table_hits, role, query),
         )
+        return await self._acontext_from_hits(role, query, hits, table_hits, n_results)
+
+    async def _acontext_from_hits(
+        self, role: str, query: str, hits: List[Dict[str, Any]], table_hits: List[Dict[str, Any]], n_results: int,
+    ) -> Tuple[str, List[str], List[str], List[str]]:
+        """
+        The rest of _aretrieve_context() once the vector hits are in: BM25 fusion, reranking
+        and the context filter.
+        """
+        hits = self._hybrid(role, query, hits, self._n_candidates(n_results))
+        if self.reranker is not None:
+            with stage("rerank"):
+                reranked = await self.reranker.arerank(query, hits, n_results)
+            OVERFETCH_WASTE.inc(len(hits) - len(reranked))
+            hits = reranked
+        return self._context_from_hits(role, table_hits + hits)
+
+    def _n_candidates(self, n_results: int) -> int:
+        if self.reranker is None:
+            return n_results
+        return max(n_results, self.reranker.max_candidates)
+
+    def _hybrid(self, role: str, query: str, hits: List[Dict[str, Any]], n_results: int) -> List[Dict[str, Any]]:
+        """
+        Fuse vector hits with BM25 hits from the departments the role can read, using
+        reciprocal rank fusion, so exact terms (IDs like FINEMP1006, "PCI-DSS") are found
+        even when the embedding misses them.
+        """
+        if self.lexical_index is None:
+            return hits
 
-        documents = results.get("documents", [[]])[0]
-        metadatas = results.get("metadatas", [[]])[0]
-        distances = results.get("distances", [[]])[0]
+        with stage("lexical_search"):
+            lexical = self.lexical_index.search(role, resolve(access_registry).get(role, []), query, n_results)
+        RETRIEVED_CHUNKS.inc(len(lexical), retriever="bm25")
+        if not lexical:
+            return hits
 
-        if not documents:
+        fused = _reciprocal_rank_fusion([hits, lexical])[:n_results]
+        # chunks found by both retrievers, plus the ones fusion ranked past n_results
+        OVERFETCH_WASTE.inc(len(hits) + len(lexical) - len(fused))
+        return fused
+
+    def _table_hits(self, role: str, query: str) -> List[Dict[str, Any]]:
+        """
+        Aggregate HR questions ("average attendance by department") answered from the HR
+        table, as a hit ranked ahead of the vector search results. The table checks the
+        role itself, so roles without HR access get nothing.
+        """
+        if self.hr_table is None:
+            return []
+
+        with stage("hr_table"):
+            text = self.hr_table.answer(role, query)
+        if text is None:
+            return []
+
+        # the ID changes with the numbers, so cached answers built on older data are not reused
+        digest = hashlib.sha1(text.encode("utf-8")).hexdigest()[:16]
+        return [{
+            "id": f"hr_table_{digest}",
+            "document": text,
+            "metadata": {"source": "hr_data.csv", "department": "hr"},
+            "distance": 0.0,
+        }]
+
+    def _context_from_hits(self, role: str, hits: List[Dict[str, Any]]) -> Tuple[str, List[str], List[str], List[str]]:
+        with stage("context_filter"):
+            return self._filter_hits(role, hits)
+
+    def _filter_hits(self, role: str, hits: List[Dict[str, Any]]) -> Tuple[str, List[str], List[str], List[str]]:
+        if not hits:
             return (
                 "No information found for this query.",
-                [], []
+                [], [], []
             )
 
-        # Filter results based on role permissions
         context_chunks = []
+        chunk_ids = []
         sources = []
-        role_flag = f"role_{role}"
 
         MAX_DISTANCE = 0.5
-
-        for doc, meta, dist in zip(documents, metadatas, distances):
-            if MAX_DISTANCE < dist:
+        # the chunk both retrievers rank highest is kept even when neither cutoff alone passes it
+        top_fused = next((h["id"] for h in hits if "rrf" in h), None)
+
+        for hit in hits:
+            # reranked hits were already judged by the cross-encoder. Any other hit passes on
+            # its vector distance or, when the lexical search found it, on the share of the
+            # query it matched; a raw BM25 score would depend on query length and corpus size
+            if hit.get("rerank_score") is None and not self._relevant(hit, MAX_DISTANCE, top_fused):
+                DROPPED_CHUNKS.inc(reason="distance" if hit.get("bm25") is None else "lexical_match")
                 continue
-            # Check if user has access to this document
-            has_access = meta and meta.get(role_flag, False)
-
-            if has_access:
-                context_chunks.append(doc)
-                source = meta.get("source", "unknown")
-                if source not in sources:
-                    sources.append(source)
 
-                # Stop when we have enough results
-                if len(context_chunks) >= n_results:
-                    break
+            context_chunks.append(hit["document"])
+            chunk_ids.append(hit["id"])
+            source = hit["metadata"].get("source", "unknown")
+            if source not in sources:
+                sources.append(source)
 
         # Check if any accessible documents were found
         if not context_chunks:
             return (
                 f"No accessible information found for role '{role}' regarding this query.",
-                [], []
+                [], [], []
             )
 
         context_text = "\n\n".join(context_chunks)
 
+        return context_text, sources, context_chunks, chunk_ids
+
+    def _relevant(self, hit: Dict[str, Any], max_distance: float, top_fused: Optional[str]) -> bool:
+        if hit.get("distance") is not None and hit["distance"] <= max_distance:
+            return True
+        if hit.get("bm25") is None:
+            return False
+        if hit["id"] == top_fused and hit.get("distance") is not None:
+            return True
+        return hit.get("bm25_match", 0.0) >= self.min_lexical_match
+
+    def query(self, role: str, query: str, n_results: int = 5,
+              usage: Optional[Dict[str, Any]] = None) -> Tuple[str, List[str]]:
+        """
+        Full RAG pipeline: retrieve authorized context, then generate an answer.
+
+        Answers are cached per (role, query, retrieved chunk IDs) when an answer cache
+        is configured, so an identical question skips the LLM entirely. With a semantic
+        cache (which needs an embedder), close paraphrases of an answered question from
+        the same role also skip retrieval.
+
+        :param role: Role of the user making the query
+        :param query: The user's query
+        :param n_results: Number of chunks to retrieve
+        :param usage: Optional dict that receives "prompt_tokens" (0 when no prompt was sent)
+        :return: Tuple of (answer, list of sources)
+        """
+        if usage is not None:
+            usage["prompt_tokens"] = 0
+        query_embedding, cached = self._semantic_lookup(role, query)
+        if cached is not None:
+            return cached
+
+        _, sources, context_chunks, chunk_ids = self._retrieve_context(role, query, n_results)
+
+        cached = self._cached_answer(role, query, chunk_ids)
+        if cached is not None:
+            return cached, sources
+
+        started = time.perf_counter()
+        final_answer, generated, prompt_tokens = self._generate(context_chunks, query)
+        llm_seconds = time.perf_counter() - started
+        if usage is not None:
+            usage["prompt_tokens"] = prompt_tokens
+
+        if generated:
+            self._remember(role, query, query_embedding, chunk_ids, final_answer, sources, llm_seconds)
+
+        return final_answer, sources
+
+    async def aquery(self, role: str, query: str, n_results: int = 5,
+                     usage: Optional[Dict[str, Any]] = None) -> Tuple[str, List[str]]:
+        """
+        Async variant of query(): embedding and search run on the retrieval executor,
+        and the LLM call is awaited, so no worker thread is held during generation.
+        """
+        if usage is not None:
+            usage["prompt_tokens"] = 0
+        query_embedding, cached = None, None
+        if self.semantic_cache is not None:
+            query_embedding, cached = await run_blocking(self._semantic_lookup, role, query)
+        if cached is not None:
+            return cached
+
+        _, sources, context_chunks, chunk_ids = await self._aretrieve_context(role, query, n_results)
+        return await self._agenerate_for(role, query, query_embedding, sources, context_chunks, chunk_ids, usage)
+
+    async def _agenerate_for(self, role, query, query_embedding, sources, context_chunks, chunk_ids,
+                             usage: Optional[Dict[str, Any]]) -> Tuple[str, List[str]]:
+        """
+        The answer step of aquery(): the answer cache, then the LLM, then remembering the answer.
+        """
+        cached = self._cached_answer(role, query, chunk_ids)
+        if cached is not None:
+            return cached, sources
+
+        started = time.perf_counter()
+        final_answer, generated, prompt_tokens = await self._agenerate(context_chunks, query)
+        llm_seconds = time.perf_counter() - started
+        if usage is not None:
+            usage["prompt_tokens"] = prompt_tokens
+
+        if generated:
+            self._remember(role, query, query_embedding, chunk_ids, final_answer, sources, llm_seconds)
+
+        return final_answer, sources
+
+    async def abatch(self, items: List[Tuple[str, str]], n_results: int = 5,
+                     max_concurrency: int = 8,
+                     role_labels: Optional[Dict[str, str]] = None) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Answer many (role, query) pairs, yielding each result as soon as it is ready.
+
+        All queries are embedded in one call, and each role's queries go to the vector
+        store as one multi-query search. Semantic cache hits skip the search. After that,
+        at most max_concurrency items are in hybrid fusion, reranking or generation at
+        once, so a large batch cannot take every LLM slot from interactive traffic.
+
+        :param items: (role, query) pairs
+        :param n_results: Number of chunks to retrieve per query
+        :param max_concurrency: Items answered at the same time
+        :param role_labels: Metric label per role (app.utils.metrics.role_label); an item's
+            stages are labelled with its role's, or "all" without one
+        :return: Async iterator of {"index", "role", "query", "answer", "sources", "prompt_tokens"},
+            or {"index", "role", "query", "error"} for an item that failed, in completion order
+        """
+        queries = [query for _, query in items]
+        embeddings = None
+        if self.embedder is not None and queries:
+            embeddings = await run_blocking(self._embed_batch, queries)
+
+        role_labels = role_labels or {}
+        cached = [None] * len(items)
+        if self.semantic_cache is not None and embeddings is not None:
+            for i, (role, _) in enumerate(items):
+                with stage("semantic_cache", role_labels.get(role, "all")):
+                    cached[i] = self.semantic_cache.lookup(role, embeddings[i])
+
+        by_role = {}
+        for i, (role, _) in enumerate(items):
+            if cached[i] is None:
+                by_role.setdefault(role, []).append(i)
+
+        async def search(role: str, positions: List[int]):
+            if embeddings is not None:
+                query = {"query_embeddings": [embeddings[i] for i in positions]}
+            else:
+                query = {"query_texts": [queries[i] for i in positions]}
+            try:
+                with labelled_role(role_labels.get(role, "all")):
+                    return positions, await run_blocking(self._search, role, self._n_candidates(n_results), **query)
+            except Exception as e:
+                return positions, e
+
+        hits = [None] * len(items)
+        for positions, results in await asyncio.gather(*(search(r, p) for r, p in by_role.items())):
+            for pos, i in enumerate(positions):
+                hits[i] = results if isinstance(results, Exception) else results[pos]
+
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def answer(i: int) -> Dict[str, Any]:
+            role, query = items[i]
+            result = {"index": i, "role": role, "query": query}
+            if cached[i] is not None:
+                answer_text, sources = cached[i]
+                return {**result, "answer": answer_text, "sources": sources, "prompt_tokens": 0}
+
+            async with semaphore:
+                try:
+                    if isinstance(hits[i], Exception):
+                        raise hits[i]
+                    with labelled_role(role_labels.get(role, "all")):
+                        table_hits = await run_blocking(self._table_hits, role, query)
+                        _, sources, context_chunks, chunk_ids = await self._acontext_from_hits(
+                            role, query, hits[i], table_hits, n_results
+                        )
+                        usage = {"prompt_tokens": 0}
+                        query_embedding = embeddings[i] if self.semantic_cache is not None and embeddings is not None else None
+                        answer_text, sources = await self._agenerate_for(
+                            role, query, query_embedding, sources, context_chunks, chunk_ids, usage
+                        )
+                except Exception as e:
+                    return {**result, "error": str(e)}
+            return {**result, "answer": answer_text, "sources": sources, "prompt_tokens": usage["prompt_tokens"]}
+
+        tasks = [asyncio.ensure_future(answer(i)) for i in range(len(items))]
+        try:
+            for done in asyncio.as_completed(tasks):
+                yield await done
+        finally:
+            # the client went away: stop generating answers nobody will read
+            for task in tasks:
+                task.cancel()
+
+    def _embed_batch(self, queries: List[str]) -> List[Any]:
+        with stage("embed", "all"):
+            return self.embedder.embed(queries)
+
+    async def aanswer(self, role: str, query: str, n_results: int = 5) -> Tuple[str, List[str], List[str]]:
+        """
+        Async variant of answer(); retrieval runs on the retrieval executor or the batcher.
+        """
+        context_text, sources, context_chunks, _ = await self._aretrieve_context(role, query, n_results)
         return context_text, sources, context_chunks
 
+    def _semantic_lookup(self, role: str, query: str) -> Tuple[Any, Any]:
+        """
+        Return (query_embedding, cached (answer, sources) or None) from the semantic cache.
+        """
+        if self.semantic_cache is None or self.embedder is None:
+            return None, None
+
+        with stage("semantic_cache"):
+            query_embedding = self.embedder.embed([query])[0]
+            return query_embedding, self.semantic_cache.lookup(role, query_embedding)
+
+    def _cached_answer(self, role: str, query: str, chunk_ids: List[str]):
+        if self.answer_cache is None or not chunk_ids:
+            return None
+        return self.answer_cache.get(role, query, chunk_ids)
+
+    def _remember(self, role, query, query_embedding, chunk_ids, final_answer, sources, llm_seconds) -> None:
+        """
+        Store a freshly generated LLM answer; fallbacks and error messages are never passed here.
+        """
+        if not chunk_ids:
+            return
+        if self.answer_cache is not None:
+            self.answer_cache.put(role, query, chunk_ids, final_answer)
+        if query_embedding is not None:
+            self.semantic_cache.add(role, query_embedding, (final_answer, sources), llm_seconds)
+
+    def _begin_generation(
+        self, documents: List[str], query: str
+    ) -> Tuple[Optional[Tuple[str, bool, int]], List[str], str, int]:
+        """
+        Shared first half of _generate() and _agenerate(): build the prompt, or settle on
+        a fallback answer when there is nothing to send to the LLM.
+
+        :return: Tuple of (fallback, cleaned_docs, prompt, prompt_tokens); fallback is the
+                 (answer, generated, prompt_tokens) result to return as-is, or None when
+                 the LLM should be called with prompt
+        """
+        if not documents:
+            FALLBACK_ANSWERS.inc(reason="no_documents")
+            return ("No documents available to generate an answer.", False, 0), [], "", 0
+
+        cleaned_docs, prompt, prompt_tokens = self._prepare_prompt(documents, query)
+
+        if self.llm is None:
+            FALLBACK_ANSWERS.inc(reason="no_llm")
+            return (self._extractive_fallback_answer(cleaned_docs, query), False, 0), cleaned_docs, prompt, 0
+
+        return None, cleaned_docs, prompt, prompt_tokens
+
     def generate_answer(self, documents: List[str], query: str) -> str:
         """
         Generate an answer based on retrieved documents and the original query.
@@ -166,22 +556,145 @@ class RAGService:
         :param query: The user's original query
         :return: Generated answer
         """
-        if not documents:
-            return "No documents available to generate an answer."
+        return self._generate(documents, query)[0]
+
+    def _generate(self, documents: List[str], query: str) -> Tuple[str, bool, int]:
+        """
+        generate_answer(), plus whether the answer actually came from the LLM and the
+        number of prompt tokens sent to it.
+        """
+        fallback, cleaned_docs, prompt, prompt_tokens = self._begin_generation(documents, query)
+        if fallback is not None:
+            return fallback
 
-        cleaned_docs = _clean_and_dedpe_docs(documents)
-        context = _build_bounded_context(cleaned_docs, max_chars=12000)
+        try:
+            with stage("llm"):
+                return self.llm(prompt), True, prompt_tokens
+        except Exception as e:
+            return self._llm_error_answer(e, cleaned_docs, query), False, prompt_tokens
 
-        if self.llm is None:
-            return self._extractive_fallback_answer(cleaned_docs, query)
+    async def agenerate_answer(self, documents: List[str], query: str) -> str:
+        """
+        Async variant of generate_answer().
+        """
+        return (await self._agenerate(documents, query))[0]
 
-        prompt = _prompt_engineering(context=context, query=query)
+    async def _agenerate(self, documents: List[str], query: str) -> Tuple[str, bool, int]:
+        fallback, cleaned_docs, prompt, prompt_tokens = self._begin_generation(documents, query)
+        if fallback is not None:
+            return fallback
 
         try:
-            return self.llm(prompt)
+            with stage("llm"):
+                if hasattr(self.llm, "agenerate"):
+                    return await self.llm.agenerate(prompt), True, prompt_tokens
+                # plain callables have no async API; keep them off the event loop
+                return await asyncio.to_thread(self.llm, prompt), True, prompt_tokens
         except Exception as e:
-            fallback = self._extractive_fallback_answer(cleaned_docs, query)
-            return f"Error generating answer with LLM: {str(e)}\n\nFallback: {fallback}"
+            return self._llm_error_answer(e, cleaned_docs, query), False, prompt_tokens
+
+    async def astream_query(self, role: str, query: str, n_results: int = 5) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Streaming variant of aquery(). Yields, in order:
+        {"type": "sources", "sources": [...]} as soon as retrieval finishes,
+        {"type": "token", "text": "..."} for each piece of the answer as it arrives,
+        {"type": "done", "cached": bool, "prompt_tokens": int} at the end.
+
+        Cached, fallback and error answers are streamed in small pieces too, so the
+        client handles every answer the same way.
+        """
+        query_embedding, cached = None, None
+        if self.semantic_cache is not None:
+            query_embedding, cached = await run_blocking(self._semantic_lookup, role, query)
+        if cached is not None:
+            answer, sources = cached
+            yield {"type": "sources", "sources": sources}
+            for piece in _stream_pieces(answer):
+                yield {"type": "token", "text": piece}
+            yield {"type": "done", "cached": True, "prompt_tokens": 0}
+            return
+
+        _, sources, context_chunks, chunk_ids = await self._aretrieve_context(role, query, n_results)
+        yield {"type": "sources", "sources": sources}
+
+        cached = self._cached_answer(role, query, chunk_ids)
+        if cached is not None:
+            for piece in _stream_pieces(cached):
+                yield {"type": "token", "text": piece}
+            yield {"type": "done", "cached": True, "prompt_tokens": 0}
+            return
+
+        if not context_chunks or not hasattr(self.llm, "astream"):
+            started = time.perf_counter()
+            final_answer, generated, prompt_tokens = await self._agenerate(context_chunks, query)
+            if generated:
+                self._remember(role, query, query_embedding, chunk_ids, final_answer, sources,
+                               time.perf_counter() - started)
+            for piece in _stream_pieces(final_answer):
+                yield {"type": "token", "text": piece}
+            yield {"type": "done", "cached": False, "prompt_tokens": prompt_tokens}
+            return
+
+        cleaned_docs, prompt, prompt_tokens = self._prepare_prompt(context_chunks, query)
+        parts = []
+        started = time.perf_counter()
+        try:
+            # covers the whole stream, including time the client takes to read it
+            with stage("llm_stream"):
+                async for text in self.llm.astream(prompt):
+                    parts.append(text)
+                    yield {"type": "token", "text": text}
+        except Exception as e:
+            error_answer = self._llm_error_answer(e, cleaned_docs, query)
+            for piece in _stream_pieces(("\n\n" if parts else "") + error_answer):
+                yield {"type": "token", "text": piece}
+            yield {"type": "done", "cached": False, "prompt_tokens": prompt_tokens}
+            return
+
+        self._remember(role, query, query_embedding, chunk_ids, "".join(parts).strip(), sources,
+                       time.perf_counter() - started)
+        yield {"type": "done", "cached": False, "prompt_tokens": prompt_tokens}
+
+    def _prepare_prompt(self, documents: List[str], query: str) -> Tuple[List[str], str, int]:
+        """
+        Clean the retrieved chunks and build the LLM prompt from them.
+
+        Near-duplicate chunks are collapsed (SimHash), then the chunks worth the most
+        relevance per token are packed into context_token_budget (knapsack), so one
+        oversized chunk cannot crowd out several smaller relevant ones. Documents are
+        expected best-first, as retrieval returns them, and the best one is always kept
+        when it fits.
+        :return: Tuple of (cleaned_docs, prompt, prompt_tokens)
+        """
+        with stage("clean_dedupe"):
+            cleaned_docs = _clean_and_dedpe_docs(documents)
+            unique_docs, near_duplicates = collapse_near_duplicates(cleaned_docs)
+
+        with stage("context_build"):
+            token_counts = [self.count_tokens(doc) for doc in unique_docs]
+            # +8 covers the "[Chunk n]" header and separators around each chunk
+            chosen = pack_by_relevance([t + 8 for t in token_counts], rank_relevance(len(unique_docs)),
+                                       self.context_token_budget, pinned=1)
+            context = _build_context([unique_docs[i] for i in chosen])
+            prompt = _prompt_engineering(context=context, query=query)
+            prompt_tokens = self.count_tokens(prompt)
+
+        DROPPED_CHUNKS.inc(len(documents) - len(cleaned_docs), reason="duplicate")
+        DROPPED_CHUNKS.inc(near_duplicates, reason="near_duplicate")
+        DROPPED_CHUNKS.inc(len(unique_docs) - len(chosen), reason="token_budget")
+        self.context_stats.record(
+            prompt_tokens=prompt_tokens,
+            candidate_tokens=sum(self.count_tokens(doc) for doc in documents if doc),
+            context_tokens=sum(token_counts[i] for i in chosen),
+            near_duplicates=near_duplicates,
+            dropped_for_budget=len(unique_docs) - len(chosen),
+        )
+        return cleaned_docs, prompt, prompt_tokens
+
+    def _llm_error_answer(self, error: Exception, cleaned_docs: List[str], query: str) -> str:
+        FALLBACK_ANSWERS.inc(reason="llm_error")
+        fallback = self._extractive_fallback_answer(cleaned_docs, query)
+        return f"Error generating answer with LLM: {str(error)}\n\nFallback: {fallback}"
 
     def _extractive_fallback_answer(self, documents: List[str], query: str) -> str:
         """
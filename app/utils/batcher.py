@@ -0,0 +1,109 @@
+from collections import Counter
+from contextlib import nullcontext
+from typing import Any, Callable, Dict, List
+import asyncio
+from app.utils.concurrency import run_blocking
+from app.utils.metrics import current_role_label, labelled_role, stage
+
+
+class QueryBatcher:
+    """
+    Coalesces searches that arrive within max_wait_ms of each other (up to max_batch_size)
+    into one embedding call and one multi-query vector search per role in the batch.
+
+    search_fn(role, n_results, query_embeddings=...) must return one hit list per embedding,
+    like RAGService._search. Each caller gets back only its own role-filtered hits.
+
+    With snapshots (app.utils.vector_store.SnapshotManager), every caller is searched on
+    the index snapshot its request pinned, even when a swap lands between its queueing
+    and the batch running. Its search is also timed under its request's role label.
+    """
+
+    def __init__(self, search_fn: Callable, embedder, max_wait_ms: float = 2.0, max_batch_size: int = 32,
+                 snapshots=None):
+        self.search_fn = search_fn
+        self.embedder = embedder
+        self.snapshots = snapshots
+        self.max_wait_ms = max_wait_ms
+        self.max_batch_size = max_batch_size
+        self._pending = []
+        self._timer = None
+        self._tasks = set()
+        self.batch_sizes = Counter()
+
+    async def search(self, role: str, query: str, n_results: int) -> List[Dict[str, Any]]:
+        """
+        Queue one authorized search and wait for the batch it lands in to finish.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        snapshot = self.snapshots.active() if self.snapshots is not None else None
+        self._pending.append((role, query, n_results, snapshot, current_role_label(), future))
+
+        if len(self._pending) >= self.max_batch_size:
+            self._dispatch()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait_ms / 1000, self._dispatch)
+
+        return await future
+
+    def _dispatch(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        batch = self._pending[:self.max_batch_size]
+        self._pending = self._pending[self.max_batch_size:]
+        if self._pending:
+            self._timer = asyncio.get_running_loop().call_later(self.max_wait_ms / 1000, self._dispatch)
+        if not batch:
+            return
+
+        task = asyncio.ensure_future(self._run(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch) -> None:
+        self.batch_sizes[len(batch)] += 1
+        try:
+            results = await run_blocking(self._search_batch, batch)
+        except Exception as e:
+            for *_, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (*_, future), hits in zip(batch, results):
+            if not future.done():
+                future.set_result(hits)
+
+    def _search_batch(self, batch) -> List[List[Dict[str, Any]]]:
+        # one vectorized embedding call for every query in the batch
+        with stage("embed", "all"):
+            embeddings = self.embedder.embed([query for _, query, *_ in batch])
+
+        by_role = {}
+        for i, (role, _, _, snapshot, label, _) in enumerate(batch):
+            by_role.setdefault((snapshot, role, label), []).append(i)
+
+        results = [None] * len(batch)
+        for (snapshot, role, label), positions in by_role.items():
+            n_results = max(batch[i][2] for i in positions)
+            with self.snapshots.pin(snapshot) if snapshot is not None else nullcontext(), labelled_role(label):
+                hits = self.search_fn(role, n_results, query_embeddings=[embeddings[i] for i in positions])
+            for i, role_hits in zip(positions, hits):
+                results[i] = role_hits[:batch[i][2]]
+
+        return results
+
+    def stats(self) -> Dict[str, Any]:
+        batches = sum(self.batch_sizes.values())
+        queries = sum(size * count for size, count in self.batch_sizes.items())
+        return {
+            "max_wait_ms": self.max_wait_ms,
+            "max_batch_size": self.max_batch_size,
+            "batches": batches,
+            "queries": queries,
+            "mean_batch_size": queries / batches if batches else 0.0,
+            "batch_size_histogram": dict(sorted(self.batch_sizes.items())),
+        }
@@ -0,0 +1,263 @@
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+import re
+import threading
+import time
+import numpy as np
+
+
+def normalize_query(query: str) -> str:
+    """
+    Normalize query text for cache keys: lowercase and collapse whitespace.
+    The embedding model is uncased, so this does not change its output.
+    """
+    return re.sub(r"\s+", " ", query or "").strip().lower()
+
+
+class LRUCache:
+    """
+    Thread-safe, size-bounded LRU cache with an optional TTL and hit/miss counters.
+    """
+
+    def __init__(self, max_size: int = 1024, ttl_seconds: Optional[float] = None):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                value, stored_at = entry
+                if self.ttl_seconds is None or time.monotonic() - stored_at < self.ttl_seconds:
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+
+            self.misses += 1
+            return default
+
+    def put(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._data[key] = (value, time.monotonic())
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+class QueryEmbeddingCache:
+    """
+    Memoizes query embeddings on the normalized query text, so repeated
+    questions skip the sentence-transformer entirely.
+    """
+
+    def __init__(self, embedding_function, max_size: int = 2048, ttl_seconds: Optional[float] = 3600):
+        self.embedding_function = embedding_function
+        self._cache = LRUCache(max_size=max_size, ttl_seconds=ttl_seconds)
+
+    def embed(self, queries: List[str]) -> List[Any]:
+        """
+        Return one embedding per query, embedding all cache misses in a single call.
+        """
+        keys = [normalize_query(q) for q in queries]
+        embeddings = [self._cache.get(k) for k in keys]
+
+        missing = sorted({k for k, e in zip(keys, embeddings) if e is None})
+        if missing:
+            computed = dict(zip(missing, self.embedding_function(missing)))
+            for key, embedding in computed.items():
+                self._cache.put(key, embedding)
+            embeddings = [computed.get(k, e) if e is None else e for k, e in zip(keys, embeddings)]
+
+        return embeddings
+
+    def stats(self) -> Dict[str, Any]:
+        return self._cache.stats()
+
+
+class AnswerCache:
+    """
+    Caches generated answers keyed on (role, normalized query, retrieved chunk IDs).
+
+    The role is always part of the key so one role's answer is never served to
+    another. version_fn returns the ingest version of the index snapshot the request
+    reads, and it is part of the key too: requests still running on the previous
+    snapshot after a swap neither read nor overwrite the new snapshot's answers.
+    Entries of retired versions are never hit again and age out of the LRU.
+
+    access_fn(role) returns what the role may currently read (its access mask in the
+    role registry). It is part of the key, so after a role loses departments its
+    answers built from them are not served again; they age out like retired versions.
+    """
+
+    def __init__(self, max_size: int = 1024, version_fn=None, access_fn=None):
+        self._cache = LRUCache(max_size=max_size)
+        self._version_fn = version_fn
+        self._access_fn = access_fn
+        self._version = version_fn() if version_fn else None
+
+    def _key(self, role: str, query: str, chunk_ids: List[str]) -> Tuple:
+        version = self._version_fn() if self._version_fn is not None else None
+        self._version = version
+        access = self._access_fn(role) if self._access_fn is not None else None
+        return version, role, access, normalize_query(query), frozenset(chunk_ids)
+
+    def get(self, role: str, query: str, chunk_ids: List[str]) -> Optional[Any]:
+        return self._cache.get(self._key(role, query, chunk_ids))
+
+    def put(self, role: str, query: str, chunk_ids: List[str], value: Any) -> None:
+        self._cache.put(self._key(role, query, chunk_ids), value)
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self._cache.stats(), "version": self._version}
+
+
+class SemanticCache:
+    """
+    Per-role cache of answers looked up by query-embedding similarity, so paraphrases
+    of an answered question reuse its answer.
+
+    Each role keeps a fixed-size ring buffer of L2-normalized query embeddings; a lookup
+    is one vectorized dot product against that buffer. A stored answer is returned when
+    the best cosine similarity reaches threshold.
+
+    Buffers are kept per (ingest version, role), version_fn giving the version of the
+    snapshot the request reads. Requests finishing on the old snapshot after a swap
+    keep their own buffers; only the KEEP_VERSIONS most recent versions are kept.
+
+    A hit skips retrieval, so buffers are also keyed on access_fn(role), the role's
+    access mask: once a role is narrowed or removed in the role registry, it no longer
+    gets answers built from chunks it cannot read anymore.
+    """
+
+    HISTOGRAM_BINS = 20
+    KEEP_VERSIONS = 2
+
+    def __init__(self, threshold: float = 0.95, max_entries_per_role: int = 512, version_fn=None, access_fn=None):
+        self.threshold = threshold
+        self.max_entries_per_role = max_entries_per_role
+        self._version_fn = version_fn
+        self._access_fn = access_fn
+        self._version = version_fn() if version_fn else None
+        # version -> (role, access) -> ring buffer, oldest version first
+        self._versions = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.saved_llm_seconds = 0.0
+        # distribution of the best similarity seen on every lookup, in [0, 1]
+        self._similarity_counts = np.zeros(self.HISTOGRAM_BINS, dtype=np.int64)
+
+    @staticmethod
+    def _normalize(embedding) -> np.ndarray:
+        vec = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vec)
+        return vec / norm if norm else vec
+
+    def _role_key(self, role: str) -> Tuple[str, Any]:
+        return role, self._access_fn(role) if self._access_fn is not None else None
+
+    def _roles(self) -> Dict[Tuple[str, Any], Dict[str, Any]]:
+        version = self._version_fn() if self._version_fn is not None else None
+        roles = self._versions.get(version)
+        if roles is None:
+            roles = self._versions[version] = {}
+            self._version = version
+            while len(self._versions) > self.KEEP_VERSIONS:
+                self._versions.popitem(last=False)
+        return roles
+
+    def lookup(self, role: str, embedding) -> Optional[Any]:
+        """
+        Return the cached value for the most similar past query of this role, if close enough.
+        """
+        query = self._normalize(embedding)
+        key = self._role_key(role)
+        with self._lock:
+            entry = self._roles().get(key)
+            if entry is None or entry["count"] == 0:
+                self.misses += 1
+                return None
+
+            similarities = entry["vectors"][:entry["count"]] @ query
+            best = int(np.argmax(similarities))
+            similarity = float(similarities[best])
+
+            bin_index = min(int(max(similarity, 0.0) * self.HISTOGRAM_BINS), self.HISTOGRAM_BINS - 1)
+            self._similarity_counts[bin_index] += 1
+
+            if similarity < self.threshold:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self.saved_llm_seconds += entry["latencies"][best]
+            return entry["values"][best]
+
+    def add(self, role: str, embedding, value: Any, llm_seconds: float = 0.0) -> None:
+        """
+        Store a value for this role, overwriting the oldest entry once the buffer is full.
+
+        :param llm_seconds: how long generating value took, credited to saved_llm_seconds on every hit
+        """
+        vec = self._normalize(embedding)
+        key = self._role_key(role)
+        with self._lock:
+            roles = self._roles()
+            entry = roles.get(key)
+            if entry is None:
+                entry = {
+                    "vectors": np.zeros((self.max_entries_per_role, vec.shape[0]), dtype=np.float32),
+                    "values": [None] * self.max_entries_per_role,
+                    "latencies": [0.0] * self.max_entries_per_role,
+                    "count": 0,
+                    "next": 0,
+                }
+                roles[key] = entry
+
+            slot = entry["next"]
+            entry["vectors"][slot] = vec
+            entry["values"][slot] = value
+            entry["latencies"][slot] = llm_seconds
+            entry["next"] = (slot + 1) % self.max_entries_per_role
+            entry["count"] = min(entry["count"] + 1, self.max_entries_per_role)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        width = 1.0 / self.HISTOGRAM_BINS
+        return {
+            "threshold": self.threshold,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "saved_llm_seconds": round(self.saved_llm_seconds, 3),
+            "entries": {
+                role: entry["count"] for (role, _), entry in self._versions.get(self._version, {}).items()
+            },
+            "similarity_histogram": {
+                f"{i * width:.2f}-{(i + 1) * width:.2f}": int(count)
+                for i, count in enumerate(self._similarity_counts)
+            },
+            "version": self._version,
+        }
@@ -0,0 +1,26 @@
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import contextvars
+import functools
+import os
+
+# Dedicated pool for CPU-bound embedding and vector search, so these never queue
+# behind (or starve) FastAPI's default threadpool. Its size bounds how many searches
+# run at once; LLM calls are awaited on the event loop and are not limited by it.
+RETRIEVAL_WORKERS = int(os.getenv("RETRIEVAL_WORKERS", str(os.cpu_count() or 4)))
+
+retrieval_executor = ThreadPoolExecutor(
+    max_workers=RETRIEVAL_WORKERS,
+    thread_name_prefix="rag-retrieval",
+)
+
+
+async def run_blocking(fn, *args, **kwargs):
+    """
+    Run a blocking function on the retrieval executor without blocking the event loop.
+    It runs in a copy of the caller's context, so the request's pinned index snapshot
+    (app.utils.vector_store.SnapshotManager.pin) carries over to the worker thread.
+    """
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(retrieval_executor, functools.partial(context.run, fn, *args, **kwargs))
@@ -1,21 +1,418 @@
-from typing import Optional
+from collections import deque
+from typing import Any, AsyncIterator, Dict, Optional
+import asyncio
+import hashlib
 import os
-from google import genai
+import random
+import re
+import threading
+import time
+import httpx
 
-class LLMClient:
+
+def estimate_tokens(text: str) -> int:
     """
-    Generic LLM Client wrapper.
+    Rough LLM token count (~4 characters per token for English), used when no local
+    tokenizer is available.
+    """
+    return max(1, len(text or "") // 4)
+
+
+# HTTP statuses worth another attempt: request timeout, rate limit and transient server errors
+_RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+
+
+def _is_retryable(error: Exception) -> bool:
+    if isinstance(error, (TimeoutError, asyncio.TimeoutError, ConnectionError, httpx.TransportError)):
+        return True
+    return getattr(error, "code", None) in _RETRYABLE_STATUS
+
+
+class LLMBackend:
+    """
+    Interface of a text generation backend. LLMClient adds deadlines, retries,
+    concurrency limits and hedging on top, so backends only make single calls.
+    """
+    name = "base"
+
+    def generate(self, prompt: str, timeout_s: float) -> str:
+        raise NotImplementedError
+
+    async def agenerate(self, prompt: str, timeout_s: float) -> str:
+        raise NotImplementedError
+
+    def astream(self, prompt: str) -> AsyncIterator[str]:
+        raise NotImplementedError
+
+    def count_tokens(self, text: str) -> int:
+        return estimate_tokens(text)
+
+
+class GeminiBackend(LLMBackend):
+    """
+    Google Gemini through the google-genai SDK.
+
+    The SDK client is created on first use, so importing the app does not need
+    GEMINI_API_KEY. It is then shared by every call, and its HTTP connection pools
+    (sync and async) are reused instead of reconnecting per request.
     """
+    name = "gemini"
+
     def __init__(self, model: str, api_key: Optional[str] = None):
-        api_key = os.getenv('GEMINI_API_KEY')
-        if not api_key:
-            raise ValueError("GEMINI_API_KEY environment variable not set.")
         self.model = model
-        self.client = genai.Client(api_key=api_key)
+        self._api_key = api_key
+        self._client = None
+        self._client_lock = threading.Lock()
+        self._tokenizer = None
+        self._tokenizer_lock = threading.Lock()
 
-    def __call__(self, prompt: str) -> str:
+    @property
+    def client(self):
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    from google import genai
+
+                    api_key = self._api_key or os.getenv('GEMINI_API_KEY')
+                    if not api_key:
+                        raise ValueError("GEMINI_API_KEY environment variable not set.")
+                    self._client = genai.Client(api_key=api_key)
+        return self._client
+
+    @staticmethod
+    def _config(timeout_s: float):
+        from google.genai import types
+
+        # the SDK takes its HTTP timeout in milliseconds
+        return types.GenerateContentConfig(http_options=types.HttpOptions(timeout=int(timeout_s * 1000)))
+
+    def count_tokens(self, text: str) -> int:
+        """
+        Count prompt tokens locally with the SDK's tokenizer for this model, so context
+        packing never makes an API call. Falls back to estimate_tokens() when the
+        tokenizer is unavailable (it needs sentencepiece and a one-time download).
+        """
+        if self._tokenizer is None:
+            with self._tokenizer_lock:
+                if self._tokenizer is None:
+                    try:
+                        from google.genai.local_tokenizer import LocalTokenizer
+
+                        self._tokenizer = LocalTokenizer(model_name=self.model)
+                    except Exception:
+                        self._tokenizer = False
+
+        if self._tokenizer is False:
+            return estimate_tokens(text)
+        return self._tokenizer.count_tokens(text).total_tokens
+
+    def generate(self, prompt: str, timeout_s: float) -> str:
         response = self.client.models.generate_content(
             model=self.model,
-            contents=prompt
+            contents=prompt,
+            config=self._config(timeout_s),
         )
         return response.text.strip()
+
+    async def agenerate(self, prompt: str, timeout_s: float) -> str:
+        response = await self.client.aio.models.generate_content(
+            model=self.model,
+            contents=prompt,
+            config=self._config(timeout_s),
+        )
+        return response.text.strip()
+
+    async def astream(self, prompt: str) -> AsyncIterator[str]:
+        stream = await self.client.aio.models.generate_content_stream(
+            model=self.model,
+            contents=prompt
+        )
+        async for chunk in stream:
+            if chunk.text:
+                yield chunk.text
+
+
+_CHUNK_RE = re.compile(r"\[Chunk \d+\]\s*\n\s*(.+)")
+
+
+class LocalBackend(LLMBackend):
+    """
+    Offline stand-in for load tests: no network, no API key.
+
+    The answer is a deterministic function of the prompt (the first sentence of each
+    context chunk, as bullets). Latency is latency_ms plus uniform jitter, and a
+    tail_rate share of calls take tail_ms longer. The latencies come from a seeded
+    generator, so a run replays the same sequence.
+    """
+    name = "local"
+
+    def __init__(
+        self,
+        latency_ms: float = 300.0,
+        jitter_ms: float = 100.0,
+        tail_rate: float = 0.0,
+        tail_ms: float = 0.0,
+        tokens_per_second: float = 200.0,
+        seed: int = 0,
+    ):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.tail_rate = tail_rate
+        self.tail_ms = tail_ms
+        self.tokens_per_second = tokens_per_second
+        self._rng = random.Random(seed)
+        self._rng_lock = threading.Lock()
+
+    def _latency_s(self) -> float:
+        with self._rng_lock:
+            ms = self.latency_ms + self._rng.uniform(0, self.jitter_ms)
+            if self._rng.random() < self.tail_rate:
+                ms += self.tail_ms
+        return ms / 1000
+
+    @staticmethod
+    def _answer(prompt: str) -> str:
+        points = [match.split(". ")[0].strip().rstrip(".") for match in _CHUNK_RE.findall(prompt)[:3]]
+        if not points:
+            return "I don't have enough information in the provided documents."
+        digest = hashlib.sha1(prompt.encode("utf-8")).hexdigest()[:8]
+        return "\n".join([f"Based on the provided documents (local answer {digest}):", *(f"- {p}." for p in points)])
+
+    def generate(self, prompt: str, timeout_s: float) -> str:
+        latency = self._latency_s()
+        if latency > timeout_s:
+            time.sleep(timeout_s)
+            raise TimeoutError(f"local backend took longer than {timeout_s:.2f}s")
+        time.sleep(latency)
+        return self._answer(prompt)
+
+    async def agenerate(self, prompt: str, timeout_s: float) -> str:
+        await asyncio.sleep(self._latency_s())
+        return self._answer(prompt)
+
+    async def astream(self, prompt: str) -> AsyncIterator[str]:
+        # time to first token, then a steady token rate
+        await asyncio.sleep(self._latency_s())
+        for piece in re.findall(r"\s*\S+\s*", self._answer(prompt)):
+            yield piece
+            await asyncio.sleep(1 / self.tokens_per_second)
+
+
+class LLMClient:
+    """
+    Generic LLM Client wrapper.
+
+    Every attempt runs under a per-call deadline (timeout_s). Timeouts, connection
+    errors, 429s and 5xx responses are retried up to max_retries times with
+    exponential backoff and full jitter. At most max_concurrency calls run at once;
+    the rest wait for a slot. With hedge_after_ms set, an async call that has not
+    finished by then gets a second, identical request, and the first answer wins.
+    No hedge is sent while all slots are busy, so hedging never adds load under
+    saturation.
+    """
+
+    def __init__(
+        self,
+        backend: LLMBackend,
+        timeout_s: float = 30.0,
+        max_retries: int = 2,
+        max_concurrency: int = 16,
+        hedge_after_ms: Optional[float] = None,
+        backoff_base_s: float = 0.25,
+        backoff_max_s: float = 4.0,
+    ):
+        self.backend = backend
+        self.timeout_s = timeout_s
+        self.max_retries = max_retries
+        self.max_concurrency = max_concurrency
+        self.hedge_after_ms = hedge_after_ms
+        self.backoff_base_s = backoff_base_s
+        self.backoff_max_s = backoff_max_s
+        self._sync_slots = threading.BoundedSemaphore(max_concurrency)
+        self._async_slots = asyncio.Semaphore(max_concurrency)
+        self._lock = threading.Lock()
+        self._latencies_ms = deque(maxlen=2048)
+        self.calls = 0
+        self.failures = 0
+        self.retries = 0
+        self.timeouts = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    def count_tokens(self, text: str) -> int:
+        return self.backend.count_tokens(text)
+
+    def _backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.backoff_max_s, self.backoff_base_s * 2 ** attempt))
+
+    def _record(self, started: float, error: Optional[Exception] = None) -> None:
+        with self._lock:
+            self.calls += 1
+            if error is None:
+                self._latencies_ms.append((time.perf_counter() - started) * 1000)
+            else:
+                self.failures += 1
+
+    def _note_retry(self, error: Exception) -> None:
+        with self._lock:
+            self.retries += 1
+            if isinstance(error, (TimeoutError, asyncio.TimeoutError)):
+                self.timeouts += 1
+
+    def __call__(self, prompt: str) -> str:
+        started = time.perf_counter()
+        try:
+            with self._sync_slots:
+                for attempt in range(self.max_retries + 1):
+                    try:
+                        answer = self.backend.generate(prompt, self.timeout_s)
+                        break
+                    except Exception as e:
+                        if attempt == self.max_retries or not _is_retryable(e):
+                            raise
+                        self._note_retry(e)
+                        time.sleep(self._backoff(attempt))
+        except Exception as e:
+            self._record(started, e)
+            raise
+        self._record(started)
+        return answer
+
+    async def _attempt(self, prompt: str) -> str:
+        async with self._async_slots:
+            return await asyncio.wait_for(self.backend.agenerate(prompt, self.timeout_s), self.timeout_s)
+
+    async def _hedged(self, prompt: str) -> str:
+        first = asyncio.ensure_future(self._attempt(prompt))
+        pending = {first}
+        try:
+            if self.hedge_after_ms is not None:
+                done, _ = await asyncio.wait(pending, timeout=self.hedge_after_ms / 1000)
+                if not done and not self._async_slots.locked():
+                    with self._lock:
+                        self.hedges += 1
+                    pending.add(asyncio.ensure_future(self._attempt(prompt)))
+
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not first:
+                            with self._lock:
+                                self.hedge_wins += 1
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            # the loser, or every attempt if the caller was cancelled, gives its slot back
+            for task in pending:
+                task.cancel()
+
+    async def agenerate(self, prompt: str) -> str:
+        """
+        Non-blocking variant of __call__, so many requests can await the backend
+        concurrently on a single event loop.
+        """
+        started = time.perf_counter()
+        try:
+            for attempt in range(self.max_retries + 1):
+                try:
+                    answer = await self._hedged(prompt)
+                    break
+                except Exception as e:
+                    if attempt == self.max_retries or not _is_retryable(e):
+                        raise
+                    self._note_retry(e)
+                    await asyncio.sleep(self._backoff(attempt))
+        except Exception as e:
+            self._record(started, e)
+            raise
+        self._record(started)
+        return answer
+
+    async def astream(self, prompt: str) -> AsyncIterator[str]:
+        """
+        Yield answer text incrementally as the backend produces it. Waiting for any
+        single piece is bounded by timeout_s. A failed attempt is retried only if
+        nothing has been yielded yet, so the client never sees text twice. A stream
+        the consumer closes or cancels early gives its slot back and counts as failed.
+        """
+        started = time.perf_counter()
+        error = None
+        try:
+            async with self._async_slots:
+                for attempt in range(self.max_retries + 1):
+                    stream = self.backend.astream(prompt)
+                    yielded = False
+                    try:
+                        while True:
+                            try:
+                                piece = await asyncio.wait_for(stream.__anext__(), self.timeout_s)
+                            except StopAsyncIteration:
+                                return
+                            yielded = True
+                            yield piece
+                    except Exception as e:
+                        if yielded or attempt == self.max_retries or not _is_retryable(e):
+                            raise
+                        self._note_retry(e)
+                        await asyncio.sleep(self._backoff(attempt))
+                    finally:
+                        await stream.aclose()
+        except BaseException as e:
+            # GeneratorExit and CancelledError too: the consumer stopped before the end
+            error = e
+            raise
+        finally:
+            self._record(started, error)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            latencies = sorted(self._latencies_ms)
+
+        def percentile(p: float) -> Optional[float]:
+            return latencies[min(len(latencies) - 1, int(p * len(latencies)))] if latencies else None
+
+        return {
+            "backend": self.backend.name,
+            "max_concurrency": self.max_concurrency,
+            "timeout_s": self.timeout_s,
+            "hedge_after_ms": self.hedge_after_ms,
+            "calls": self.calls,
+            "failures": self.failures,
+            "retries": self.retries,
+            "timeouts": self.timeouts,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "p50_ms": percentile(0.50),
+            "p99_ms": percentile(0.99),
+        }
+
+
+def llm_from_env() -> LLMClient:
+    """
+    Build the LLM client from LLM_* environment variables. LLM_BACKEND=local selects
+    the offline stand-in (latency set by LOCAL_LLM_* variables).
+    """
+    backend_name = os.getenv("LLM_BACKEND", "gemini").lower()
+    if backend_name == "local":
+        backend = LocalBackend(
+            latency_ms=float(os.getenv("LOCAL_LLM_LATENCY_MS", "300")),
+            jitter_ms=float(os.getenv("LOCAL_LLM_JITTER_MS", "100")),
+            tail_rate=float(os.getenv("LOCAL_LLM_TAIL_RATE", "0")),
+            tail_ms=float(os.getenv("LOCAL_LLM_TAIL_MS", "0")),
+            seed=int(os.getenv("LOCAL_LLM_SEED", "0")),
+        )
+    elif backend_name == "gemini":
+        backend = GeminiBackend(model=os.getenv("LLM_MODEL", "gemini-2.5-flash"))
+    else:
+        raise ValueError(f"Unknown LLM_BACKEND: {backend_name}")
+
+    return LLMClient(
+        backend,
+        timeout_s=float(os.getenv("LLM_TIMEOUT_S", "30")),
+        max_retries=int(os.getenv("LLM_MAX_RETRIES", "2")),
+        max_concurrency=int(os.getenv("LLM_MAX_CONCURRENCY", "16")),
+        hedge_after_ms=float(os.environ["LLM_HEDGE_AFTER_MS"]) if os.getenv("LLM_HEDGE_AFTER_MS") else None,
+    )
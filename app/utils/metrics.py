@@ -0,0 +1,223 @@
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+import bisect
+import contextvars
+import threading
+import time
+
+# Seconds; spans range from sub-millisecond lookups to multi-second LLM calls
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Role label of the running request's stages; "all" for work shared by several roles
+_stage_role = contextvars.ContextVar("stage_role", default="all")
+
+
+def role_label(role: str, roles: Any) -> str:
+    """
+    Role as a metric label. Roles come from the request body, so roles that roles (a
+    role -> departments mapping such as the role registry) does not know are folded
+    into "unknown" to keep the number of series bounded.
+    """
+    return role if roles.get(role) is not None else "unknown"
+
+
+def current_role_label() -> str:
+    return _stage_role.get()
+
+
+@contextmanager
+def labelled_role(label: str) -> Iterator[None]:
+    """
+    Label every stage() inside the block with label (a role_label() result). Work handed
+    to run_blocking() and asyncio.to_thread() inherits it.
+    """
+    token = _stage_role.set(label)
+    try:
+        yield
+    finally:
+        _stage_role.reset(token)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """
+    Monotonic counter with labels, rendered as a Prometheus counter.
+    """
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        if amount <= 0:
+            return
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self) -> List[Tuple[str, Dict[str, str], float]]:
+        with self._lock:
+            items = list(self._values.items())
+        return [(self.name, dict(zip(self.labelnames, key)), value) for key, value in items]
+
+
+class Histogram:
+    """
+    Cumulative-bucket histogram with labels, rendered as a Prometheus histogram.
+    """
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [per-bucket counts (last one is +Inf), sum, count]
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels) -> None:
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        position = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][position] += 1
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, **labels) -> Iterator[None]:
+        """
+        Observe the wall-clock duration of the with-block, also when it raises.
+        """
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self) -> List[Tuple[str, Dict[str, str], float]]:
+        with self._lock:
+            items = [(key, (list(counts), total, n)) for key, (counts, total, n) in self._series.items()]
+
+        samples = []
+        for key, (counts, total, n) in items:
+            labels = dict(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                samples.append((f"{self.name}_bucket", {**labels, "le": _format_value(float(bound))}, cumulative))
+            samples.append((f"{self.name}_sum", labels, total))
+            samples.append((f"{self.name}_count", labels, n))
+        return samples
+
+
+class MetricsRegistry:
+    """
+    Holds the app's metrics and renders them in the Prometheus text format.
+
+    Components that already keep their own totals (caches, batcher, LLM client)
+    register a collector instead. A collector returns (name, help, labels, value)
+    counter samples read at scrape time, so nothing is counted twice.
+    """
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        metric = Counter(name, help, labelnames)
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        metric = Histogram(name, help, labelnames, buckets)
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def register_collector(self, collector: Callable[[], List[Tuple[str, str, Dict[str, str], float]]]) -> None:
+        with self._lock:
+            self._collectors.append(collector)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics)
+            collectors = list(self._collectors)
+
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+
+        collected = {}
+        for collector in collectors:
+            for name, help, labels, value in collector():
+                collected.setdefault(name, (help, []))[1].append((labels, value))
+        for name, (help, samples) in collected.items():
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} counter")
+            for labels, value in samples:
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+REQUEST_SECONDS = registry.histogram(
+    "rag_request_seconds", "End-to-end request latency by endpoint and role.", ("endpoint", "role"),
+)
+STAGE_SECONDS = registry.histogram(
+    "rag_stage_seconds", "Time spent in each stage of the RAG pipeline.", ("stage", "role"),
+)
+FALLBACK_ANSWERS = registry.counter(
+    "rag_fallback_answers_total", "Answers not produced by the LLM, by reason.", ("reason",),
+)
+RETRIEVED_CHUNKS = registry.counter(
+    "rag_retrieved_chunks_total", "Candidate chunks returned by each retriever.", ("retriever",),
+)
+DROPPED_CHUNKS = registry.counter(
+    "rag_dropped_chunks_total",
+    "Retrieved chunks that did not reach the prompt, by reason "
+    "(distance, lexical_match, duplicate, near_duplicate, token_budget).",
+    ("reason",),
+)
+OVERFETCH_WASTE = registry.counter(
+    "rag_overfetch_waste_chunks_total",
+    "Chunks fetched beyond n_results (for fusion or reranking) that were then discarded.",
+)
+
+
+def stage(name: str, label: Optional[str] = None):
+    """
+    Timing span for one pipeline stage: `with stage("embed"): ...`. It is labelled with
+    the role set by labelled_role(), unless label is given.
+    """
+    return STAGE_SECONDS.time(stage=name, role=label or _stage_role.get())
@@ -0,0 +1,141 @@
+from typing import Dict, List, Tuple
+import hashlib
+import math
+import re
+import threading
+import numpy as np
+
+_WORD_RE = re.compile(r"\w+")
+
+
+def simhash(text: str, shingle_size: int = 3) -> int:
+    """
+    64-bit SimHash of a text's word shingles; near-identical texts differ in few bits.
+    """
+    words = _WORD_RE.findall(text.lower())
+    if len(words) < shingle_size:
+        shingles = [" ".join(words)]
+    else:
+        shingles = [" ".join(words[i:i + shingle_size]) for i in range(len(words) - shingle_size + 1)]
+
+    digests = b"".join(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest() for s in shingles)
+    bits = np.unpackbits(np.frombuffer(digests, dtype=np.uint8)).reshape(len(shingles), 64)
+    # each bit is set when most shingles have it set
+    votes = bits.sum(axis=0) * 2 > len(shingles)
+    return int.from_bytes(np.packbits(votes).tobytes(), "big")
+
+
+def collapse_near_duplicates(documents: List[str], max_distance: int = 3) -> Tuple[List[str], int]:
+    """
+    Keep the first of every group of documents whose SimHashes are within max_distance
+    bits of each other. Documents are expected best-first, so the most relevant copy stays.
+
+    :return: Tuple of (kept documents, number collapsed)
+    """
+    kept = []
+    fingerprints = []
+    for doc in documents:
+        fingerprint = simhash(doc)
+        if any(bin(fingerprint ^ other).count("1") <= max_distance for other in fingerprints):
+            continue
+        kept.append(doc)
+        fingerprints.append(fingerprint)
+    return kept, len(documents) - len(kept)
+
+
+def rank_relevance(n: int) -> List[float]:
+    """
+    Relevance of the i-th best chunk (DCG discount), for chunks already ordered by the
+    retriever (vector distance, fused rank or cross-encoder score).
+    """
+    return [1.0 / math.log2(i + 2) for i in range(n)]
+
+
+def pack_by_relevance(
+    token_counts: List[int],
+    relevance: List[float],
+    budget: int,
+    granularity: int = 16,
+    pinned: int = 0,
+) -> List[int]:
+    """
+    Choose the chunks that maximize total relevance within a token budget (0/1 knapsack).
+
+    Unlike stopping at the first chunk that does not fit, a large chunk can be skipped
+    in favour of several smaller, later ones. Token counts are rounded up to multiples
+    of granularity to keep the table small, so the budget is never exceeded.
+
+    Positional relevance says little about how much better the first chunk is, and two
+    later chunks always outweigh it. The first pinned chunks are therefore taken as long
+    as they fit, and only the rest of the budget is packed.
+
+    :return: Indices of the chosen chunks, in their original order
+    """
+    weights = [math.ceil(t / granularity) for t in token_counts]
+    capacity = budget // granularity
+    if sum(weights) <= capacity:
+        return list(range(len(weights)))
+
+    taken = []
+    for i in range(min(pinned, len(weights))):
+        if weights[i] <= capacity:
+            taken.append(i)
+            capacity -= weights[i]
+    start = min(pinned, len(weights))
+
+    # best[c] = best relevance using capacity c; keep[i][c] records whether item i was taken
+    best = np.zeros(capacity + 1)
+    keep = np.zeros((len(weights), capacity + 1), dtype=bool)
+    for i in range(start, len(weights)):
+        w, v = weights[i], relevance[i]
+        if w > capacity:
+            continue
+        candidate = best[:capacity + 1 - w] + v
+        improved = candidate > best[w:]
+        keep[i, w:] = improved
+        best[w:] = np.where(improved, candidate, best[w:])
+
+    chosen = []
+    c = capacity
+    for i in range(len(weights) - 1, start - 1, -1):
+        if keep[i, c]:
+            chosen.append(i)
+            c -= weights[i]
+    return taken + sorted(chosen)
+
+
+class ContextStats:
+    """
+    Running totals of how much retrieved text reached the LLM prompt.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.prompts = 0
+        self.prompt_tokens = 0
+        self.candidate_tokens = 0
+        self.context_tokens = 0
+        self.near_duplicates = 0
+        self.dropped_for_budget = 0
+
+    def record(self, prompt_tokens: int, candidate_tokens: int, context_tokens: int,
+               near_duplicates: int, dropped_for_budget: int) -> None:
+        with self._lock:
+            self.prompts += 1
+            self.prompt_tokens += prompt_tokens
+            self.candidate_tokens += candidate_tokens
+            self.context_tokens += context_tokens
+            self.near_duplicates += near_duplicates
+            self.dropped_for_budget += dropped_for_budget
+
+    def stats(self) -> Dict[str, float]:
+        prompts = self.prompts or 1
+        return {
+            "prompts": self.prompts,
+            "mean_prompt_tokens": self.prompt_tokens / prompts,
+            "mean_candidate_tokens": self.candidate_tokens / prompts,
+            "mean_context_tokens": self.context_tokens / prompts,
+            "tokens_saved": self.candidate_tokens - self.context_tokens,
+            "near_duplicates_collapsed": self.near_duplicates,
+            "chunks_dropped_for_budget": self.dropped_for_budget,
+        }
@@ -0,0 +1,167 @@
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+import asyncio
+import threading
+import time
+
+
+class CrossEncoderReranker:
+    """
+    Re-orders retrieval candidates with a small CPU cross-encoder, scoring every
+    (query, chunk) pair of a request in one batched forward pass.
+
+    Each call has a latency budget. The batch size is capped from the observed cost
+    per pair, so a pass is expected to fit. If it still overruns, the candidates come
+    back in their original (vector / fused) order. The model loads lazily on the
+    reranker's own thread, so the first requests fall back instead of waiting for it.
+
+    Passes run one at a time. A request that finds max_pending passes already queued or
+    running falls back at once: it could only start after them and would overrun its
+    budget anyway. A pass that is still queued when its caller gives up is cancelled.
+    """
+
+    def __init__(
+        self,
+        model_name: str = "cross-encoder/ms-marco-MiniLM-L-6-v2",
+        budget_ms: float = 150.0,
+        max_candidates: int = 20,
+        min_score: Optional[float] = None,
+        batch_size: int = 32,
+        max_pending: int = 1,
+    ):
+        self.model_name = model_name
+        self.budget_ms = budget_ms
+        self.max_candidates = max_candidates
+        self.min_score = min_score
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+        self._model = None
+        self._model_lock = threading.Lock()
+        # one thread: forward passes are CPU-bound and would only contend with each other
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="rag-rerank")
+        # passes submitted and not finished yet (running or queued)
+        self._pending = 0
+        self._pending_lock = threading.Lock()
+        # running estimate of milliseconds per scored pair, updated after every pass
+        self._ms_per_pair = None
+        self.reranked = 0
+        self.fallbacks = 0
+        self.busy_fallbacks = 0
+        self.total_ms = 0.0
+
+    def _load(self):
+        with self._model_lock:
+            if self._model is None:
+                from sentence_transformers import CrossEncoder
+
+                self._model = CrossEncoder(self.model_name, device="cpu")
+        return self._model
+
+    def warm(self) -> None:
+        """
+        Load the model ahead of the first request.
+        """
+        self._load()
+
+    def _affordable(self, n: int) -> int:
+        if self._ms_per_pair is None:
+            return min(n, self.max_candidates)
+        return max(1, min(n, self.max_candidates, int(self.budget_ms / self._ms_per_pair)))
+
+    def _score(self, query: str, documents: List[str]) -> List[float]:
+        model = self._load()
+        started = time.perf_counter()
+        scores = model.predict([(query, doc) for doc in documents], batch_size=self.batch_size)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+
+        per_pair = elapsed_ms / max(len(documents), 1)
+        self._ms_per_pair = per_pair if self._ms_per_pair is None else 0.8 * self._ms_per_pair + 0.2 * per_pair
+        return [float(s) for s in scores]
+
+    def _done(self, _future: Future) -> None:
+        with self._pending_lock:
+            self._pending -= 1
+
+    def _submit(self, query: str, documents: List[str]) -> Optional[Future]:
+        """
+        Queue one forward pass, or return None when max_pending passes are already queued or running.
+        """
+        with self._pending_lock:
+            if self._pending >= self.max_pending:
+                self.busy_fallbacks += 1
+                return None
+            self._pending += 1
+        future = self._executor.submit(self._score, query, documents)
+        future.add_done_callback(self._done)
+        return future
+
+    def _apply(self, hits: List[Dict[str, Any]], scored: int, scores: Optional[List[float]], top_k: int) -> List[Dict[str, Any]]:
+        if scores is None:
+            self.fallbacks += 1
+            return hits[:top_k]
+
+        self.reranked += 1
+        head = [{**hit, "rerank_score": score} for hit, score in zip(hits[:scored], scores)]
+        head.sort(key=lambda h: h["rerank_score"], reverse=True)
+        if self.min_score is not None:
+            head = [h for h in head if h["rerank_score"] >= self.min_score]
+        # candidates that did not fit the budget keep their order behind the reranked ones
+        return (head + hits[scored:])[:top_k]
+
+    def rerank(self, query: str, hits: List[Dict[str, Any]], top_k: int) -> List[Dict[str, Any]]:
+        """
+        Return the top_k hits by cross-encoder score, or the first top_k in the given
+        order when the budget is exceeded or scoring fails.
+        """
+        if len(hits) <= 1:
+            return hits[:top_k]
+
+        scored = self._affordable(len(hits))
+        started = time.perf_counter()
+        future = self._submit(query, [h["document"] for h in hits[:scored]])
+        if future is None:
+            return self._apply(hits, scored, None, top_k)
+        try:
+            scores = future.result(timeout=self.budget_ms / 1000)
+        except Exception:
+            # over budget, or the model failed to load or score; a pass that has not started is dropped
+            future.cancel()
+            scores = None
+        self.total_ms += (time.perf_counter() - started) * 1000
+        return self._apply(hits, scored, scores, top_k)
+
+    async def arerank(self, query: str, hits: List[Dict[str, Any]], top_k: int) -> List[Dict[str, Any]]:
+        """
+        Async rerank(): the event loop waits on the forward pass without holding a thread.
+        """
+        if len(hits) <= 1:
+            return hits[:top_k]
+
+        scored = self._affordable(len(hits))
+        started = time.perf_counter()
+        future = self._submit(query, [h["document"] for h in hits[:scored]])
+        if future is None:
+            return self._apply(hits, scored, None, top_k)
+        try:
+            scores = await asyncio.wait_for(asyncio.wrap_future(future), timeout=self.budget_ms / 1000)
+        except Exception:
+            future.cancel()
+            scores = None
+        self.total_ms += (time.perf_counter() - started) * 1000
+        return self._apply(hits, scored, scores, top_k)
+
+    def stats(self) -> Dict[str, Any]:
+        calls = self.reranked + self.fallbacks
+        return {
+            "model": self.model_name,
+            "budget_ms": self.budget_ms,
+            "max_candidates": self.max_candidates,
+            "loaded": self._model is not None,
+            "reranked": self.reranked,
+            "fallbacks": self.fallbacks,
+            "busy_fallbacks": self.busy_fallbacks,
+            "pending": self._pending,
+            "fallback_rate": self.fallbacks / calls if calls else 0.0,
+            "mean_ms": self.total_ms / calls if calls else 0.0,
+            "ms_per_pair": self._ms_per_pair,
+        }
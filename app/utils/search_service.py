@@ -0,0 +1,300 @@
+import argparse
+import ipaddress
+import logging
+import os
+import stat
+import tempfile
+import threading
+import time
+from multiprocessing.connection import AuthenticationError, Client, Listener
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+# A Unix socket in a directory only this user can enter
+DEFAULT_ADDRESS = str(Path(tempfile.gettempdir()) / f"rag-search-{os.getuid()}" / "search.sock")
+
+
+def parse_address(address: str) -> Union[str, Tuple[str, int]]:
+    """
+    "host:port" -> a TCP address; anything else (e.g. "/run/rag/search.sock") is a Unix socket path.
+    """
+    host, sep, port = address.rpartition(":")
+    if sep and port.isdigit() and "/" not in address:
+        return host or "127.0.0.1", int(port)
+    return address
+
+
+def require_authkey(authkey: Optional[str]) -> bytes:
+    """
+    The shared secret both ends authenticate with. multiprocessing.connection unpickles
+    whatever an authenticated peer sends, so there is no default: a known key would let
+    anyone who reaches the socket run code in the service (and in the workers).
+    """
+    if not authkey:
+        raise ValueError("SEARCH_SERVICE_AUTHKEY must be set to a secret shared by the API workers and the search service")
+    return authkey.encode()
+
+
+def check_address(address: Union[str, Tuple[str, int]], allow_remote: bool = False) -> None:
+    """
+    Refuse addresses other hosts or local users could reach: TCP on a non-loopback
+    host unless allow_remote, and Unix sockets outside a directory private to this user.
+    """
+    if isinstance(address, tuple):
+        host = address[0]
+        try:
+            loopback = host == "localhost" or ipaddress.ip_address(host).is_loopback
+        except ValueError:
+            loopback = False
+        if not loopback and not allow_remote:
+            raise ValueError(
+                f"Search service address {host}:{address[1]} is not loopback; "
+                "set SEARCH_SERVICE_ALLOW_REMOTE=true to use it over the network"
+            )
+        return
+
+    directory = Path(address).parent
+    info = directory.stat()
+    if info.st_uid != os.getuid() or stat.S_IMODE(info.st_mode) & 0o077:
+        raise ValueError(
+            f"Search service socket directory {directory} must be owned by this user and closed to "
+            "others (mode 0700)"
+        )
+
+
+def allow_remote_from_env() -> bool:
+    return os.getenv("SEARCH_SERVICE_ALLOW_REMOTE", "false").lower() == "true"
+
+
+class SearchServiceClient:
+    """
+    Embeds queries and runs authorized searches in a separate search service process,
+    so API workers don't each load the embedding model and the index.
+
+    It can stand in for both the embedding function (called with a list of texts)
+    and the vector store (query(role, n_results, ...), like DepartmentRouter). A
+    query names the index snapshot the caller pinned, and the service searches that
+    one, so a request never mixes two snapshots. Each thread takes an idle
+    connection from a small pool. A call that finds its
+    connection dead (the service restarted) is retried once on a new connection,
+    since every operation is read-only.
+    """
+
+    def __init__(
+        self,
+        address: str,
+        authkey: str,
+        connect_timeout_s: float = 30.0,
+        request_timeout_s: float = 30.0,
+        allow_remote: bool = False,
+    ):
+        self.address = parse_address(address)
+        self.authkey = require_authkey(authkey)
+        self.allow_remote = allow_remote
+        self.connect_timeout_s = connect_timeout_s
+        self.request_timeout_s = request_timeout_s
+        self._idle = []
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.reconnects = 0
+
+    def _connect(self):
+        # the service may still be loading the model when workers start
+        deadline = time.monotonic() + self.connect_timeout_s
+        while True:
+            try:
+                check_address(self.address, self.allow_remote)
+                return Client(self.address, authkey=self.authkey)
+            except (FileNotFoundError, ConnectionRefusedError) as e:
+                if time.monotonic() >= deadline:
+                    raise ConnectionError(f"Search service not reachable at {self.address}") from e
+                time.sleep(0.1)
+
+    def _call(self, op: str, *args) -> Any:
+        with self._lock:
+            self.calls += 1
+        for attempt in range(2):
+            with self._lock:
+                conn = self._idle.pop() if self._idle else None
+            if conn is None:
+                conn = self._connect()
+
+            try:
+                conn.send((op, args))
+                ready = conn.poll(self.request_timeout_s)
+                reply = conn.recv() if ready else None
+            except (EOFError, OSError) as e:
+                conn.close()
+                if attempt:
+                    raise ConnectionError(f"Search service at {self.address} closed the connection") from e
+                with self._lock:
+                    self.reconnects += 1
+                continue
+
+            if reply is None:
+                # a late reply would be read by the next caller, so the connection is dropped
+                conn.close()
+                raise TimeoutError(f"Search service did not answer '{op}' within {self.request_timeout_s}s")
+
+            with self._lock:
+                self._idle.append(conn)
+            status, value = reply
+            if status == "error":
+                raise RuntimeError(f"Search service failed on '{op}': {value}")
+            return value
+
+    def __call__(self, input: List[str]) -> List[Any]:
+        return self._call("embed", list(input))
+
+    def query(
+        self,
+        role: str,
+        n_results: int,
+        query_texts: Optional[List[str]] = None,
+        query_embeddings: Optional[List[Any]] = None,
+        snapshot: Optional[str] = None,
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        Return the n_results closest authorized hits per query, searched by the service.
+
+        :param role: Role of the user making the query
+        :param n_results: Number of hits wanted per query
+        :param query_texts: Query strings, embedded by the service
+        :param query_embeddings: Precomputed query embeddings
+        :param snapshot: Name of the index snapshot to search (default: the service's live one)
+        :return: One list of hits per query, in the same shape as src.retrieval.query_authorized
+        """
+        return self._call("query", role, n_results, query_texts, query_embeddings, snapshot)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counters = {"calls": self.calls, "reconnects": self.reconnects, "idle_connections": len(self._idle)}
+        return {"address": str(self.address), **counters, "service": self._call("stats")}
+
+
+class SearchServer:
+    """
+    The search service: owns the embedding model and the vector store, and answers
+    SearchServiceClient calls. Each connection gets its own thread. The model and
+    the index release the GIL while computing, so requests from several workers
+    run in parallel. Queries are served from the snapshot the worker names (see
+    SnapshotManager.snapshot), not from whichever one the service has live.
+    """
+
+    def __init__(self, address: str, embedding_function, store, authkey: str, allow_remote: bool = False):
+        self.address = parse_address(address)
+        self.authkey = require_authkey(authkey)
+        self.allow_remote = allow_remote
+        self.embedding_function = embedding_function
+        self.store = store
+        self.requests = 0
+        self.errors = 0
+        self.connections = 0
+        self.started = time.time()
+        self._lock = threading.Lock()
+        self._ops = {
+            "embed": lambda texts: self.embedding_function(texts),
+            "query": self._query,
+            "stats": self.stats,
+        }
+
+    def _query(self, role, n_results, query_texts, query_embeddings, snapshot=None):
+        from app.utils.vector_store import resolve, search_store, snapshots
+
+        if query_embeddings is None:
+            query_embeddings = self.embedding_function(query_texts)
+        # store follows the pinned snapshot, so it is resolved inside the pin
+        with snapshots.pin(snapshots.snapshot(snapshot)):
+            return search_store(resolve(self.store), role, n_results, query_embeddings=query_embeddings)
+
+    def _count(self, counter: str) -> None:
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counters = {"connections": self.connections, "requests": self.requests, "errors": self.errors}
+        return {"pid": os.getpid(), "uptime_seconds": round(time.time() - self.started, 1), **counters}
+
+    def _handle(self, conn) -> None:
+        self._count("connections")
+        with conn:
+            while True:
+                try:
+                    op, args = conn.recv()
+                except (EOFError, OSError):
+                    return
+
+                self._count("requests")
+                try:
+                    reply = ("ok", self._ops[op](*args))
+                except Exception as e:
+                    self._count("errors")
+                    logger.exception(f"Search service request '{op}' failed")
+                    reply = ("error", f"{type(e).__name__}: {e}")
+
+                try:
+                    conn.send(reply)
+                except OSError:
+                    return
+
+    def serve_forever(self) -> None:
+        umask = None
+        if isinstance(self.address, str):
+            Path(self.address).parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+            check_address(self.address)
+            # a socket file left behind by a previous run blocks bind()
+            Path(self.address).unlink(missing_ok=True)
+            # the socket file is created 0600, with no window where others can connect
+            umask = os.umask(0o177)
+        else:
+            check_address(self.address, self.allow_remote)
+
+        try:
+            listener = Listener(self.address, authkey=self.authkey)
+        finally:
+            if umask is not None:
+                os.umask(umask)
+
+        with listener:
+            logger.info(f"Search service listening on {self.address}")
+            while True:
+                try:
+                    conn = listener.accept()
+                except (AuthenticationError, OSError) as e:
+                    logger.warning(f"Rejected search service connection: {e}")
+                    continue
+                threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve embeddings and vector search to the API workers")
+    parser.add_argument("--address", default=os.getenv("SEARCH_SERVICE_ADDRESS") or DEFAULT_ADDRESS,
+                        help="Unix socket path or host:port")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    authkey = os.getenv("SEARCH_SERVICE_AUTHKEY")
+    if not authkey:
+        parser.error("SEARCH_SERVICE_AUTHKEY must be set; the API workers need the same value")
+
+    # always the in-process resources, even when the API's SEARCH_SERVICE_ADDRESS is set
+    from app.utils.vector_store import (
+        SNAPSHOT_POLL_SECONDS, local_embedding_function, local_vector_store, resolve, search_store, snapshots,
+    )
+
+    started = time.perf_counter()
+    embedding_function = resolve(local_embedding_function)
+    search_store(resolve(local_vector_store), "Employee_Level", 1, query_embeddings=embedding_function(["warm up"]))
+    logger.info(f"Model and index loaded in {time.perf_counter() - started:.1f}s")
+    # follows newly published index snapshots like the API workers do
+    snapshots.start_watching(SNAPSHOT_POLL_SECONDS)
+
+    SearchServer(
+        args.address, embedding_function, local_vector_store, authkey=authkey, allow_remote=allow_remote_from_env(),
+    ).serve_forever()
+
+
+if __name__ == "__main__":
+    main()
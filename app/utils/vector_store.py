@@ -1,25 +1,551 @@
 import chromadb
-from chromadb.config import Settings
-from chromadb.utils import embedding_functions
+import contextvars
+import heapq
+import logging
 import os
+import threading
+import time
+from contextlib import contextmanager
 from dotenv import load_dotenv
 from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional
+from app.utils.cache import QueryEmbeddingCache
+from src.bm25 import BM25_DIR, BM25Index
+from src.hr_table import HR_TABLE_FILE, HRTable
+from src.quantized_index import QUANTIZED_DIR, QuantizedIndex
+from app.utils.search_service import SearchServiceClient, allow_remote_from_env, require_authkey
+from src.retrieval import (
+    ACCESS_FILE, ROLE_HIERARCHY, ROOT_DATA_DIR, RoleRegistry, embedding_model_loaded, get_embedding_function,
+    query_authorized,
+)
+from src.snapshots import SNAPSHOTS_DIR, current_snapshot, list_snapshots, publish_snapshot
 
 load_dotenv()
 
-ROOT_DATA_DIR = Path(os.getenv("ROOT_DATA_DIR"))
+logger = logging.getLogger(__name__)
+
+# ROOT_DATA_DIR comes from src.retrieval, so the API and ingestion agree on it (default: the repo's data/)
+# Served when no snapshot was ever published (src/main.py without --snapshot writes here in place)
 VECTOR_DB_DIR = ROOT_DATA_DIR / "chroma_db"
 COLLECTION_NAME = "corporate_documents"
+# written by src/ingest.py after every upsert
+INGEST_VERSION_FILE = "INGEST_VERSION"
 
-embedding_function = embedding_functions.SentenceTransformerEmbeddingFunction(
-    model_name="all-MiniLM-L6-v2"
-)
+# "single": one collection filtered by role; "partitioned": one collection per department;
+# "quantized": exact search over the memory-mapped int8/float16 matrix written by src/ingest.py
+VECTOR_STORE_MODE = os.getenv("VECTOR_STORE_MODE", "single")
 
-chroma_client = chromadb.PersistentClient(
-    path=str(VECTOR_DB_DIR)
-)
+# When set, embedding and vector search go to the search service at this address
+# (python -m app.utils.search_service) instead of being loaded in every API worker
+SEARCH_SERVICE_ADDRESS = os.getenv("SEARCH_SERVICE_ADDRESS")
+
+# How often workers check snapshots/CURRENT for a newly published index snapshot; 0 turns polling off
+SNAPSHOT_POLL_SECONDS = float(os.getenv("SNAPSHOT_POLL_SECONDS", "2"))
+
+
+class LazyResource:
+    """
+    Builds an expensive object (model, database client) on first use instead of at
+    import. Attribute access and calls are forwarded to it, and concurrent first
+    uses wait for a single build.
+    """
+
+    def __init__(self, factory: Callable[[], Any]):
+        self._factory = factory
+        self._value = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self._value is not None
+
+    def get(self) -> Any:
+        if self._value is None:
+            with self._lock:
+                if self._value is None:
+                    self._value = self._factory()
+        return self._value
 
-collection = chroma_client.get_or_create_collection(
-    name=COLLECTION_NAME,
-    embedding_function=embedding_function
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.get(), name)
+
+    def __call__(self, *args, **kwargs) -> Any:
+        return self.get()(*args, **kwargs)
+
+
+def resolve(resource: Any) -> Any:
+    """
+    The object behind a LazyResource (building it if needed), or resource itself.
+    """
+    return resource.get() if isinstance(resource, LazyResource) else resource
+
+
+# The sentence-transformer is shared with src/retrieval.py, so a process loads it once
+local_embedding_function = LazyResource(get_embedding_function)
+
+if SEARCH_SERVICE_ADDRESS:
+    # fail at startup, not on the first query, when the shared secret is missing
+    require_authkey(os.getenv("SEARCH_SERVICE_AUTHKEY"))
+    search_service = LazyResource(lambda: SearchServiceClient(
+        SEARCH_SERVICE_ADDRESS,
+        authkey=os.getenv("SEARCH_SERVICE_AUTHKEY"),
+        connect_timeout_s=float(os.getenv("SEARCH_SERVICE_CONNECT_TIMEOUT_S", "30")),
+        request_timeout_s=float(os.getenv("SEARCH_SERVICE_TIMEOUT_S", "30")),
+        allow_remote=allow_remote_from_env(),
+    ))
+    embedding_function = search_service
+else:
+    search_service = None
+    embedding_function = local_embedding_function
+
+# Shared across requests so repeated questions never reach the CPU model
+query_embedding_cache = QueryEmbeddingCache(
+    embedding_function,
+    max_size=int(os.getenv("EMBEDDING_CACHE_SIZE", "2048")),
+    ttl_seconds=float(os.getenv("EMBEDDING_CACHE_TTL_SECONDS", "3600")),
 )
+
+class DepartmentRouter:
+    """
+    Searches only the per-department collections a role can read and merges hits by distance.
+
+    Partitions are written by src/ingest.py::save_to_chromadb(partition_by_department=True)
+    as "<base_name>_<department>". Every chunk in a partition is readable by all roles
+    mapped to that department, so no metadata filter is needed.
+    """
+
+    def __init__(self, client, base_name: str, embedding_function, role_hierarchy):
+        self.client = client
+        self.base_name = base_name
+        self.embedding_function = embedding_function
+        self.role_hierarchy = role_hierarchy
+        self._collections = {}
+
+    def _collection(self, department: str):
+        if department not in self._collections:
+            self._collections[department] = self.client.get_or_create_collection(
+                name=f"{self.base_name}_{department}",
+                embedding_function=self.embedding_function,
+            )
+        return self._collections[department]
+
+    def departments_for(self, role: str) -> List[str]:
+        return self.role_hierarchy.get(role, [])
+
+    def query(
+        self,
+        role: str,
+        n_results: int,
+        query_texts: Optional[List[str]] = None,
+        query_embeddings: Optional[List[Any]] = None,
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        Return the n_results closest authorized hits per query across the role's departments.
+
+        :param role: Role of the user making the query
+        :param n_results: Number of hits wanted per query
+        :param query_texts: Query strings, embedded once and reused for every partition
+        :param query_embeddings: Precomputed query embeddings
+        :return: One list of hits per query, in the same shape as src.retrieval.query_authorized
+        """
+        if query_embeddings is None:
+            query_embeddings = self.embedding_function(query_texts)
+
+        merged = [[] for _ in query_embeddings]
+        for department in self.departments_for(role):
+            res = self._collection(department).query(
+                query_embeddings=query_embeddings,
+                n_results=n_results,
+                include=["documents", "metadatas", "distances"],
+            )
+            for q in range(len(query_embeddings)):
+                merged[q].extend(
+                    {"id": i, "document": d, "metadata": m or {}, "distance": dist}
+                    for i, d, m, dist in zip(
+                        res["ids"][q], res["documents"][q], res["metadatas"][q], res["distances"][q]
+                    )
+                )
+
+        return [heapq.nsmallest(n_results, hits, key=lambda h: h["distance"]) for hits in merged]
+
+
+class IndexSnapshot:
+    """
+    Everything the API reads from one Chroma directory: the vector store, the BM25
+    and HR files, the role registry and the ingest version stamp. Each is opened on
+    first use. A published snapshot directory is never written to again, so the
+    objects stay valid for as long as a request holds them.
+
+    Requests hold a snapshot by pinning it (acquire/release). Once a swap retires it
+    and the last pin is released, its Chroma client is closed. Chroma keeps every
+    client's system (with its loaded HNSW segments) in a process-wide cache until
+    then, so without this every swap would leak one.
+    """
+
+    def __init__(self, name: str, db_dir: Path):
+        self.name = name
+        self.db_dir = Path(db_dir)
+        self.opened_at = time.time()
+        self._pins = 0
+        self._retired = False
+        self._closed = False
+        self._pin_lock = threading.Lock()
+        self.access_registry = RoleRegistry(self.db_dir / ACCESS_FILE, default_roles=ROLE_HIERARCHY)
+        self.chroma_client = LazyResource(lambda: chromadb.PersistentClient(path=str(self.db_dir)))
+        self.collection = LazyResource(lambda: self.chroma_client.get_or_create_collection(
+            name=COLLECTION_NAME,
+            embedding_function=get_embedding_function(),
+        ))
+
+        if VECTOR_STORE_MODE == "partitioned":
+            self.vector_store = LazyResource(lambda: DepartmentRouter(
+                self.chroma_client.get(), COLLECTION_NAME, get_embedding_function(), self.access_registry
+            ))
+        elif VECTOR_STORE_MODE == "quantized":
+            self.vector_store = LazyResource(lambda: QuantizedIndex(
+                self.db_dir / QUANTIZED_DIR,
+                self.access_registry,
+                get_embedding_function(),
+                rescore_factor=int(os.getenv("QUANTIZED_RESCORE_FACTOR", "4")),
+            ))
+        else:
+            self.vector_store = self.collection
+
+        # Employee records loaded by src/ingest.py; aggregate HR questions are answered from this table
+        self.hr_table = HRTable(self.db_dir / HR_TABLE_FILE, registry=self.access_registry)
+        # Per-department BM25 indexes written by src/ingest.py, fused with vector hits
+        self.lexical_index = BM25Index(self.db_dir / BM25_DIR, registry=self.access_registry)
+        self._version = {"mtime_ns": None, "version": None}
+
+    @property
+    def version(self) -> str:
+        """
+        Version stamp of the last ingestion run into this directory ("" if none was recorded).
+        Only re-reads the stamp file when its mtime changes, so it is cheap per request.
+        """
+        path = self.db_dir / INGEST_VERSION_FILE
+        try:
+            mtime_ns = path.stat().st_mtime_ns
+        except FileNotFoundError:
+            return ""
+
+        if mtime_ns != self._version["mtime_ns"]:
+            self._version["version"] = path.read_text(encoding="utf-8").strip()
+            self._version["mtime_ns"] = mtime_ns
+        return self._version["version"]
+
+    @property
+    def pins(self) -> int:
+        return self._pins
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    def acquire(self) -> bool:
+        """
+        Pin the snapshot for one request. False once it is closed; pin something else then.
+        """
+        with self._pin_lock:
+            if self._closed:
+                return False
+            self._pins += 1
+            return True
+
+    def release(self) -> None:
+        with self._pin_lock:
+            self._pins -= 1
+            close = self._retired and self._pins == 0 and not self._closed
+            self._closed = self._closed or close
+        if close:
+            self._close()
+
+    def retire(self) -> None:
+        """
+        The snapshot is no longer live; close it as soon as no request pins it.
+        """
+        with self._pin_lock:
+            self._retired = True
+            close = self._pins == 0 and not self._closed
+            self._closed = self._closed or close
+        if close:
+            self._close()
+
+    def _close(self) -> None:
+        if self.chroma_client.loaded:
+            try:
+                # releases Chroma's cached system for this directory and stops it
+                self.chroma_client.get().close()
+            except Exception:
+                logger.exception(f"Closing the Chroma client of snapshot {self.name} failed")
+        logger.info(f"Closed index snapshot {self.name}")
+
+
+# The snapshot a request pinned; unset outside requests
+_pinned_snapshot = contextvars.ContextVar("pinned_snapshot", default=None)
+
+
+class SnapshotManager:
+    """
+    Holds the live IndexSnapshot and swaps it when ROOT_DATA_DIR/snapshots/CURRENT changes
+    (src/ingest.py::run_snapshot_ingestion) or an admin activates another snapshot.
+
+    A request pins the snapshot that is live when it starts (pin()). Everything it
+    reads through the module-level resources below then comes from that snapshot.
+    After a swap, running requests finish on the old snapshot and new ones start on
+    the new one. The new snapshot is opened and warmed before the swap, so no request
+    waits for it to load. Without any published snapshot, chroma_db/ is served.
+    """
+
+    def __init__(self, root: Path, legacy_dir: Path, warm: Optional[Callable[[IndexSnapshot], None]] = None):
+        self.root = Path(root)
+        self.legacy_dir = Path(legacy_dir)
+        self.warm = warm
+        self._lock = threading.Lock()
+        self._current = self._open(current_snapshot(self.root))
+        # retired snapshots still pinned by running requests
+        self._draining = []
+        # snapshots opened by name (snapshot()) before this process swapped to them
+        self._opened = {}
+        self._stop = None
+        self.swaps = 0
+        self.last_swap_at = None
+
+    def _open(self, name: Optional[str]) -> IndexSnapshot:
+        if name is None:
+            return IndexSnapshot(self.legacy_dir.name, self.legacy_dir)
+        return IndexSnapshot(name, self.root / name)
+
+    def current(self) -> IndexSnapshot:
+        return self._current
+
+    def active(self) -> IndexSnapshot:
+        """
+        The snapshot pinned by the running request, or the live one.
+        """
+        return _pinned_snapshot.get() or self._current
+
+    @contextmanager
+    def pin(self, snapshot: Optional[IndexSnapshot] = None) -> Iterator[IndexSnapshot]:
+        """
+        Serve everything inside the block from one snapshot (default: the active one).
+        Work handed to run_blocking() and asyncio.to_thread() inherits the pin. If the
+        given snapshot was closed in the meantime, the live one is pinned instead.
+        """
+        while True:
+            snapshot = snapshot or self.active()
+            if snapshot.acquire():
+                break
+            # retired and closed between being read and being pinned
+            snapshot = None
+        token = _pinned_snapshot.set(snapshot)
+        try:
+            yield snapshot
+        finally:
+            _pinned_snapshot.reset(token)
+            snapshot.release()
+
+    def snapshot(self, name: Optional[str]) -> IndexSnapshot:
+        """
+        The snapshot called name: the live one, one still draining, or a finished one
+        this process has not swapped to yet (opened now and kept until the next swap).
+        The search service uses it to serve exactly the snapshot each API worker
+        pinned. None, or a name that was pruned in the meantime, gives the live one.
+        """
+        with self._lock:
+            for snapshot in [self._current, *self._draining, *self._opened.values()]:
+                if snapshot.name == name and not snapshot.closed:
+                    return snapshot
+            if name == self.legacy_dir.name:
+                snapshot = self._open(None)
+            elif name is not None and any(s["name"] == name and s["finished"] for s in list_snapshots(self.root)):
+                snapshot = self._open(name)
+            else:
+                if name is not None:
+                    logger.warning(f"Snapshot '{name}' is not available; serving {self._current.name}")
+                return self._current
+            self._opened[name] = snapshot
+            return snapshot
+
+    def _take(self, name: Optional[str]) -> IndexSnapshot:
+        # reuses a snapshot snapshot() already opened instead of opening it twice
+        return self._opened.pop(name or self.legacy_dir.name, None) or self._open(name)
+
+    def _warm(self, snapshot: IndexSnapshot) -> IndexSnapshot:
+        if self.warm is not None:
+            try:
+                self.warm(snapshot)
+            except Exception:
+                snapshot.retire()
+                raise
+        return snapshot
+
+    def _swap(self, snapshot: IndexSnapshot) -> None:
+        previous, self._current = self._current, snapshot
+        retired = [previous, *self._opened.values()]
+        self._opened = {}
+        for old in retired:
+            old.retire()
+        self._draining = [s for s in self._draining + retired if not s.closed]
+        self.swaps += 1
+        self.last_swap_at = time.time()
+        logger.info(f"Swapped index snapshot {previous.name} -> {snapshot.name}")
+
+    def refresh(self) -> bool:
+        """
+        Swap to the snapshot CURRENT names if it is not the live one.
+
+        Returns:
+            True if a swap happened
+        """
+        with self._lock:
+            name = current_snapshot(self.root)
+            if (name or self.legacy_dir.name) == self._current.name:
+                return False
+            self._swap(self._warm(self._take(name)))
+            return True
+
+    def activate(self, name: str) -> IndexSnapshot:
+        """
+        Make a finished snapshot live: warm it, publish it in CURRENT (so other workers
+        follow), then swap. A snapshot that fails to warm up is not published.
+        """
+        with self._lock:
+            if name != self._current.name:
+                # a snapshot still being ingested must not be opened: Chroma would write to it
+                if not any(s["name"] == name and s["finished"] for s in list_snapshots(self.root)):
+                    raise ValueError(f"Snapshot '{name}' does not exist or did not finish")
+                snapshot = self._warm(self._take(name))
+                publish_snapshot(self.root, name)
+                self._swap(snapshot)
+            return self._current
+
+    def start_watching(self, interval_s: float) -> None:
+        """
+        Poll CURRENT every interval_s seconds in a daemon thread and swap when it changes.
+        """
+        if self._stop is not None or interval_s <= 0:
+            return
+        self._stop = threading.Event()
+
+        def watch(stop: threading.Event) -> None:
+            while not stop.wait(interval_s):
+                try:
+                    self.refresh()
+                except Exception:
+                    # CURRENT still names the new snapshot, so the next poll retries it
+                    logger.exception(f"Snapshot swap failed; still serving {self._current.name}")
+
+        threading.Thread(target=watch, args=(self._stop,), name="snapshot-watcher", daemon=True).start()
+
+    def stop_watching(self) -> None:
+        if self._stop is not None:
+            self._stop.set()
+            self._stop = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "live": self._current.name,
+            "version": self._current.version,
+            "swaps": self.swaps,
+            "last_swap_at": self.last_swap_at,
+            "watching": self._stop is not None,
+            "draining": {s.name: s.pins for s in self._draining if not s.closed},
+            "opened": {s.name: s.pins for s in self._opened.values()},
+            "snapshots": list_snapshots(self.root),
+        }
+
+
+class SnapshotResource(LazyResource):
+    """
+    One resource (by IndexSnapshot attribute name) of the caller's active snapshot.
+    Holders such as RAGService never keep a reference to a single snapshot's object,
+    so a swap needs no rewiring. Unlike LazyResource, the factory runs on every use:
+    the snapshot's own LazyResource does the caching.
+    """
+
+    def __init__(self, manager: SnapshotManager, name: str):
+        super().__init__(lambda: getattr(manager.active(), name))
+
+    @property
+    def loaded(self) -> bool:
+        value = self._factory()
+        return value.loaded if isinstance(value, LazyResource) else True
+
+    def get(self) -> Any:
+        return resolve(self._factory())
+
+
+def search_store(store: Any, role: str, n_results: int, registry: Optional[RoleRegistry] = None,
+                 **query) -> List[List[Dict[str, Any]]]:
+    """
+    Authorized search on whichever store is configured. Partitions, the quantized index
+    and the search service restrict by role themselves; a single collection is filtered
+    on the role's access bits (registry defaults to the active snapshot's). The search
+    service is told which snapshot is active, and searches that one.
+    """
+    if isinstance(store, SearchServiceClient):
+        return store.query(role, n_results, snapshot=snapshots.active().name, **query)
+    if isinstance(store, (DepartmentRouter, QuantizedIndex)):
+        return store.query(role, n_results, **query)
+    return query_authorized(store, role, n_results, registry=registry or resolve(access_registry), **query)
+
+
+def _warm_snapshot(snapshot: IndexSnapshot) -> None:
+    """
+    Open a snapshot's vector store and BM25 files with one dummy search each, before it goes live.
+    """
+    role = "God_Tier_Admins"
+    if search_service is None:
+        search_store(
+            resolve(snapshot.vector_store), role, 1,
+            registry=snapshot.access_registry,
+            query_embeddings=query_embedding_cache.embed(["warm up"]),
+        )
+    snapshot.lexical_index.search(role, snapshot.access_registry.get(role, []), "warm up", 1)
+
+
+snapshots = SnapshotManager(ROOT_DATA_DIR / SNAPSHOTS_DIR, VECTOR_DB_DIR, warm=_warm_snapshot)
+
+chroma_client = SnapshotResource(snapshots, "chroma_client")
+collection = SnapshotResource(snapshots, "collection")
+local_vector_store = SnapshotResource(snapshots, "vector_store")
+vector_store = search_service if search_service is not None else local_vector_store
+hr_table = SnapshotResource(snapshots, "hr_table")
+lexical_index = SnapshotResource(snapshots, "lexical_index")
+access_registry = SnapshotResource(snapshots, "access_registry")
+
+
+def ingest_version() -> str:
+    """
+    Ingest version of the active snapshot; caches key their entries on it.
+    """
+    return snapshots.active().version
+
+
+def role_access(role: str) -> int:
+    """
+    What the role may read in the active snapshot (its access mask); caches key their entries on it.
+    """
+    return resolve(access_registry).role_mask(role)
+
+
+def load_state() -> Dict[str, Any]:
+    """
+    Which of the lazily built resources are loaded, for the readiness check.
+    """
+    if search_service is not None:
+        return {
+            "snapshot": snapshots.current().name,
+            "search_service": search_service.loaded,
+            "bm25_index": lexical_index.available(),
+            "hr_table": hr_table.available(),
+        }
+    return {
+        "snapshot": snapshots.current().name,
+        "embedding_model": embedding_model_loaded(),
+        "chroma_client": chroma_client.loaded,
+        "vector_store": vector_store.loaded,
+        "bm25_index": lexical_index.available(),
+        "hr_table": hr_table.available(),
+    }
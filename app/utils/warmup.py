@@ -0,0 +1,61 @@
+from typing import Any, Callable, Dict, Optional
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class Readiness:
+    """
+    Startup progress of the API: how long imports took, the timing of each warm-up
+    step, and whether the service is ready for traffic.
+    """
+
+    def __init__(self):
+        self.ready = False
+        self.error: Optional[str] = None
+        self.import_seconds: Optional[float] = None
+        self.ready_after_seconds: Optional[float] = None
+        self.steps: Dict[str, float] = {}
+        self._started = None
+
+    def mark_imported(self, seconds: float) -> None:
+        self.import_seconds = round(seconds, 3)
+        self._started = time.perf_counter()
+
+    def run(self, steps: Dict[str, Callable[[], Any]]) -> None:
+        """
+        Run the warm-up steps in order. The service becomes ready only if all succeed;
+        a failed step is reported and the remaining ones still run.
+        """
+        for name, step in steps.items():
+            started = time.perf_counter()
+            try:
+                step()
+            except Exception as e:
+                logger.exception(f"Warm-up step '{name}' failed")
+                self.error = f"{name}: {e}"
+            self.steps[name] = round(time.perf_counter() - started, 3)
+
+        if self.error is None:
+            self.ready = True
+            if self._started is not None:
+                self.ready_after_seconds = round(time.perf_counter() - self._started, 3)
+            logger.info(f"Warm-up finished: {self.steps}")
+
+    def skip(self) -> None:
+        # no warm-up: resources load on the first request that needs them
+        self.ready = True
+        self.ready_after_seconds = 0.0
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "ready": self.ready,
+            "error": self.error,
+            "import_seconds": self.import_seconds,
+            "warmup_seconds": self.steps,
+            "ready_after_seconds": self.ready_after_seconds,
+        }
+
+
+readiness = Readiness()
@@ -0,0 +1,70 @@
+"""
+Parse throughput of src/extract.py on the data/*/*.md corpus, in MB/s.
+
+    python benchmarks/bench_extract.py --repeat 50
+    python benchmarks/bench_extract.py --baseline <git-rev>   # also time extract.py at that revision
+"""
+import argparse
+import importlib.util
+import json
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "src"))
+
+import extract  # noqa: E402
+
+
+def _load_extract_at(rev: str):
+    source = subprocess.run(
+        ["git", "show", f"{rev}:src/extract.py"],
+        cwd=ROOT, check=True, capture_output=True, text=True,
+    ).stdout
+    with tempfile.NamedTemporaryFile("w", suffix=".py", delete=False) as f:
+        f.write(source)
+    spec = importlib.util.spec_from_file_location(f"extract_{rev}", f.name)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def measure(parse, files, repeat: int) -> dict:
+    total_bytes = sum(p.stat().st_size for p in files) * repeat
+    sections = 0
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for path in files:
+            sections += len(parse(path))
+    elapsed = time.perf_counter() - started
+    return {
+        "files": len(files) * repeat,
+        "megabytes": round(total_bytes / 1e6, 3),
+        "sections": sections,
+        "seconds": round(elapsed, 4),
+        "mb_per_sec": round(total_bytes / 1e6 / elapsed, 2),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data-dir", type=Path, default=ROOT / "data")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--baseline", help="git revision whose src/extract.py to compare against")
+    args = parser.parse_args()
+
+    files = sorted(args.data_dir.glob("*/*.md"))
+    results = {"current": measure(extract.ingest_file, files, args.repeat)}
+    if args.baseline:
+        baseline = _load_extract_at(args.baseline)
+        results["baseline"] = {"rev": args.baseline, **measure(baseline.ingest_file, files, args.repeat)}
+        results["speedup"] = round(results["current"]["mb_per_sec"] / results["baseline"]["mb_per_sec"], 2)
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,321 @@
+"""
+Ingestion, retrieval and serving benchmark on a synthetic, scaled-up copy of data/.
+
+    python benchmarks/bench_rag.py --copies 660 --output results.json     # ~100k chunks
+    python benchmarks/bench_rag.py --workdir /tmp/bench --steps retrieval,serve --compare results.json
+
+Steps:
+  ingest     generate the corpus under <workdir>/data and run src/ingest.py's run_pipeline
+  retrieval  per-role query workload: embedding and authorized-search p50/p99, and
+             recall@k of the HNSW search against brute-force search over the same vectors,
+             and the same for the quantized index (VECTOR_STORE_MODE=quantized) if it was built
+  serve      POST /rag/query through the FastAPI test client with the local LLM stand-in
+
+Results are printed (or written to --output) as JSON together with the git revision,
+so runs on two commits can be compared with --compare.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+import numpy as np
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "src"))
+
+from synthetic import generate_corpus, generate_workload, parse_role_mix  # noqa: E402
+
+COLLECTION_NAME = "corporate_documents"
+
+
+def _git_revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, check=True,
+                              capture_output=True, text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def _latency_summary(seconds) -> dict:
+    ms = np.asarray(seconds) * 1000
+    if not len(ms):
+        return {"n": 0}
+    return {
+        "n": int(len(ms)),
+        "mean_ms": round(float(ms.mean()), 3),
+        "p50_ms": round(float(np.percentile(ms, 50)), 3),
+        "p90_ms": round(float(np.percentile(ms, 90)), 3),
+        "p99_ms": round(float(np.percentile(ms, 99)), 3),
+    }
+
+
+def run_ingest(workdir: Path, copies: int, seed: int, workers) -> dict:
+    data_dir = workdir / "data"
+    started = time.perf_counter()
+    files = generate_corpus(ROOT / "data", data_dir, copies, seed)
+    generated = time.perf_counter() - started
+
+    # ingest.py reads ROOT_DATA_DIR at import time
+    os.environ["ROOT_DATA_DIR"] = str(data_dir)
+    import ingest
+
+    started = time.perf_counter()
+    ingest.run_pipeline(workers=workers)
+    elapsed = time.perf_counter() - started
+
+    import chromadb
+
+    chunks = chromadb.PersistentClient(path=str(data_dir / "chroma_db")).get_collection(COLLECTION_NAME).count()
+    return {
+        "copies": copies,
+        "files": sum(files.values()),
+        "chunks": chunks,
+        "generate_seconds": round(generated, 3),
+        "ingest_seconds": round(elapsed, 3),
+        "chunks_per_sec": round(chunks / elapsed, 1) if elapsed else None,
+    }
+
+
+def _load_vectors(collection, page_size: int = 5000):
+    ids, vectors, metadatas = [], [], []
+    offset = 0
+    while True:
+        page = collection.get(include=["embeddings", "metadatas"], limit=page_size, offset=offset)
+        if not page["ids"]:
+            break
+        ids.extend(page["ids"])
+        vectors.append(np.asarray(page["embeddings"], dtype=np.float32))
+        metadatas.extend(page["metadatas"])
+        offset += len(page["ids"])
+    matrix = np.vstack(vectors) if vectors else np.zeros((0, 0), dtype=np.float32)
+    matrix /= np.linalg.norm(matrix, axis=1, keepdims=True) + 1e-12
+    return ids, matrix, metadatas
+
+
+def _headings(metadatas) -> dict:
+    """
+    Distinct section headings per department, used to vary the query workload.
+    """
+    by_department = {}
+    for metadata in metadatas:
+        heading = metadata.get("sub_hierarchy")
+        if heading and heading != "N/A":
+            by_department.setdefault(metadata.get("department"), set()).add(heading.split(" > ")[-1])
+    return {department: sorted(values) for department, values in by_department.items()}
+
+
+def run_retrieval(workdir: Path, n_queries: int, k: int, role_mix_spec: str, seed: int) -> dict:
+    os.environ["ROOT_DATA_DIR"] = str(workdir / "data")
+    import chromadb
+    from chromadb.utils import embedding_functions
+    from chunker import EMBEDDING_MODEL
+    from quantized_index import QUANTIZED_DIR, QuantizedIndex, collection_space, similarity_to_distance
+    from retrieval import ROLE_HIERARCHY, access_registry, query_authorized
+
+    embedder = embedding_functions.SentenceTransformerEmbeddingFunction(model_name=EMBEDDING_MODEL)
+    collection = chromadb.PersistentClient(path=str(workdir / "data" / "chroma_db")).get_collection(COLLECTION_NAME)
+
+    started = time.perf_counter()
+    ids, matrix, metadatas = _load_vectors(collection)
+    space = collection_space(collection)
+    load_seconds = time.perf_counter() - started
+    access_masks = [m.get("access_mask", 0) for m in metadatas]
+    role_masks = {role: access_registry.allowed(role, access_masks) for role in ROLE_HIERARCHY}
+
+    role_mix = parse_role_mix(role_mix_spec, ROLE_HIERARCHY)
+    workload = generate_workload(ROLE_HIERARCHY, _headings(metadatas), n_queries, role_mix, seed)
+
+    quantized = QuantizedIndex(workdir / "data" / "chroma_db" / QUANTIZED_DIR, access_registry)
+    quantized = quantized if quantized.available() else None
+
+    embed_seconds, search_seconds, brute_seconds, quantized_seconds = [], [], [], []
+    per_role = {}
+    recalls, quantized_recalls = [], []
+    for role, query in workload:
+        started = time.perf_counter()
+        embedding = np.asarray(embedder([query])[0], dtype=np.float32)
+        embed_seconds.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        hits = query_authorized(collection, role, k, query_embeddings=[embedding.tolist()])[0]
+        elapsed = time.perf_counter() - started
+        search_seconds.append(elapsed)
+        per_role.setdefault(role, []).append(elapsed)
+
+        # exact cosine search over the same vectors and role mask
+        if quantized is not None:
+            started = time.perf_counter()
+            quantized_hits = quantized.query(role, k, query_embeddings=[embedding])[0]
+            quantized_seconds.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        # in the collection's distance space, as Chroma and the quantized index report it
+        distances = similarity_to_distance(matrix @ (embedding / (np.linalg.norm(embedding) + 1e-12)), space)
+        distances[~role_masks[role]] = np.inf
+        top = np.argpartition(distances, min(k, len(distances) - 1))[:k]
+        exact = sorted(distances[top][np.isfinite(distances[top])])
+        brute_seconds.append(time.perf_counter() - started)
+
+        if exact:
+            # a hit tied with the k-th exact distance counts (synthetic copies can be near-identical)
+            cutoff = exact[-1] + 1e-5
+            found = sum(1 for h in hits if h["distance"] is not None and h["distance"] <= cutoff)
+            recalls.append(min(found, len(exact)) / len(exact))
+            if quantized is not None:
+                found = sum(1 for h in quantized_hits if h["distance"] <= cutoff)
+                quantized_recalls.append(min(found, len(exact)) / len(exact))
+
+    return {
+        "chunks": len(ids),
+        "queries": len(workload),
+        "k": k,
+        "role_mix": role_mix,
+        "load_vectors_seconds": round(load_seconds, 3),
+        "embed": _latency_summary(embed_seconds),
+        "search": _latency_summary(search_seconds),
+        "search_by_role": {role: _latency_summary(s) for role, s in sorted(per_role.items())},
+        "brute_force": _latency_summary(brute_seconds),
+        f"recall_at_{k}": round(float(np.mean(recalls)), 4) if recalls else None,
+        "quantized_search": _latency_summary(quantized_seconds) if quantized_seconds else None,
+        f"quantized_recall_at_{k}": round(float(np.mean(quantized_recalls)), 4) if quantized_recalls else None,
+    }
+
+
+def run_serve(workdir: Path, n_queries: int, concurrency: int, llm_latency_ms: float, role_mix_spec: str,
+              seed: int) -> dict:
+    # app modules read their configuration at import time
+    os.environ["ROOT_DATA_DIR"] = str(workdir / "data")
+    os.environ["LLM_BACKEND"] = "local"
+    os.environ["LOCAL_LLM_LATENCY_MS"] = str(llm_latency_ms)
+    os.environ["LOCAL_LLM_JITTER_MS"] = "0"
+    import chromadb
+    from fastapi.testclient import TestClient
+    from app.main import app
+    from src.retrieval import ROLE_HIERARCHY
+
+    collection = chromadb.PersistentClient(path=str(workdir / "data" / "chroma_db")).get_collection(COLLECTION_NAME)
+    role_mix = parse_role_mix(role_mix_spec, ROLE_HIERARCHY)
+    # a different seed than the retrieval step, so the answer cache is not pre-warmed by it
+    workload = generate_workload(ROLE_HIERARCHY, _headings(collection.get(include=["metadatas"])["metadatas"]),
+                                 n_queries, role_mix, seed + 1)
+
+    with TestClient(app) as client:
+        # first request loads the embedding model and opens the indexes
+        client.post("/rag/query", json={"role": "Employee_Level", "query": "warm up"})
+
+        def one(item):
+            role, query = item
+            started = time.perf_counter()
+            response = client.post("/rag/query", json={"role": role, "query": query})
+            return time.perf_counter() - started, response.status_code
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            results = list(pool.map(one, workload))
+        elapsed = time.perf_counter() - started
+        cache = client.get("/rag/cache/stats").json()
+
+    return {
+        "queries": len(workload),
+        "concurrency": concurrency,
+        "llm_latency_ms": llm_latency_ms,
+        "seconds": round(elapsed, 3),
+        "queries_per_sec": round(len(workload) / elapsed, 2) if elapsed else None,
+        "errors": sum(1 for _, status in results if status != 200),
+        "latency": _latency_summary([seconds for seconds, _ in results]),
+        "answer_cache_hits": cache["answers"]["hits"],
+    }
+
+
+# (path in the results, True when higher is better)
+_COMPARED = [
+    (("ingest", "chunks_per_sec"), True),
+    (("retrieval", "search", "p50_ms"), False),
+    (("retrieval", "search", "p99_ms"), False),
+    (("retrieval", "embed", "p50_ms"), False),
+    (("retrieval", "quantized_search", "p50_ms"), False),
+    (("serve", "queries_per_sec"), True),
+    (("serve", "latency", "p50_ms"), False),
+    (("serve", "latency", "p99_ms"), False),
+]
+
+
+def compare(before: dict, after: dict) -> dict:
+    """
+    Headline metrics of two runs side by side; ratio > 1 means the new run is better.
+    """
+    def lookup(results, path):
+        for key in path:
+            results = results.get(key) if isinstance(results, dict) else None
+        return results
+
+    table = {}
+    for path, higher_is_better in _COMPARED:
+        old, new = lookup(before, path), lookup(after, path)
+        if old and new:
+            ratio = new / old if higher_is_better else old / new
+            table[".".join(path)] = {"before": old, "after": new, "ratio": round(ratio, 3)}
+    recall_key = next((key for key in after.get("retrieval", {}) if key.startswith("recall_at_")), None)
+    if recall_key and recall_key in before.get("retrieval", {}):
+        table[f"retrieval.{recall_key}"] = {"before": before["retrieval"][recall_key],
+                                            "after": after["retrieval"][recall_key]}
+    return table
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workdir", type=Path, help="reuse (or create) this directory instead of a temp dir")
+    parser.add_argument("--steps", default="ingest,retrieval,serve")
+    parser.add_argument("--copies", type=int, default=660, help="variations per report (660 -> ~100k chunks)")
+    parser.add_argument("--workers", type=int, help="ingestion parse workers")
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--role-mix", default="", help='e.g. "Employee_Level=4,Finance_Team=1"; default uniform')
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--llm-latency-ms", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=Path, help="write the JSON here instead of stdout")
+    parser.add_argument("--compare", type=Path, help="earlier results JSON to compare against")
+    args = parser.parse_args()
+
+    steps = [s.strip() for s in args.steps.split(",") if s.strip()]
+    workdir = args.workdir or Path(tempfile.mkdtemp(prefix="rag-bench-"))
+    workdir.mkdir(parents=True, exist_ok=True)
+
+    results = {
+        "meta": {
+            "git_revision": _git_revision(),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "cpus": os.cpu_count(),
+            "workdir": str(workdir),
+            "args": {k: str(v) if isinstance(v, Path) else v for k, v in vars(args).items()},
+        }
+    }
+    if "ingest" in steps:
+        results["ingest"] = run_ingest(workdir, args.copies, args.seed, args.workers)
+    if "retrieval" in steps:
+        results["retrieval"] = run_retrieval(workdir, args.queries, args.k, args.role_mix, args.seed)
+    if "serve" in steps:
+        results["serve"] = run_serve(workdir, args.queries, args.concurrency, args.llm_latency_ms,
+                                     args.role_mix, args.seed)
+    if args.compare:
+        results["compare"] = compare(json.loads(args.compare.read_text(encoding="utf-8")), results)
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        args.output.write_text(output + "\n", encoding="utf-8")
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+Synthetic corpus and query workload for the benchmarks.
+
+The corpus is made of seeded variations of the markdown reports under data/: every
+copy gets its own company name and shifted figures, so the embeddings of copies
+differ while the structure (sections, tables, departments, role flags) stays real.
+"""
+import random
+import re
+import shutil
+from pathlib import Path
+from typing import Dict, Iterable, List, Tuple
+
+_COMPANY = re.compile(r"FinSolve Technologies(?: Inc\.)?|FinSolve")
+_NUMBER = re.compile(r"(?<![\w.])(\d+(?:\.\d+)?)(?![\w.])")
+_YEAR = re.compile(r"\b20\d\d\b")
+_SYLLABLES = ["ar", "bel", "cor", "dan", "el", "fin", "gar", "hex", "ion", "jun", "kor", "lum",
+              "mar", "nov", "or", "pax", "quin", "ros", "sol", "tor", "ul", "ver", "wex", "zen"]
+_SUFFIXES = ["Technologies", "Systems", "Labs", "Holdings", "Networks", "Dynamics", "Analytics"]
+
+# Typical questions per department; the workload mixes these with section headings
+QUESTIONS = {
+    "general": [
+        "What is the leave policy?", "How do I claim travel reimbursement?", "What are the working hours?",
+        "What is the code of conduct?", "How many sick days do employees get?", "What is the remote work policy?",
+    ],
+    "finance": [
+        "What was the revenue growth in Q3?", "How much was spent on vendor services?",
+        "What is the gross margin trend?", "What were the main cash flow risks?", "Summarize net income by quarter.",
+    ],
+    "marketing": [
+        "What was the customer acquisition cost?", "Which campaigns had the best ROI?",
+        "What is the marketing budget for Q4?", "How did brand awareness change?",
+    ],
+    "hr": [
+        "What is the average attendance?", "How many employees work in Pune?",
+        "Who has the highest performance rating?", "What is the leave balance of data analysts?",
+    ],
+    "engineering": [
+        "What is the system architecture?", "How is PCI-DSS compliance handled?",
+        "What is the CI/CD pipeline?", "How are microservices deployed?", "What is the disaster recovery plan?",
+    ],
+}
+
+
+def _company(rng: random.Random) -> str:
+    name = "".join(rng.choice(_SYLLABLES) for _ in range(rng.randint(2, 3))).capitalize()
+    return f"{name} {rng.choice(_SUFFIXES)}"
+
+
+def vary(text: str, rng: random.Random) -> str:
+    """
+    One variation of a report: new company name, figures scaled by up to +-30%, years kept.
+    """
+    company = _company(rng)
+    text = _COMPANY.sub(company, text)
+
+    def scale(match):
+        value = match.group(1)
+        if _YEAR.fullmatch(value):
+            return value
+        scaled = float(value) * rng.uniform(0.7, 1.3)
+        return f"{scaled:.1f}" if "." in value else str(max(1, round(scaled)))
+
+    return _NUMBER.sub(scale, text)
+
+
+def generate_corpus(source_dir: Path, target_dir: Path, copies: int, seed: int = 0) -> Dict[str, int]:
+    """
+    Write copies variations of every data/<department>/*.md report to target_dir,
+    plus the HR CSV unchanged. Returns the number of files written per department.
+    """
+    rng = random.Random(seed)
+    written = {}
+    for md_path in sorted(source_dir.glob("*/*.md")):
+        department = md_path.parent.name
+        out_dir = target_dir / department
+        out_dir.mkdir(parents=True, exist_ok=True)
+        text = md_path.read_text(encoding="utf-8")
+        for i in range(copies):
+            (out_dir / f"{md_path.stem}_syn{i:05d}.md").write_text(vary(text, rng), encoding="utf-8")
+        written[department] = written.get(department, 0) + copies
+
+    for csv_path in source_dir.glob("hr/*.csv"):
+        (target_dir / "hr").mkdir(parents=True, exist_ok=True)
+        shutil.copy2(csv_path, target_dir / "hr" / csv_path.name)
+    return written
+
+
+def generate_workload(
+    role_hierarchy: Dict[str, List[str]],
+    headings: Dict[str, List[str]],
+    n_queries: int,
+    role_mix: Dict[str, float],
+    seed: int = 0,
+) -> List[Tuple[str, str]]:
+    """
+    (role, query) pairs. Roles are drawn by role_mix weight. Each query is either a
+    typical question for one of the role's departments or a question about one of
+    their section headings, half and half.
+    """
+    rng = random.Random(seed)
+    roles = list(role_mix)
+    weights = [role_mix[r] for r in roles]
+    workload = []
+    for _ in range(n_queries):
+        role = rng.choices(roles, weights)[0]
+        department = rng.choice(role_hierarchy[role])
+        pool = headings.get(department) or []
+        if pool and rng.random() < 0.5:
+            query = f"What does the policy say about {rng.choice(pool)}?"
+        else:
+            query = rng.choice(QUESTIONS.get(department) or QUESTIONS["general"])
+        workload.append((role, query))
+    return workload
+
+
+def parse_role_mix(spec: str, roles: Iterable[str]) -> Dict[str, float]:
+    """
+    "Employee_Level=4,Finance_Team=1" -> weights; an empty spec weights every role equally.
+    """
+    if not spec:
+        return {role: 1.0 for role in roles}
+    mix = {}
+    for part in spec.split(","):
+        role, _, weight = part.partition("=")
+        mix[role.strip()] = float(weight or 1)
+    return mix
@@ -0,0 +1,255 @@
+import json
+import math
+import os
+import re
+import threading
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+import numpy as np
+
+# Directory next to the Chroma files holding one <department>.json index per department
+BM25_DIR = "bm25"
+# IDF of every term in the corpus, in BM25_DIR next to the department files
+IDF_FILE = "idf.json"
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# IDs like FINEMP1006 and terms like PCI-DSS stay whole; their parts are indexed too
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:[-_./][a-z0-9]+)*")
+_SPLIT_RE = re.compile(r"[-_./]")
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from has have how in is it its none of on or that the this to was were "
+    "what when where which who why will with".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lowercased terms of text for BM25, used both at index and at query time.
+    """
+    terms = []
+    for token in _TOKEN_RE.findall((text or "").lower()):
+        if token in _STOPWORDS:
+            continue
+        terms.append(token)
+        parts = _SPLIT_RE.split(token)
+        if len(parts) > 1:
+            terms.extend(p for p in parts if p and p not in _STOPWORDS)
+    return terms
+
+
+def build_indexes(docs: Iterable[Dict[str, Any]], index_dir: Path, k1: float = BM25_K1, b: float = BM25_B) -> Dict[str, int]:
+    """
+    Build one BM25 index file per department from chunk dicts (id, text, metadata).
+    A chunk's sub_hierarchy heading is indexed along with its text.
+
+    IDF and the average document length are computed over the whole corpus, so
+    scores from different departments are comparable. Each posting stores its
+    final BM25 term weight, so a query only sums precomputed numbers. The IDF of
+    every term goes to IDF_FILE, for judging how much of a query a hit matched.
+    Files are written to a temp file and swapped in, and indexes of departments
+    that no longer have chunks are removed.
+
+    Returns:
+        Number of indexed chunks per department
+    """
+    by_department = {}
+    term_counts = {}
+    for doc in docs:
+        department = doc["metadata"].get("department", "unknown")
+        by_department.setdefault(department, []).append(doc)
+        # headings are indexed with the text, so "Leave Policy" or an employee ID in a heading counts
+        heading = doc["metadata"].get("sub_hierarchy") or ""
+        term_counts[doc["id"]] = Counter(tokenize(f"{heading} {doc['text']}"))
+
+    n_docs = len(term_counts)
+    avg_len = sum(sum(c.values()) for c in term_counts.values()) / n_docs if n_docs else 0.0
+    df = Counter(term for counts in term_counts.values() for term in counts)
+    idf = {term: math.log(1 + (n_docs - n + 0.5) / (n + 0.5)) for term, n in df.items()}
+
+    index_dir.mkdir(parents=True, exist_ok=True)
+    written = {}
+    for department, dept_docs in by_department.items():
+        postings = {}
+        for position, doc in enumerate(dept_docs):
+            counts = term_counts[doc["id"]]
+            norm = k1 * (1 - b + b * sum(counts.values()) / avg_len) if avg_len else k1
+            for term, tf in counts.items():
+                weight = idf[term] * tf * (k1 + 1) / (tf + norm)
+                postings.setdefault(term, ([], []))
+                postings[term][0].append(position)
+                postings[term][1].append(round(weight, 5))
+
+        payload = {
+            "department": department,
+            "k1": k1,
+            "b": b,
+            "ids": [doc["id"] for doc in dept_docs],
+            "documents": [doc["text"] for doc in dept_docs],
+            "metadatas": [doc["metadata"] for doc in dept_docs],
+            "access_masks": [doc["metadata"].get("access_mask", 0) for doc in dept_docs],
+            "postings": postings,
+        }
+        path = index_dir / f"{department}.json"
+        tmp_path = index_dir / f"{department}.json.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(payload, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp_path, path)
+        written[department] = len(dept_docs)
+
+    tmp_path = index_dir / f"{IDF_FILE}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({term: round(value, 5) for term, value in idf.items()}, f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(tmp_path, index_dir / IDF_FILE)
+
+    for path in index_dir.glob("*.json"):
+        if path.stem not in by_department and path.name != IDF_FILE:
+            path.unlink()
+
+    return written
+
+
+class _DepartmentIndex:
+    def __init__(self, payload: Dict[str, Any]):
+        self.ids = payload["ids"]
+        self.documents = payload["documents"]
+        self.metadatas = payload["metadatas"]
+        self.access_masks = np.asarray(payload.get("access_masks") or [0] * len(self.ids), dtype=np.int64)
+        self.postings = {
+            term: (np.asarray(positions, dtype=np.int32), np.asarray(weights, dtype=np.float32))
+            for term, (positions, weights) in payload["postings"].items()
+        }
+
+    def scores(self, terms: List[str]) -> Optional[np.ndarray]:
+        scores = None
+        for term in terms:
+            posting = self.postings.get(term)
+            if posting is None:
+                continue
+            if scores is None:
+                scores = np.zeros(len(self.ids), dtype=np.float32)
+            positions, weights = posting
+            scores[positions] += weights  # positions are unique within one posting list
+        return scores
+
+    def matched_idf(self, idf: Dict[str, float], positions: np.ndarray) -> np.ndarray:
+        """
+        Summed IDF of the terms in idf (distinct query terms) each chunk at positions contains.
+        """
+        matched = np.zeros(len(positions), dtype=np.float32)
+        for term, weight in idf.items():
+            posting = self.postings.get(term)
+            if posting is not None:
+                matched += weight * np.isin(positions, posting[0])
+        return matched
+
+
+class BM25Index:
+    """
+    Lexical search over the per-department BM25 files written by ingest.py.
+
+    Files are loaded into NumPy postings on first use and reloaded when ingestion
+    replaces them, so a query is a few array additions and one partial sort. With a
+    role registry (retrieval.RoleRegistry), matches are also checked against the
+    role's access mask, one AND per matching chunk.
+    """
+
+    def __init__(self, index_dir: Path, registry=None):
+        self.index_dir = Path(index_dir)
+        self.registry = registry
+        self._indexes = {}
+        self._mtimes = {}
+        self._idf = {"mtime_ns": None, "idf": None}
+        self._lock = threading.Lock()
+
+    def _department(self, department: str) -> Optional[_DepartmentIndex]:
+        path = self.index_dir / f"{department}.json"
+        try:
+            mtime = path.stat().st_mtime_ns
+        except FileNotFoundError:
+            self._indexes.pop(department, None)
+            return None
+
+        if self._mtimes.get(department) != mtime:
+            with self._lock:
+                if self._mtimes.get(department) != mtime:
+                    with open(path, "r", encoding="utf-8") as f:
+                        self._indexes[department] = _DepartmentIndex(json.load(f))
+                    self._mtimes[department] = mtime
+        return self._indexes.get(department)
+
+    def _query_idf(self, terms: Iterable[str], indexes: List[_DepartmentIndex]) -> Dict[str, float]:
+        """
+        Corpus IDF of the query terms that occur anywhere in the corpus. Directories
+        written before IDF_FILE existed weigh every term the given indexes hold the same.
+        """
+        path = self.index_dir / IDF_FILE
+        try:
+            mtime = path.stat().st_mtime_ns
+        except FileNotFoundError:
+            return {t: 1.0 for t in terms if any(t in index.postings for index in indexes)}
+
+        if self._idf["mtime_ns"] != mtime:
+            with self._lock:
+                if self._idf["mtime_ns"] != mtime:
+                    with open(path, "r", encoding="utf-8") as f:
+                        self._idf = {"mtime_ns": mtime, "idf": json.load(f)}
+        idf = self._idf["idf"]
+        return {t: idf[t] for t in terms if t in idf}
+
+    def available(self) -> bool:
+        return self.index_dir.is_dir() and any(self.index_dir.glob("*.json"))
+
+    def search(self, role: str, departments: List[str], query: str, n_results: int) -> List[Dict[str, Any]]:
+        """
+        Top BM25 hits for query among the given departments, restricted to chunks whose
+        access mask the role may read.
+
+        Besides its score, each hit reports "bm25_match": the share of the query's IDF
+        mass it matched, counting the query terms that occur anywhere in the corpus
+        (including departments the role cannot read). Unlike the raw score it does not
+        depend on query length or corpus size, so it can be compared with a fixed cutoff.
+
+        Returns:
+            Hits like the vector search's (id, document, metadata), with "bm25" and
+            "bm25_match" instead of a distance, best first
+        """
+        terms = tokenize(query)
+        if not terms or n_results <= 0:
+            return []
+
+        indexes = [index for index in map(self._department, departments) if index is not None]
+        idf = self._query_idf(set(terms), indexes)
+        attainable = sum(idf.values())
+
+        candidates = []
+        for index in indexes:
+            scores = index.scores(terms)
+            if scores is None:
+                continue
+
+            top = np.flatnonzero(scores)
+            if self.registry is not None:
+                top = top[self.registry.allowed(role, index.access_masks[top])]
+            if len(top) > n_results:
+                top = top[np.argpartition(-scores[top], n_results - 1)[:n_results]]
+            matched = index.matched_idf(idf, top)
+            candidates.extend(
+                (float(scores[position]), float(m) / attainable if attainable else 0.0, index, int(position))
+                for position, m in zip(top, matched)
+            )
+
+        candidates.sort(key=lambda c: c[0], reverse=True)
+        return [
+            {
+                "id": index.ids[position],
+                "document": index.documents[position],
+                "metadata": index.metadatas[position],
+                "distance": None,
+                "bm25": score,
+                "bm25_match": match,
+            }
+            for score, match, index, position in candidates[:n_results]
+        ]
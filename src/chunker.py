@@ -0,0 +1,210 @@
+from functools import lru_cache
+import os
+
+# Must match the embedding model used in ingest.py, so token counts are the ones it truncates on
+EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+
+# Token budget of one chunk, special tokens included ([CLS]/[SEP]); 0 disables re-chunking
+CHUNK_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", "256"))
+# Tokens repeated at the start of a chunk from the end of the previous one, when a section is split
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "32"))
+# Sections smaller than this are merged into a neighbour of the same "# " section when both fit
+CHUNK_MIN_TOKENS = int(os.getenv("CHUNK_MIN_TOKENS", "64"))
+
+_HIERARCHY = ("section", "subsection", "subsubsection")
+
+
+def chunking_settings():
+    """
+    Settings that change chunk boundaries; stored in the ingest manifest.
+    """
+    return {
+        "model": EMBEDDING_MODEL,
+        "max_tokens": CHUNK_MAX_TOKENS,
+        "overlap_tokens": CHUNK_OVERLAP_TOKENS,
+        "min_tokens": CHUNK_MIN_TOKENS,
+    }
+
+
+@lru_cache(maxsize=None)
+def get_tokenizer(model_name=EMBEDDING_MODEL):
+    """
+    The embedding model's own tokenizer, loaded once per process.
+    Only the tokenizer is loaded, not the model weights.
+    """
+    from transformers import AutoTokenizer
+
+    return AutoTokenizer.from_pretrained(f"sentence-transformers/{model_name}")
+
+
+def clean_lines(lines):
+    """
+    Drop blank lines, code fences and "---" rules, as build_chunks does before embedding.
+    """
+    cleaned = []
+    for line in lines:
+        s = str(line).strip()
+        if s and s != "```" and "---" not in s:
+            cleaned.append(s)
+    return cleaned
+
+
+def _heading_line(item, depth):
+    """
+    The item's headings below the first depth levels, e.g. "Leave Policy > Sick Leave".
+    """
+    return " > ".join(item[key] for key in _HIERARCHY[depth:] if item.get(key))
+
+
+class _Piece:
+    """
+    A run of cleaned lines under one heading hierarchy, with its token count.
+    """
+
+    def __init__(self, hierarchy, lines, tokens):
+        self.hierarchy = {key: hierarchy.get(key) for key in _HIERARCHY}
+        self.lines = lines
+        self.tokens = tokens
+
+    def as_item(self):
+        return {**self.hierarchy, "content": self.lines}
+
+
+def _split(item, lines, encodings, budget, overlap):
+    """
+    Split one section's lines into pieces of at most budget tokens, each starting with
+    the last overlap tokens of the previous piece. Cuts prefer line ends, then sentence
+    ends, then word boundaries; a word is only cut when the window has no boundary at all.
+    """
+    # flat token stream: (line index, char start, char end)
+    tokens = []
+    line_starts = set()
+    for line_index, offsets in enumerate(encodings):
+        line_starts.add(len(tokens))
+        tokens.extend((line_index, start, end) for start, end in offsets)
+    line_starts.add(len(tokens))
+
+    def is_word_start(i):
+        return i in line_starts or tokens[i][1] > tokens[i - 1][2]
+
+    def is_sentence_start(i):
+        line_index, _, prev_end = tokens[i - 1]
+        return is_word_start(i) and lines[line_index][prev_end - 1] in ".!?;:"
+
+    def cut_point(start, limit):
+        # look for the best boundary in the second half of the window
+        floor = start + max(1, (limit - start) // 2)
+        for accept in (lambda i: i in line_starts, is_sentence_start, is_word_start):
+            for i in range(limit, floor - 1, -1):
+                if accept(i):
+                    return i
+        return limit
+
+    def text(start, end):
+        out = []
+        for line_index in range(tokens[start][0], tokens[end - 1][0] + 1):
+            line = lines[line_index]
+            first = tokens[start][1] if line_index == tokens[start][0] else 0
+            last = tokens[end - 1][2] if line_index == tokens[end - 1][0] else len(line)
+            out.append(line[first:last].strip())
+        return [s for s in out if s]
+
+    pieces = []
+    start = 0
+    while start < len(tokens):
+        end = len(tokens) if len(tokens) - start <= budget else cut_point(start, start + budget)
+        pieces.append(_Piece(item, text(start, end), end - start))
+        if end == len(tokens):
+            break
+        # step back by the overlap, to a word start, but always move forward
+        next_start = max(end - overlap, start + 1)
+        while next_start < end and not is_word_start(next_start):
+            next_start += 1
+        start = next_start
+    return pieces
+
+
+def _is_descendant(child, parent):
+    return all(
+        parent.hierarchy[key] is None or parent.hierarchy[key] == child.hierarchy[key]
+        for key in _HIERARCHY
+    )
+
+
+def _merge(a, b, tokenizer):
+    """
+    Join two pieces of one "# " section. The merged piece keeps the hierarchy levels
+    both share; the levels that differ are kept as heading lines in the text.
+    """
+    depth = 1
+    while depth < len(_HIERARCHY) and a.hierarchy.get(_HIERARCHY[depth]) == b.hierarchy.get(_HIERARCHY[depth]):
+        depth += 1
+    hierarchy = {key: a.hierarchy.get(key) if i < depth else None for i, key in enumerate(_HIERARCHY)}
+
+    headings = clean_lines(_heading_line(p.hierarchy, depth) for p in (a, b))
+    heading_tokens = sum(len(ids) for ids in tokenizer(headings, add_special_tokens=False)["input_ids"]) if headings else 0
+
+    lines = []
+    for piece in (a, b):
+        lines.extend(clean_lines([_heading_line(piece.hierarchy, depth)]))
+        lines.extend(piece.lines)
+    return _Piece(hierarchy, lines, a.tokens + b.tokens + heading_tokens)
+
+
+def rechunk(items, max_tokens=CHUNK_MAX_TOKENS, overlap_tokens=CHUNK_OVERLAP_TOKENS,
+            min_tokens=CHUNK_MIN_TOKENS, tokenizer=None):
+    """
+    Re-cut the section items of one file (as produced by extract.ingest_file) to a token budget.
+
+    Sections longer than the budget are split with overlap; sections shorter than
+    min_tokens are merged into the next (or previous) section under the same "# " heading
+    when the result still fits. Token counts come from the embedding model's tokenizer.
+
+    Args:
+        items: Section dicts with section/subsection/subsubsection and content lines.
+        max_tokens: Token budget per chunk including special tokens; 0 returns items unchanged.
+        overlap_tokens: Tokens shared between consecutive pieces of a split section.
+        min_tokens: Pieces below this size are merged with a neighbour when possible.
+        tokenizer: Hugging Face tokenizer; defaults to the embedding model's.
+
+    Returns:
+        List of section dicts in the same format, with cleaned content lines.
+    """
+    items = list(items)
+    if max_tokens <= 0 or not items:
+        return items
+
+    tokenizer = tokenizer or get_tokenizer()
+    budget = max_tokens - tokenizer.num_special_tokens_to_add()
+    overlap = min(overlap_tokens, budget // 2)
+
+    pieces = []
+    for item in items:
+        lines = clean_lines(item.get("content", []))
+        encodings = tokenizer(lines, add_special_tokens=False, return_offsets_mapping=True)["offset_mapping"] if lines else []
+        tokens = sum(len(offsets) for offsets in encodings)
+        if tokens > budget:
+            pieces.extend(_split(item, lines, encodings, budget, overlap))
+        else:
+            pieces.append(_Piece(item, lines, tokens))
+
+    merged = []
+    for piece in pieces:
+        prev = merged[-1] if merged else None
+        if prev is not None and not prev.lines and _is_descendant(piece, prev):
+            # a bare heading followed by its own subsection: the child already carries it
+            merged[-1] = piece
+            continue
+        if (
+            prev is not None
+            and piece.lines  # bare headings are merged forward, into what follows them
+            and (prev.tokens < min_tokens or piece.tokens < min_tokens)
+            and prev.hierarchy.get("section") == piece.hierarchy.get("section")
+        ):
+            candidate = _merge(prev, piece, tokenizer)
+            if candidate.tokens <= budget:
+                merged[-1] = candidate
+                continue
+        merged.append(piece)
+
+    return [piece.as_item() for piece in merged]
@@ -1,37 +1,49 @@
 from pathlib import Path
+from typing import Iterator
 import json
+import os
+import re
 
+# Format of data/<department>/chunked_reports/*: "json" (indented, one array) or
+# "jsonl" (compact, one section per line, written as sections are parsed)
+CHUNKED_REPORT_FORMAT = os.getenv("CHUNKED_REPORT_FORMAT", "json")
 
-# Section parsers
-def _get_section_h1(line: str) -> str | None:
-    s = line.strip()
-    if s.startswith("# "):
-        return s[2:]
-    return None
+# Line kinds
+_TEXT, _SECTION, _SUBSECTION, _SUBSUBSECTION = range(4)
 
+# "# ", "## " or "### " headings; "####" and deeper are plain text
+_HEADING_RE = re.compile(r"(#{1,3}) ")
+_HEADING_KINDS = {1: _SECTION, 2: _SUBSECTION, 3: _SUBSUBSECTION}
 
-def _get_subsection_colon(line: str, next_line: str | None) -> str | None:
-    if next_line is None:
-        return None
-    s = line.rstrip()
-    next_s = next_line.strip()
-    if s.endswith(":") and next_s.startswith("---"):
-        return s[:-1].strip()
-    return None
+# decorative separators like -----, _____, =====, ****; backticks are excluded to keep code fences
+_SEPARATOR_RE = re.compile(r"[-_=*—─]{3,}")
 
 
-def _get_subsection_h2(line: str) -> str | None:
+def _classify(line: str, next_line: str | None) -> tuple[int, str | None]:
+    """
+    Classify a line in one pass, returning (kind, heading title).
+
+    Precedence: "# " section, then a "Title:" line underlined by "---" (subsection),
+    then "## " subsection and "### " subsubsection; everything else is text.
+    """
     s = line.strip()
-    if s.startswith("## "):
-        return s[3:]
-    return None
 
+    level = 0
+    if s.startswith("#"):
+        m = _HEADING_RE.match(s)
+        if m:
+            level = len(m.group(1))
+    if level == 1:
+        return _SECTION, s[2:]
 
-def _get_subsection_h3(line: str) -> str | None:
-    s = line.strip()
-    if s.startswith("### "):
-        return s[4:]
-    return None
+    if s.endswith(":") and next_line is not None and next_line.lstrip().startswith("---"):
+        title = s[:-1].strip()
+        if title:
+            return _SUBSECTION, title
+
+    if level:
+        return _HEADING_KINDS[level], s[level + 1:]
+    return _TEXT, None
 
 
 def _is_separator_line(line: str) -> bool:
@@ -39,80 +51,117 @@ def _is_separator_line(line: str) -> bool:
     True if the line is a decorative separator like
     --------------------------------, ________, =====, or ****.
     """
-    s = line.strip()
-    if len(s) < 3:
-        return False
-    # allow common separator chars; exclude backticks to keep code fences
-    allowed = {"-", "_", "=", "*", "—", "─"}
-    return set(s).issubset(allowed)
+    return _SEPARATOR_RE.fullmatch(line.strip()) is not None
 
 
-# Ingestion function
-def ingest_file(file_path: Path) -> list[dict]:
-    results: list[dict] = []
+def iter_sections(file_path: Path) -> Iterator[dict]:
+    """
+    Stream section dicts out of a markdown file.
+
+    The file is read lazily with one line of lookahead (needed for "Title:" lines
+    underlined by "---"), so memory does not depend on the file size.
+    """
     current_section: str | None = None
     current_subsection: str | None = None
     current_subsub: str | None = None
     content: list[str] = []
-    collecting = False
 
-    def _save():
-        nonlocal collecting, content, current_section, current_subsection, current_subsub, results
-        # drop decorative lines that might have slipped in
-        filtered = [ln for ln in content if not _is_separator_line(ln)]
-        if not collecting or not filtered or current_section is None:
-            content.clear()
-            return
-
-        results.append(
-            {
+    def _flush():
+        # text before the first "# " section is dropped
+        if content and current_section is not None:
+            section = {
                 "section": current_section,
                 "subsection": current_subsection,
                 "subsubsection": current_subsub,
-                "content": filtered,
+                "content": content.copy(),
             }
-        )
+            content.clear()
+            return section
         content.clear()
+        return None
 
     with file_path.open("r", encoding="utf-8") as f:
-        lines = f.readlines()
-
-    for i, line in enumerate(lines):
-        next_line = lines[i + 1] if i + 1 < len(lines) else None
-
-        section = _get_section_h1(line)
-        if section:
-            _save()
-            current_section = section
-            current_subsection = None
-            current_subsub = None
-            collecting = True
-            continue
-
-        subsection = _get_subsection_colon(line, next_line) or _get_subsection_h2(line)
-        if subsection:
-            _save()
-            current_subsection = subsection
-            current_subsub = None
-            collecting = True
-            continue
-
-        subsub = _get_subsection_h3(line)
-        if subsub:
-            _save()
-            current_subsub = subsub
-            collecting = True
-            continue
-
-        if collecting:
-            s = line.rstrip()
-            if _is_separator_line(s):
-                continue
-            content.append(s)
-
-    _save()  # Save any remaining content after the loop
-
-    return results
+        lines = iter(f)
+        line = next(lines, None)
+        collecting = False
+
+        while line is not None:
+            next_line = next(lines, None)
+            kind, title = _classify(line, next_line)
+
+            if kind == _TEXT:
+                if collecting:
+                    s = line.rstrip()
+                    if not _is_separator_line(s):
+                        content.append(s)
+            else:
+                section = _flush()
+                if section:
+                    yield section
+
+                if kind == _SECTION:
+                    current_section = title
+                    current_subsection = None
+                    current_subsub = None
+                elif kind == _SUBSECTION:
+                    current_subsection = title
+                    current_subsub = None
+                else:
+                    current_subsub = title
+                collecting = True
+
+            line = next_line
+
+    section = _flush()  # Save any remaining content after the loop
+    if section:
+        yield section
+
+
+# Ingestion function
+def ingest_file(file_path: Path) -> list[dict]:
+    return list(iter_sections(file_path))
+
+
+def write_chunked_report(md_path: Path, chunks, fmt: str = CHUNKED_REPORT_FORMAT) -> Path:
+    """
+    Write a file's sections to chunked_reports/, as indented JSON or compact JSON Lines.
+    chunks may be a generator; in "jsonl" mode it is written as it is consumed.
+    A report of the other format for the same file is removed so it is not ingested twice.
+    """
+    out_dir = md_path.parent / "chunked_reports"
+    out_dir.mkdir(parents=True, exist_ok=True)
+    out_path = out_dir / f"{md_path.stem}.{fmt}"
+
+    with out_path.open("w", encoding="utf-8") as f:
+        if fmt == "jsonl":
+            for chunk in chunks:
+                f.write(json.dumps(chunk, ensure_ascii=False, separators=(",", ":")))
+                f.write("\n")
+        else:
+            json.dump(list(chunks), f, ensure_ascii=False, indent=2)
+
+    other_path = out_dir / f"{md_path.stem}.{'json' if fmt == 'jsonl' else 'jsonl'}"
+    if other_path.exists():
+        other_path.unlink()
+    return out_path
+
+
+def read_chunked_report(report_path: Path) -> list[dict]:
+    """
+    Read a chunked report written by write_chunked_report (.json or .jsonl).
+    """
+    with report_path.open("r", encoding="utf-8") as f:
+        if report_path.suffix == ".jsonl":
+            return [json.loads(line) for line in f if line.strip()]
+        data = json.load(f)
+    return data if isinstance(data, list) else [data]
+
+
+def iter_markdown_files(data_dir: Path):
+    """
+    Lazily yield the department markdown files (data/<department>/*.md).
+    """
+    yield from data_dir.glob("*/*.md")
 
 
 # Ingestion on all the files in directory
@@ -120,9 +169,4 @@ def run_full_ingestion():
     root = Path(__file__).resolve().parent.parent
     data_dir = root / "data"
     for md_path in data_dir.glob("*/*.md"):
-        chunks = ingest_file(md_path)
-        out_dir = md_path.parent / "chunked_reports"
-        out_dir.mkdir(parents=True, exist_ok=True)
-        out_path = out_dir / f"{md_path.stem}.json"
-        with out_path.open("w", encoding="utf-8") as f:
-            json.dump(chunks, f, ensure_ascii=False, indent=2)
+        write_chunked_report(md_path, iter_sections(md_path))
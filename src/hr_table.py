@@ -0,0 +1,315 @@
+import csv
+import os
+import re
+import sqlite3
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+# Written next to the vector store by ingest.py, read by the API
+HR_TABLE_FILE = "hr_data.sqlite"
+
+# Column name -> SQLite type, in hr_data.csv order
+HR_COLUMNS = {
+    "employee_id": "TEXT PRIMARY KEY",
+    "full_name": "TEXT",
+    "role": "TEXT",
+    "department": "TEXT",
+    "email": "TEXT",
+    "location": "TEXT",
+    "date_of_birth": "TEXT",
+    "date_of_joining": "TEXT",
+    "manager_id": "TEXT",
+    "salary": "REAL",
+    "leave_balance": "INTEGER",
+    "leaves_taken": "INTEGER",
+    "attendance_pct": "REAL",
+    "performance_rating": "INTEGER",
+    "last_review_date": "TEXT",
+}
+INDEXED_COLUMNS = ("department", "manager_id", "location")
+
+_CASTS = {"REAL": float, "INTEGER": int}
+
+# Question wording -> aggregate, checked in order ("average number of ..." is an average)
+_FUNCTIONS = [
+    ("avg", re.compile(r"\b(average|mean|avg)\b")),
+    ("count", re.compile(r"\b(how many|count|number of|headcount)\b")),
+    ("sum", re.compile(r"\b(total|sum)\b")),
+    ("max", re.compile(r"\b(highest|maximum|max|most|top)\b")),
+    ("min", re.compile(r"\b(lowest|minimum|min|least|fewest)\b")),
+]
+_METRICS = [
+    ("attendance_pct", re.compile(r"\battendance\b")),
+    ("salary", re.compile(r"\b(salary|salaries|pay|compensation|ctc)\b")),
+    ("leave_balance", re.compile(r"\b(leave balances?|leaves? (left|remaining)|remaining leaves?)\b")),
+    ("leaves_taken", re.compile(r"\b(leaves?|days off) ((was|were|been) )?(taken|used)\b")),
+    ("performance_rating", re.compile(r"\b(performance|ratings?)\b")),
+]
+_GROUP_BY = re.compile(r"\b(?:by|per|each|every|across|which|what)\s+(department|location|city|office|role|manager)s?\b"
+                       r"|\b(department|location|city|role)[- ]wise\b")
+_GROUP_COLUMNS = {"department": "department", "location": "location", "city": "location",
+                  "office": "location", "role": "role", "manager": "manager_id"}
+_EMPLOYEES = re.compile(r"\b(employees?|staff|people|headcount|workforce|who (has|have|had))\b")
+# Asks for the number of employees outright, with no filter or grouping needed
+_HEADCOUNT = re.compile(r"\b(headcount|workforce size|total (number of )?(employees|staff)"
+                        r"|(how many|number of|count of) (the )?(employees|staff|people|workers))\b")
+# Wording of a policy question ("minimum attendance required"), answered from documents
+_POLICY = re.compile(r"\b(polic(y|ies)|required|requirements?|rules?|allowed|eligible|entitled|mandatory)\b")
+_FILTER_COLUMNS = ("role", "department", "location")  # roles first: "Data Analyst" before "Data"
+
+_FUNCTION_NAMES = {"avg": "average", "count": "count", "sum": "total", "max": "highest", "min": "lowest"}
+
+
+def read_hr_rows(csv_path: Path) -> List[Dict[str, Any]]:
+    """
+    Read hr_data.csv into typed row dicts; empty cells become None.
+    """
+    rows = []
+    with open(csv_path, "r", encoding="utf-8-sig", newline="") as f:
+        for record in csv.DictReader(f):
+            row = {}
+            for column, sql_type in HR_COLUMNS.items():
+                value = (record.get(column) or "").strip()
+                cast = _CASTS.get(sql_type)
+                row[column] = (cast(value) if cast else value) if value else None
+            rows.append(row)
+    return rows
+
+
+def build_hr_table(rows: List[Dict[str, Any]], db_path: Path, allowed_roles: List[str]) -> None:
+    """
+    Write rows to a fresh SQLite file and atomically swap it in, so readers never
+    see a half-built table. The roles allowed to query it are stored alongside.
+    """
+    tmp_path = db_path.with_name(f"{db_path.name}.tmp")
+    if tmp_path.exists():
+        tmp_path.unlink()
+
+    columns = ", ".join(f"{name} {sql_type}" for name, sql_type in HR_COLUMNS.items())
+    placeholders = ", ".join("?" for _ in HR_COLUMNS)
+    conn = sqlite3.connect(tmp_path)
+    try:
+        with conn:
+            conn.execute(f"CREATE TABLE employees ({columns})")
+            conn.executemany(
+                f"INSERT INTO employees VALUES ({placeholders})",
+                ([row[c] for c in HR_COLUMNS] for row in rows),
+            )
+            for column in INDEXED_COLUMNS:
+                conn.execute(f"CREATE INDEX idx_employees_{column} ON employees ({column})")
+            conn.execute("CREATE TABLE allowed_roles (role TEXT PRIMARY KEY)")
+            conn.executemany("INSERT INTO allowed_roles VALUES (?)", ((r,) for r in allowed_roles))
+    finally:
+        conn.close()
+    os.replace(tmp_path, db_path)
+
+
+def row_text(row: Dict[str, Any]) -> str:
+    """
+    One employee row as a sentence, for the free-text (embedding) lookup path.
+    """
+    return (
+        f"Employee {row['employee_id']}: {row['full_name']}, {row['role']} in the {row['department']} "
+        f"department, based in {row['location']}, email {row['email']}. Born {row['date_of_birth']}, "
+        f"joined {row['date_of_joining']}, reports to {row['manager_id']}. Salary {row['salary']}. "
+        f"Leave balance {row['leave_balance']}, leaves taken {row['leaves_taken']}, "
+        f"attendance {row['attendance_pct']}%. Performance rating {row['performance_rating']} "
+        f"(last review {row['last_review_date']})."
+    )
+
+
+class HRTable:
+    """
+    Read-only access to the HR table built by ingest.py, for aggregate questions
+    ("average attendance by department", "how many employees in Pune") that
+    retrieval over embedded rows cannot answer.
+
+    Every call opens a short-lived read-only connection, so a re-ingest that swaps
+    the file is picked up on the next question. With a role registry
+    (retrieval.RoleRegistry), any role that reads the "hr" group may query the
+    table, including roles added after it was built.
+    """
+
+    def __init__(self, db_path: Path, registry=None):
+        self.db_path = Path(db_path)
+        self.registry = registry
+        self._filter_values = None
+        self._filter_values_mtime = None
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True)
+
+    def available(self) -> bool:
+        return self.db_path.exists()
+
+    def can_read(self, role: str) -> bool:
+        if not self.available():
+            return False
+        if self.registry is not None:
+            return "hr" in self.registry.get(role, [])
+        conn = self._connect()
+        try:
+            return conn.execute("SELECT 1 FROM allowed_roles WHERE role = ?", (role,)).fetchone() is not None
+        finally:
+            conn.close()
+
+    def aggregate(
+        self,
+        role: str,
+        function: str,
+        column: Optional[str] = None,
+        group_by: Optional[str] = None,
+        filters: Optional[Dict[str, str]] = None,
+    ) -> List[tuple]:
+        """
+        Run one aggregate query for a role allowed to read HR data.
+
+        Args:
+            role: Role of the caller; raises PermissionError if it may not read HR data.
+            function: One of avg, count, sum, max, min.
+            column: Numeric column to aggregate; may be None for count.
+            group_by: Optional column to group by.
+            filters: Optional column -> exact value conditions.
+
+        Returns:
+            Rows of (group value, aggregate, employees) when grouped, else one
+            row of (aggregate, employees).
+        """
+        if not self.can_read(role):
+            raise PermissionError(f"Role '{role}' cannot read HR records")
+        if function not in _FUNCTION_NAMES:
+            raise ValueError(f"Unsupported aggregate: {function}")
+        for name in [column, group_by, *(filters or {})]:
+            if name is not None and name not in HR_COLUMNS:
+                raise ValueError(f"Unknown HR column: {name}")
+
+        target = "*" if column is None else column
+        select = f"{function.upper()}({target}), COUNT(*)"
+        where = " AND ".join(f"{c} = ?" for c in filters or {})
+        sql = f"SELECT {group_by + ', ' if group_by else ''}{select} FROM employees"
+        if where:
+            sql += f" WHERE {where}"
+        if group_by:
+            sql += f" GROUP BY {group_by} ORDER BY 2 DESC"
+
+        conn = self._connect()
+        try:
+            return conn.execute(sql, list((filters or {}).values())).fetchall()
+        finally:
+            conn.close()
+
+    def _top_rows(self, column: str, function: str, filters: Dict[str, str], limit: int = 5) -> List[tuple]:
+        where = " AND ".join(f"{c} = ?" for c in filters)
+        order = "DESC" if function == "max" else "ASC"
+        sql = f"SELECT employee_id, full_name, department, {column} FROM employees"
+        if where:
+            sql += f" WHERE {where}"
+        sql += f" ORDER BY {column} {order} LIMIT {int(limit)}"
+
+        conn = self._connect()
+        try:
+            return conn.execute(sql, list(filters.values())).fetchall()
+        finally:
+            conn.close()
+
+    def _known_values(self) -> Dict[str, List[str]]:
+        """
+        Distinct role/department/location values, reloaded when the table file changes.
+        """
+        mtime = self.db_path.stat().st_mtime_ns
+        if self._filter_values is None or mtime != self._filter_values_mtime:
+            conn = self._connect()
+            try:
+                self._filter_values = {
+                    column: [v for (v,) in conn.execute(f"SELECT DISTINCT {column} FROM employees") if v]
+                    for column in _FILTER_COLUMNS
+                }
+            finally:
+                conn.close()
+            self._filter_values_mtime = mtime
+        return self._filter_values
+
+    def parse_question(self, query: str) -> Optional[Dict[str, Any]]:
+        """
+        Recognize an aggregate question over the HR table.
+
+        Returns:
+            {"function", "column", "group_by", "filters"} or None when the question
+            is not an aggregate over employee records.
+        """
+        text = (query or "").lower()
+        function = next((name for name, pattern in _FUNCTIONS if pattern.search(text)), None)
+        if function is None:
+            return None
+
+        column = next((name for name, pattern in _METRICS if pattern.search(text)), None)
+        group = _GROUP_BY.search(text)
+        group_by = _GROUP_COLUMNS[group.group(1) or group.group(2)] if group else None
+
+        filters = {}
+        remaining = text
+        for filter_column, values in self._known_values().items():
+            for value in sorted(values, key=len, reverse=True):
+                pattern = re.compile(rf"\b{re.escape(value.lower())}s?\b")
+                if filter_column != group_by and pattern.search(remaining):
+                    filters[filter_column] = value
+                    remaining = pattern.sub(" ", remaining)
+                    break
+
+        # Every aggregate must be over employee records: the question mentions employees,
+        # groups them or names a department, role or location. "What is the minimum
+        # attendance required by policy?" is a policy question for the documents.
+        if not (_EMPLOYEES.search(text) or group_by or filters):
+            return None
+        if _POLICY.search(text) and not (group_by or filters):
+            return None
+
+        if column is None:
+            # Only a head count makes sense without a metric: "how many employees are
+            # there", "in Pune" or "per department". "How many sick days do employees
+            # get?" counts something the table does not hold.
+            if function not in ("count", "max", "min"):
+                return None
+            if not (filters or group_by or _HEADCOUNT.search(text)):
+                return None
+            function = "count"
+        elif function == "count" and column in ("leave_balance", "leaves_taken"):
+            function = "sum"  # "how many leaves were taken" adds up days
+
+        return {"function": function, "column": column, "group_by": group_by, "filters": filters}
+
+    def answer(self, role: str, query: str) -> Optional[str]:
+        """
+        Answer an aggregate HR question as a context block for the LLM, or None if the
+        role cannot read HR data, the table is missing, or the question is not an aggregate.
+        """
+        if not self.can_read(role):
+            return None
+        spec = self.parse_question(query)
+        if spec is None:
+            return None
+
+        function, column, group_by, filters = spec["function"], spec["column"], spec["group_by"], spec["filters"]
+        rows = self.aggregate(role, function, column, group_by, filters)
+
+        label = _FUNCTION_NAMES[function] + (f" {column}" if column else " of employees")
+        scope = ", ".join(f"{c} = {v}" for c, v in filters.items()) or "all employees"
+        title = f"HR records ({scope}): {label}" + (f" by {group_by}" if group_by else "")
+
+        def fmt(value):
+            return f"{value:.2f}" if isinstance(value, float) else str(value)
+
+        def line(name, value, n):
+            return f"- {name}: {n} employees" if function == "count" else f"- {name}: {fmt(value)} ({n} employees)"
+
+        if group_by:
+            lines = [line(group, value, n) for group, value, n in rows]
+        else:
+            lines = [line(label, *rows[0])]
+            if function in ("max", "min") and column:
+                lines += [
+                    f"- {employee_id} {name} ({department}): {fmt(v)}"
+                    for employee_id, name, department, v in self._top_rows(column, function, filters)
+                ]
+
+        return "\n".join([title, *lines])
@@ -1,10 +1,23 @@
 import os
 import json
+import hashlib
 import logging
+import shutil
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import islice
 from pathlib import Path
 import chromadb
 from chromadb.utils import embedding_functions
 from dotenv import load_dotenv
+from bm25 import BM25_DIR, IDF_FILE, build_indexes
+from chunker import EMBEDDING_MODEL, chunking_settings, clean_lines, rechunk
+from extract import ingest_file, iter_markdown_files, read_chunked_report, write_chunked_report
+from hr_table import HR_TABLE_FILE, build_hr_table, read_hr_rows, row_text
+from quantized_index import QUANTIZED_DIR, build_quantized_index, collection_space, index_is_current
+from retrieval import ACCESS_FILE, RoleRegistry
+from snapshots import SNAPSHOTS_DIR, create_snapshot, current_snapshot, finish_snapshot, prune_snapshots, publish_snapshot
 
 load_dotenv()
 
@@ -16,108 +29,211 @@ _ROOT_DATA_DIR_ENV = os.getenv("ROOT_DATA_DIR")
 DEFAULT_DATA_DIR = Path(__file__).resolve().parents[1] / "data"
 ROOT_DATA_DIR = Path(_ROOT_DATA_DIR_ENV) if _ROOT_DATA_DIR_ENV else DEFAULT_DATA_DIR
 
-def batch_process_all_data(root_dir):
-    all_processed_chunks = []
+COLLECTION_NAME = "corporate_documents"
+
+# Bumped after every write so the API can drop answers cached against older data
+INGEST_VERSION_FILE = "INGEST_VERSION"
+# File hashes and chunk IDs of the last run, used by run_incremental_ingestion
+MANIFEST_FILE = "ingest_manifest.json"
+# Employee records, loaded into a SQLite table (hr_table.py) rather than chunked as prose
+HR_CSV_FILE = "hr_data.csv"
+# Chunks embedded and upserted per call by the streaming pipeline
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "256"))
+
+# Finished snapshots kept on disk by run_snapshot_ingestion (the live one always is)
+SNAPSHOT_KEEP = int(os.getenv("SNAPSHOT_KEEP", "3"))
+
+# Storage type of the memory-mapped index read by VECTOR_STORE_MODE=quantized: int8 or float16
+QUANTIZED_DTYPE = os.getenv("QUANTIZED_DTYPE", "int8")
+# Also write the float32 matrix, so the API re-scores its top candidates exactly (4x the disk of int8)
+QUANTIZED_KEEP_FLOAT32 = os.getenv("QUANTIZED_KEEP_FLOAT32", "false").lower() == "true"
+
+ROLE_PERMISSIONS = {
+    "finance": ["Finance_Team", "God_Tier_Admins"],
+    "marketing": ["Marketing_Team", "God_Tier_Admins"],
+    "hr": ["HR_Team", "God_Tier_Admins"],
+    "engineering": ["Engineering_Department", "God_Tier_Admins"],
+    "general": [
+        "Employee_Level",
+        "Finance_Team",
+        "Marketing_Team",
+        "HR_Team",
+        "Engineering_Department",
+        "God_Tier_Admins",
+    ],
+}
+
+
+# Directory ingestion writes to: chroma_db/, or a snapshot directory (run_snapshot_ingestion).
+# Read from the environment so parser processes started by spawn see the same one.
+DB_PATH = Path(os.getenv("INGEST_DB_DIR") or ROOT_DATA_DIR / "chroma_db")
+
+# Bit position per department and the departments each role reads; chunks only store a bitmask
+access_registry = RoleRegistry(DB_PATH / ACCESS_FILE)
+
 
-    role_permissions = {
-        "finance": ["Finance_Team", "God_Tier_Admins"],
-        "marketing": ["Marketing_Team", "God_Tier_Admins"],
-        "hr": ["HR_Team", "God_Tier_Admins"],
-        "engineering": ["Engineering_Department", "God_Tier_Admins"],
-        "general": [
-            "Employee_Level",
-            "Finance_Team",
-            "Marketing_Team",
-            "HR_Team",
-            "Engineering_Department",
-            "God_Tier_Admins",
-        ],
+def use_db_path(path):
+    """
+    Point every following ingestion step, and the parser processes it starts, at path.
+    """
+    global DB_PATH, access_registry
+    DB_PATH = Path(path)
+    access_registry = RoleRegistry(DB_PATH / ACCESS_FILE)
+    os.environ["INGEST_DB_DIR"] = str(DB_PATH)
+
+
+def _register_access():
+    """
+    Record ROLE_PERMISSIONS in the role registry before any chunk is built, so every
+    department has its bit (parser processes only read the file). Roles added to the
+    registry by hand are kept.
+    """
+    roles = {}
+    for department, department_roles in ROLE_PERMISSIONS.items():
+        for role in department_roles:
+            roles.setdefault(role, []).append(department)
+    access_registry.register(roles)
+
+
+def partition_collection_name(collection_name, department):
+    # must match DepartmentRouter in app/utils/vector_store.py
+    return f"{collection_name}_{department}"
+
+
+def _content_digest(*parts):
+    h = hashlib.sha1()
+    for part in parts:
+        h.update(str(part).encode("utf-8"))
+        h.update(b"\x00")
+    return h.hexdigest()[:16]
+
+
+def _chunk_metadata(chunk_id, department, filename, section, sub_hierarchy):
+    # Access is one bitmask; which roles it admits lives in the role registry, not on the chunk
+    return {
+        "chunk_id": chunk_id,
+        "source": filename,
+        "section": section,
+        "sub_hierarchy": sub_hierarchy,
+        "department": department,
+        "access_mask": access_registry.group_mask(department),
     }
 
+
+def build_chunks(items, department, filename):
+    """
+    Turn the section items of one chunked report into chunks ready for ChromaDB.
+
+    Items are first re-cut to the embedding model's token budget by chunker.rechunk.
+
+    Chunk IDs are content-addressed ("<department>_<report>_<hash>"), so editing one
+    section only changes that section's ID instead of shifting every later one.
+    """
+    chunks = []
+    seen_digests = {}
+
+    for item in rechunk(items):
+        content_string = " ".join(clean_lines(item.get("content", [])))
+
+        if not content_string:
+            headings = [
+                item.get("section") or "",
+                item.get("subsection") or "",
+                item.get("subsubsection") or "",
+            ]
+            content_string = " ".join([h for h in headings if h]).strip()
+
+        sub = item.get("subsection", "N/A")
+        subsub = item.get("subsubsection", "N/A")
+
+        if sub != "N/A" and subsub != "N/A":
+            combined_sub = f"{sub} > {subsub}"
+        elif sub != "N/A":
+            combined_sub = sub
+        else:
+            combined_sub = subsub
+
+        section = item.get("section", "N/A")
+
+        # identical sections in one report get an occurrence suffix to stay unique
+        digest = _content_digest(section, combined_sub, content_string)
+        occurrence = seen_digests.get(digest, 0)
+        seen_digests[digest] = occurrence + 1
+        chunk_id = f"{department}_{filename.replace('.json', '')}_{digest}"
+        if occurrence:
+            chunk_id = f"{chunk_id}_{occurrence}"
+
+        chunks.append({
+            "id": chunk_id,
+            "text": content_string,
+            "metadata": _chunk_metadata(chunk_id, department, filename, section, combined_sub),
+        })
+
+    return chunks
+
+
+def build_row_chunks(rows, department, filename):
+    """
+    One chunk per employee row of a structured file, for free-text lookups ("who is
+    FINEMP1003's manager?"). Aggregates are answered from the SQLite table instead.
+    """
+    chunks = []
+    for row in rows:
+        text = row_text(row)
+        chunk_id = f"{department}_{Path(filename).stem}_{_content_digest(text)}"
+        chunks.append({
+            "id": chunk_id,
+            "text": text,
+            "metadata": _chunk_metadata(
+                chunk_id, department, filename, "Employee Records", f"{row['full_name']} ({row['employee_id']})"
+            ),
+        })
+    return chunks
+
+
+def _process_hr_csv(db_path):
+    """
+    Load data/hr/hr_data.csv into the SQLite HR table and build its row chunks.
+    :return: Tuple of (manifest key, file sha256, chunks), or None without the CSV
+    """
+    csv_path = ROOT_DATA_DIR / "hr" / HR_CSV_FILE
+    if not csv_path.exists():
+        return None
+
+    rows = read_hr_rows(csv_path)
+    build_hr_table(rows, db_path / HR_TABLE_FILE, ROLE_PERMISSIONS["hr"])
+    logger.info(f"Loaded {len(rows)} rows of {csv_path.name} into {HR_TABLE_FILE}")
+    return f"hr/{HR_CSV_FILE}", _file_sha256(csv_path), build_row_chunks(rows, "hr", HR_CSV_FILE)
+
+
+def batch_process_all_data(root_dir):
+    all_processed_chunks = []
+
     for role_folder in os.listdir(root_dir):
         role_path = os.path.join(root_dir, role_folder)
 
-        if os.path.isdir(role_path) and role_folder in role_permissions:
+        if os.path.isdir(role_path) and role_folder in ROLE_PERMISSIONS:
             chunked_reports_path = os.path.join(role_path, "chunked_reports")
 
             if os.path.exists(chunked_reports_path):
                 logger.info(f"Processing {role_folder} data...")
 
                 for filename in os.listdir(chunked_reports_path):
-                    if filename.endswith(".json"):
+                    if filename.endswith((".json", ".jsonl")):
                         file_path = os.path.join(chunked_reports_path, filename)
 
                         try:
-                            with open(file_path, 'r', encoding='utf-8') as file:
-                                data = json.load(file)
-                                if not isinstance(data, list):
-                                    data = [data]
+                            data = read_chunked_report(Path(file_path))
                         except (json.JSONDecodeError, OSError) as e:
                             logger.error(f"Failed to read JSON {file_path}: {e}")
                             continue
 
-                        for i, item in enumerate(data):
-                            raw_lines = item.get("content", [])
-                            clean_lines = []
-
-
-                            for line in raw_lines:
-                                s = str(line).strip()
-                                if s and s != "```" and "---" not in s:
-                                    clean_lines.append(s)
-
-                            content_string = " ".join(clean_lines)
-
-                            if not content_string:
-                                headings = [
-                                    item.get("section") or "",
-                                    item.get("subsection") or "",
-                                    item.get("subsubsection") or "",
-                                ]
-                                content_string = " ".join([h for h in headings if h]).strip()
-
-                            chunk_id = f"{role_folder}_{filename.replace('.json', '')}_{i}"
-
-                            sub = item.get("subsection", "N/A")
-                            subsub = item.get("subsubsection", "N/A")
-
-                            if sub != "N/A" and subsub != "N/A":
-                                combined_sub = f"{sub} > {subsub}"
-                            elif sub != "N/A":
-                                combined_sub = sub
-                            else:
-                                combined_sub = subsub
-
-                            # Build metadata with role flags and a string field for allowed_roles
-                            allowed_roles = role_permissions[role_folder]
-                            metadata = {
-                                "chunk_id": chunk_id,
-                                "source": filename,
-                                "section": item.get("section", "N/A"),
-                                "sub_hierarchy": combined_sub,
-                                "allowed_roles": ",".join(allowed_roles),
-                                "department": role_folder,
-                            }
-                            for r in allowed_roles:
-                                metadata[f"role_{r}"] = True
-
-                            processed_chunk = {
-                                "id": chunk_id,
-                                "text": content_string,
-                                "metadata": metadata,
-                            }
-
-                            all_processed_chunks.append(processed_chunk)
+                        # source and chunk IDs do not depend on the report format
+                        source_name = f"{Path(filename).stem}.json"
+                        all_processed_chunks.extend(build_chunks(data, role_folder, source_name))
     return all_processed_chunks
 
-def save_to_chromadb(chunks, collection_name="documents"):
-    CHROMA_DB_PATH = ROOT_DATA_DIR / "chroma_db"
-    CHROMA_DB_PATH.mkdir(parents=True, exist_ok=True)
-    client = chromadb.PersistentClient(path=str(CHROMA_DB_PATH))
-    embedder = embedding_functions.SentenceTransformerEmbeddingFunction(model_name="all-MiniLM-L6-v2")
-    collection = client.get_or_create_collection(name=collection_name, embedding_function=embedder)
-
-    
+def _upsert_chunks(collection, chunks, embeddings=None):
     cleaned_chunks = []
     for chunk in chunks:
         cleaned_metadata = {k: v for k, v in chunk['metadata'].items() if v is not None}
@@ -127,7 +243,6 @@ def save_to_chromadb(chunks, collection_name="documents"):
             'metadata': cleaned_metadata
         })
 
-    
     documents = [chunk['text'] for chunk in cleaned_chunks]
     metadatas = [chunk['metadata'] for chunk in cleaned_chunks]
     ids = [chunk['id'] for chunk in cleaned_chunks]
@@ -136,21 +251,522 @@ def save_to_chromadb(chunks, collection_name="documents"):
         collection.upsert(
             documents=documents,
             metadatas=metadatas,
-            ids=ids
+            ids=ids,
+            embeddings=embeddings,
         )
     except Exception as e:
         logger.error(f"ChromaDB upsert failed: {e}")
         raise
 
-    return collection
 
-def run_chunking():
+def _open_chromadb():
+    CHROMA_DB_PATH = DB_PATH
+    CHROMA_DB_PATH.mkdir(parents=True, exist_ok=True)
+    client = chromadb.PersistentClient(path=str(CHROMA_DB_PATH))
+    embedder = embedding_functions.SentenceTransformerEmbeddingFunction(model_name=EMBEDDING_MODEL)
+    return CHROMA_DB_PATH, client, embedder
+
+
+def save_to_chromadb(chunks, collection_name="documents", partition_by_department=False, rebuild=False):
+    """
+    Embed and upsert chunks into ChromaDB.
+
+    With partition_by_department, each department in ROLE_PERMISSIONS gets its own
+    collection named "<collection_name>_<department>", so queries only search the
+    departments a role can read and one department can be rebuilt on its own.
+    rebuild drops the target collection(s) first so stale chunks do not linger.
+
+    :return: the collection, or a {department: collection} dict when partitioned
+    """
+    CHROMA_DB_PATH, client, embedder = _open_chromadb()
+
+    if not partition_by_department:
+        if rebuild:
+            _drop_collection(client, collection_name)
+        collection = client.get_or_create_collection(name=collection_name, embedding_function=embedder)
+        _upsert_chunks(collection, chunks)
+        _bump_ingest_version(CHROMA_DB_PATH)
+        return collection
+
+    by_department = {}
+    for chunk in chunks:
+        by_department.setdefault(chunk['metadata']['department'], []).append(chunk)
+
+    collections = {}
+    for department, department_chunks in by_department.items():
+        if department not in ROLE_PERMISSIONS:
+            logger.warning(f"Skipping {len(department_chunks)} chunks with unknown department '{department}'")
+            continue
+
+        name = partition_collection_name(collection_name, department)
+        if rebuild:
+            _drop_collection(client, name)
+        collection = client.get_or_create_collection(name=name, embedding_function=embedder)
+        _upsert_chunks(collection, department_chunks)
+        collections[department] = collection
+
+    _bump_ingest_version(CHROMA_DB_PATH)
+    return collections
+
+
+def _bump_ingest_version(db_path):
+    tmp_path = db_path / f"{INGEST_VERSION_FILE}.tmp"
+    tmp_path.write_text(str(time.time_ns()), encoding="utf-8")
+    os.replace(tmp_path, db_path / INGEST_VERSION_FILE)
+
+
+def _drop_collection(client, name):
+    try:
+        client.delete_collection(name=name)
+    except Exception:
+        # collection did not exist yet
+        pass
+
+
+def _delete_stale(collection, keep_ids, departments=None):
+    """
+    Delete chunks that are no longer produced by ingestion (optionally only within departments).
+    """
+    where = {"department": {"$in": list(departments)}} if departments else None
+    existing = collection.get(where=where, include=[])["ids"]
+    stale = [i for i in existing if i not in keep_ids]
+    if stale:
+        collection.delete(ids=stale)
+        logger.info(f"Deleted {len(stale)} stale chunks from '{collection.name}'")
+
+
+def _iter_collection_chunks(collection, page_size=1000, with_embeddings=False):
+    include = ["documents", "metadatas", "embeddings"] if with_embeddings else ["documents", "metadatas"]
+    offset = 0
+    while True:
+        page = collection.get(include=include, limit=page_size, offset=offset)
+        embeddings = page["embeddings"] if with_embeddings else [None] * len(page["ids"])
+        for chunk_id, text, metadata, embedding in zip(page["ids"], page["documents"], page["metadatas"], embeddings):
+            chunk = {"id": chunk_id, "text": text, "metadata": metadata or {}}
+            if with_embeddings:
+                chunk["embedding"] = embedding
+            yield chunk
+        if len(page["ids"]) < page_size:
+            return
+        offset += page_size
+
+
+def _stored_collections(client, partition_by_department):
+    if partition_by_department:
+        names = [partition_collection_name(COLLECTION_NAME, d) for d in ROLE_PERMISSIONS]
+    else:
+        names = [COLLECTION_NAME]
+
+    for name in names:
+        try:
+            yield client.get_collection(name=name)
+        except Exception:
+            # department without a collection yet
+            continue
+
+
+def _iter_stored_chunks(client, partition_by_department, with_embeddings=False):
+    for collection in _stored_collections(client, partition_by_department):
+        yield from _iter_collection_chunks(collection, with_embeddings=with_embeddings)
+
+
+def _write_search_indexes(client, db_path, partition_by_department):
+    """
+    Rebuild the indexes derived from what the collection(s) now hold: the per-department
+    BM25 indexes (bm25.py) and the memory-mapped quantized matrix (quantized_index.py).
+    Both always match the vector side, whichever ingestion path ran.
+    """
+    written = build_indexes(_iter_stored_chunks(client, partition_by_department), db_path / BM25_DIR)
+    logger.info(f"BM25 index: {sum(written.values())} chunks in {len(written)} department(s)")
+
+    collections = list(_stored_collections(client, partition_by_department))
+    written = build_quantized_index(
+        _iter_stored_chunks(client, partition_by_department, with_embeddings=True),
+        db_path / QUANTIZED_DIR,
+        dtype=QUANTIZED_DTYPE,
+        keep_float32=QUANTIZED_KEEP_FLOAT32,
+        # distances are reported in the collections' space, so cutoffs match Chroma's
+        space=collection_space(collections[0]) if collections else "cosine",
+    )
+    logger.info(f"Quantized ({QUANTIZED_DTYPE}) index: {sum(written.values())} chunks")
+
+
+# Manifest of markdown file hashes and the chunk IDs each file produced
+def _file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _load_manifest(db_path):
+    try:
+        with open(db_path / MANIFEST_FILE, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def _save_manifest(db_path, files, partition_by_department):
+    manifest = {
+        "collection_name": COLLECTION_NAME,
+        "partitioned": partition_by_department,
+        "role_permissions": ROLE_PERMISSIONS,
+        "access_groups": access_registry.groups(),
+        "chunking": chunking_settings(),
+        "files": files,
+    }
+    tmp_path = db_path / f"{MANIFEST_FILE}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False)
+    os.replace(tmp_path, db_path / MANIFEST_FILE)
+
+
+def _manifest_files(chunks):
+    files = {}
+    for chunk in chunks:
+        department = chunk["metadata"]["department"]
+        source = chunk["metadata"]["source"]
+        # markdown chunks name their chunked report, structured ones (hr_data.csv) their own file
+        name = source if source.endswith(".csv") else f"{source.replace('.json', '')}.md"
+        key = f"{department}/{name}"
+        if key not in files:
+            path = ROOT_DATA_DIR / department / name
+            files[key] = {"sha256": _file_sha256(path) if path.exists() else None, "chunks": []}
+        files[key]["chunks"].append(chunk["id"])
+    return files
+
+
+def _record_manifest(db_path, files, partition_by_department, departments=None):
+    """
+    Record which chunks each markdown file produced after a full (non-incremental) run.
+    When only some departments were rebuilt, entries of the other departments are kept.
+    """
+    manifest = _load_manifest(db_path)
+    if departments and manifest and manifest.get("partitioned") == partition_by_department:
+        kept = {k: v for k, v in manifest["files"].items() if k.split("/")[0] not in departments}
+        files = {**kept, **files}
+
+    _save_manifest(db_path, files, partition_by_department)
+
+
+def run_chunking(partition_by_department=False, departments=None):
+    _register_access()
     processed_chunks = batch_process_all_data(ROOT_DATA_DIR)
+    if not departments or "hr" in departments:
+        DB_PATH.mkdir(parents=True, exist_ok=True)
+        hr = _process_hr_csv(DB_PATH)
+        if hr:
+            processed_chunks.extend(hr[2])
+    if departments:
+        processed_chunks = [c for c in processed_chunks if c['metadata']['department'] in departments]
     logger.info(f"Total processed chunks: {len(processed_chunks)}")
 
     if not processed_chunks:
         logger.warning("No chunks processed. Aborting save.")
         return
 
-    collection = save_to_chromadb(processed_chunks, collection_name="corporate_documents")
-    logger.info(f"ChromaDB collection '{collection.name}' now has {collection.count()} documents.")
+    if not partition_by_department:
+        collection = save_to_chromadb(processed_chunks, collection_name=COLLECTION_NAME)
+        _delete_stale(collection, {c['id'] for c in processed_chunks}, departments)
+        logger.info(f"ChromaDB collection '{collection.name}' now has {collection.count()} documents.")
+    else:
+        # Partitions are rebuilt from scratch, which only touches the departments being ingested
+        collections = save_to_chromadb(
+            processed_chunks,
+            collection_name=COLLECTION_NAME,
+            partition_by_department=True,
+            rebuild=True,
+        )
+        for department, collection in collections.items():
+            logger.info(f"ChromaDB collection '{collection.name}' now has {collection.count()} documents.")
+
+    db_path = DB_PATH
+    _write_search_indexes(chromadb.PersistentClient(path=str(db_path)), db_path, partition_by_department)
+    _record_manifest(db_path, _manifest_files(processed_chunks), partition_by_department, departments)
+
+
+def run_incremental_ingestion(partition_by_department=False):
+    """
+    Re-ingest only what changed since the last run, using the manifest of file hashes and chunk IDs.
+
+    Unchanged markdown files and hr_data.csv are skipped without being parsed. For
+    changed files only chunks with new content-addressed IDs are embedded and upserted,
+    and chunks that disappeared (including those of deleted files) are removed. Without a usable
+    manifest, or when role permissions, chunking settings or the partitioning mode
+    changed, everything is re-synced once and anything the collection(s) hold beyond
+    the current chunks is deleted.
+    """
+    _register_access()
+    db_path, client, embedder = _open_chromadb()
+    manifest = _load_manifest(db_path)
+    full_sync = (
+        manifest is None
+        or manifest.get("partitioned") != partition_by_department
+        or manifest.get("role_permissions") != ROLE_PERMISSIONS
+        or manifest.get("access_groups") != access_registry.groups()
+        or manifest.get("chunking") != chunking_settings()
+    )
+    old_files = {} if full_sync else manifest["files"]
+    if full_sync:
+        logger.info("No usable ingest manifest, running a full sync.")
+
+    files = {}
+    upserts = []
+    deletes = []
+    hr_csv = ROOT_DATA_DIR / "hr" / HR_CSV_FILE
+    paths = sorted(ROOT_DATA_DIR.glob("*/*.md")) + ([hr_csv] if hr_csv.exists() else [])
+    for path in paths:
+        department = path.parent.name
+        if department not in ROLE_PERMISSIONS:
+            continue
+
+        key = f"{department}/{path.name}"
+        digest = _file_sha256(path)
+        old = old_files.get(key)
+        if old and old["sha256"] == digest and (path != hr_csv or (db_path / HR_TABLE_FILE).exists()):
+            files[key] = old
+            continue
+
+        if path == hr_csv:
+            chunks = _process_hr_csv(db_path)[2]
+        else:
+            items = ingest_file(path)
+            write_chunked_report(path, items)
+            chunks = build_chunks(items, department, f"{path.stem}.json")
+
+        old_ids = set(old["chunks"]) if old else set()
+        new_ids = [c["id"] for c in chunks]
+        upserts.extend(c for c in chunks if c["id"] not in old_ids)
+        deletes.extend((department, i) for i in old_ids.difference(new_ids))
+        files[key] = {"sha256": digest, "chunks": new_ids}
+        logger.info(f"{key} changed: {len(chunks)} chunks, {len(new_ids) - len(old_ids & set(new_ids))} new")
+
+    for key, old in old_files.items():
+        if key not in files:
+            deletes.extend((key.split("/")[0], i) for i in old["chunks"])
+            logger.info(f"{key} was removed: deleting {len(old['chunks'])} chunks")
+
+    def target_name(department):
+        if partition_by_department:
+            return partition_collection_name(COLLECTION_NAME, department)
+        return COLLECTION_NAME
+
+    def target(department):
+        return client.get_or_create_collection(name=target_name(department), embedding_function=embedder)
+
+    _pipelined_upsert(upserts, target, embedder)
+
+    stale_by_department = {}
+    for department, chunk_id in deletes:
+        stale_by_department.setdefault(department, []).append(chunk_id)
+    for department, ids in stale_by_department.items():
+        target(department).delete(ids=ids)
+
+    if full_sync:
+        keep_ids = {i for entry in files.values() for i in entry["chunks"]}
+        for name in {target_name(department) for department in ROLE_PERMISSIONS}:
+            _delete_stale(client.get_or_create_collection(name=name, embedding_function=embedder), keep_ids)
+
+    _save_manifest(db_path, files, partition_by_department)
+    missing_index = not (db_path / BM25_DIR / IDF_FILE).exists() or not index_is_current(db_path / QUANTIZED_DIR)
+    if upserts or deletes or full_sync or missing_index:
+        _write_search_indexes(client, db_path, partition_by_department)
+    if upserts or deletes or full_sync:
+        _bump_ingest_version(db_path)
+
+    logger.info(f"Incremental ingestion: {len(upserts)} chunks upserted, {len(deletes)} deleted.")
+
+
+# Streaming ingestion pipeline
+def _process_markdown_file(md_path):
+    """
+    Parse and clean one markdown file. Runs in a worker process.
+    :return: Tuple of (manifest key, file sha256, chunks)
+    """
+    department = md_path.parent.name
+    items = ingest_file(md_path)
+    write_chunked_report(md_path, items)
+    chunks = build_chunks(items, department, f"{md_path.stem}.json")
+    return f"{department}/{md_path.name}", _file_sha256(md_path), chunks
+
+
+def iter_processed_files(md_paths, workers=None):
+    """
+    Yield _process_markdown_file results in input order, parsing files in a process pool.
+    At most 2 * workers files are in flight, so memory does not grow with the corpus.
+    """
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for md_path in md_paths:
+            pending.append(pool.submit(_process_markdown_file, md_path))
+            if len(pending) >= workers * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def _batched(iterable, size):
+    it = iter(iterable)
+    while batch := list(islice(it, size)):
+        yield batch
+
+
+def _write_batch(batch, embeddings, collection_for):
+    by_department = {}
+    for chunk, embedding in zip(batch, embeddings):
+        chunks, vectors = by_department.setdefault(chunk["metadata"]["department"], ([], []))
+        chunks.append(chunk)
+        vectors.append(embedding)
+
+    for department, (chunks, vectors) in by_department.items():
+        _upsert_chunks(collection_for(department), chunks, vectors)
+    return len(batch)
+
+
+def _pipelined_upsert(chunks, collection_for, embedder, batch_size=EMBED_BATCH_SIZE):
+    """
+    Embed chunks in fixed-size batches and upsert them, overlapping the embedding of
+    batch N+1 with the ChromaDB write of batch N. At most two batches are held at once.
+
+    :param chunks: iterable of chunks, consumed lazily
+    :param collection_for: department -> collection to write to
+    :return: number of chunks written
+    """
+    started = time.perf_counter()
+    written = 0
+
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix="chroma-writer") as writer:
+        in_flight = None
+        for batch in _batched(chunks, batch_size):
+            embeddings = embedder([chunk["text"] for chunk in batch])
+            if in_flight is not None:
+                written += in_flight.result()
+                _log_progress(written, started)
+            in_flight = writer.submit(_write_batch, batch, embeddings, collection_for)
+
+        if in_flight is not None:
+            written += in_flight.result()
+            _log_progress(written, started)
+
+    return written
+
+
+def _log_progress(written, started):
+    elapsed = time.perf_counter() - started
+    logger.info(f"Ingested {written} chunks ({written / elapsed if elapsed else 0:.1f} chunks/sec)")
+
+
+def run_pipeline(partition_by_department=False, departments=None, workers=None, batch_size=EMBED_BATCH_SIZE):
+    """
+    Full ingestion from markdown (and hr_data.csv) to ChromaDB as one streaming pipeline.
+
+    Files are parsed and cleaned in a process pool, chunks are embedded in fixed-size
+    batches, and each batch's upsert overlaps with embedding the next one. Peak memory
+    is bounded by the pool window and two batches, not by the corpus size. Like
+    run_chunking, partitions are rebuilt from scratch and stale chunks are deleted from
+    a single collection.
+
+    :return: number of chunks written; 0 when there was nothing to ingest, in which
+             case no index, manifest or version stamp is written
+    """
+    _register_access()
+    db_path, client, embedder = _open_chromadb()
+
+    selected = [d for d in ROLE_PERMISSIONS if not departments or d in departments]
+    md_paths = (p for p in iter_markdown_files(ROOT_DATA_DIR) if p.parent.name in selected)
+
+    if partition_by_department:
+        for department in selected:
+            _drop_collection(client, partition_collection_name(COLLECTION_NAME, department))
+
+    collections = {}
+
+    def collection_for(department):
+        name = partition_collection_name(COLLECTION_NAME, department) if partition_by_department else COLLECTION_NAME
+        if name not in collections:
+            collections[name] = client.get_or_create_collection(name=name, embedding_function=embedder)
+        return collections[name]
+
+    files = {}
+
+    def processed_files():
+        yield from iter_processed_files(md_paths, workers)
+        hr = _process_hr_csv(db_path) if "hr" in selected else None
+        if hr:
+            yield hr
+
+    def chunks():
+        for key, digest, file_chunks in processed_files():
+            files[key] = {"sha256": digest, "chunks": [c["id"] for c in file_chunks]}
+            yield from file_chunks
+
+    written = _pipelined_upsert(chunks(), collection_for, embedder, batch_size)
+    if not written:
+        logger.warning("No chunks processed.")
+        return 0
+
+    if not partition_by_department:
+        keep_ids = {i for entry in files.values() for i in entry["chunks"]}
+        _delete_stale(collection_for(None), keep_ids, departments)
+
+    _write_search_indexes(client, db_path, partition_by_department)
+    _record_manifest(db_path, files, partition_by_department, departments)
+    _bump_ingest_version(db_path)
+
+    for collection in collections.values():
+        logger.info(f"ChromaDB collection '{collection.name}' now has {collection.count()} documents.")
+    return written
+
+
+def run_snapshot_ingestion(incremental=False, publish=True, keep=SNAPSHOT_KEEP, **kwargs):
+    """
+    Ingest into a new directory under ROOT_DATA_DIR/snapshots/ instead of the served one,
+    then publish it by pointing snapshots/CURRENT at it. The API swaps to it without
+    a restart, and requests already running finish on the old snapshot.
+
+    Incremental runs and single-department rebuilds start from a copy of the live
+    snapshot (or of chroma_db/ the first time). Full runs start empty, with only the
+    role registry carried over. Older snapshots beyond keep are deleted afterwards.
+    A run that leaves the snapshot without chunks (nothing to ingest) is discarded
+    instead of being finished and published.
+
+    :param incremental: run_incremental_ingestion instead of run_pipeline
+    :param publish: make the snapshot live once it is complete
+    :param kwargs: passed to run_pipeline (or partition_by_department to run_incremental_ingestion)
+    :return: path of the new snapshot, or None when it was discarded
+    """
+    root = ROOT_DATA_DIR / SNAPSHOTS_DIR
+    live = current_snapshot(root)
+    base_dir = root / live if live else ROOT_DATA_DIR / "chroma_db"
+    path = create_snapshot(root, base_dir, copy_base=incremental or bool(kwargs.get("departments")))
+    logger.info(f"Building snapshot {path.name} (from {base_dir.name})")
+
+    use_db_path(path)
+    written = None
+    if incremental:
+        run_incremental_ingestion(partition_by_department=kwargs.get("partition_by_department", False))
+    else:
+        written = run_pipeline(**kwargs)
+
+    manifest = _load_manifest(path) or {}
+    chunk_count = sum(len(entry["chunks"]) for entry in manifest.get("files", {}).values())
+    if written == 0 or not chunk_count:
+        logger.warning(f"Snapshot {path.name} has no chunks; discarding it, {live or base_dir.name} stays live")
+        shutil.rmtree(path, ignore_errors=True)
+        return None
+
+    finish_snapshot(path, {
+        "base": base_dir.name,
+        "incremental": incremental,
+        "partitioned": manifest.get("partitioned", False),
+        "chunks": chunk_count,
+    })
+    if publish:
+        publish_snapshot(root, path.name)
+        logger.info(f"Snapshot {path.name} is live")
+    for name in prune_snapshots(root, keep):
+        logger.info(f"Deleted old snapshot {name}")
+    return path
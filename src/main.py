@@ -1,11 +1,72 @@
-from extract import run_full_ingestion
-from ingest import run_chunking
+import argparse
+from ingest import EMBED_BATCH_SIZE, SNAPSHOT_KEEP, run_incremental_ingestion, run_pipeline, run_snapshot_ingestion
 
 def main() -> None:
-    # ingest all markdown files under data/*/*.md
-    run_full_ingestion()
-    # chunk them and save in chromadb
-    run_chunking()
+    parser = argparse.ArgumentParser(description="Ingest data/*/*.md into ChromaDB")
+    parser.add_argument(
+        "--partitioned",
+        action="store_true",
+        help="write one collection per department instead of a single shared collection",
+    )
+    parser.add_argument(
+        "--department",
+        action="append",
+        help="only (re)build the given department; may be repeated",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        help="processes used to parse markdown files (default: all cores)",
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=EMBED_BATCH_SIZE,
+        help="chunks embedded and upserted per batch",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="only re-embed chunks of markdown files that changed since the last run",
+    )
+    parser.add_argument(
+        "--snapshot",
+        action="store_true",
+        help="build into a new data/snapshots/<version> directory and make it live when done, "
+             "instead of writing to the served chroma_db in place",
+    )
+    parser.add_argument(
+        "--no-publish",
+        action="store_true",
+        help="with --snapshot, leave the new snapshot unpublished (activate it later via /admin/snapshots)",
+    )
+    parser.add_argument(
+        "--keep",
+        type=int,
+        default=SNAPSHOT_KEEP,
+        help="with --snapshot, finished snapshots to keep on disk",
+    )
+    args = parser.parse_args()
+
+    if args.snapshot:
+        options = {"partition_by_department": args.partitioned}
+        if not args.incremental:
+            options.update(departments=args.department, workers=args.workers, batch_size=args.batch_size)
+        if run_snapshot_ingestion(incremental=args.incremental, publish=not args.no_publish, keep=args.keep, **options) is None:
+            raise SystemExit("Nothing was ingested; the live snapshot was left as it is")
+        return
+
+    if args.incremental:
+        run_incremental_ingestion(partition_by_department=args.partitioned)
+        return
+
+    # parse, chunk, embed and save all data/*/*.md files as one streaming pipeline
+    run_pipeline(
+        partition_by_department=args.partitioned,
+        departments=args.department,
+        workers=args.workers,
+        batch_size=args.batch_size,
+    )
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
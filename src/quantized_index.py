@@ -0,0 +1,306 @@
+import json
+import os
+import threading
+import uuid
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional
+import numpy as np
+
+# Directory next to the Chroma files holding the compact index
+QUANTIZED_DIR = "quantized"
+# Points at the current set of files; replaced atomically on every build
+QUANTIZED_MANIFEST = "index.json"
+
+# Rows are scored in blocks, so int8 -> float32 conversion never copies a whole slice
+_BLOCK_ROWS = 16384
+
+
+def collection_space(collection) -> str:
+    """
+    Distance space ("cosine", "l2" or "ip") of a Chroma collection. Chroma picks it from
+    the embedding function when the collection is created, and falls back to "l2".
+    """
+    hnsw = (getattr(collection, "configuration_json", None) or {}).get("hnsw") or {}
+    return hnsw.get("space") or "l2"
+
+
+def similarity_to_distance(similarity, space: str):
+    """
+    Chroma's distance for the cosine similarity of two unit vectors in the given space:
+    squared L2 (2 - 2cos) for "l2", 1 - cos for "cosine" and "ip".
+    """
+    return 2.0 - 2.0 * similarity if space == "l2" else 1.0 - similarity
+
+
+def _quantize(vectors: np.ndarray, dtype: str):
+    """
+    Symmetric per-row quantization of L2-normalized vectors.
+
+    Returns:
+        (stored matrix, per-row scale) where row * scale approximates the original row
+    """
+    if dtype == "float16":
+        return vectors.astype(np.float16), np.ones(len(vectors), dtype=np.float32)
+    if dtype != "int8":
+        raise ValueError(f"Unsupported quantized dtype: {dtype}")
+    scales = np.abs(vectors).max(axis=1, initial=0.0) / 127.0
+    scales[scales == 0] = 1.0
+    quantized = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+    return quantized, scales.astype(np.float32)
+
+
+def build_quantized_index(
+    docs: Iterable[Dict[str, Any]],
+    index_dir: Path,
+    dtype: str = "int8",
+    keep_float32: bool = False,
+    space: str = "cosine",
+) -> Dict[str, int]:
+    """
+    Write a memory-mappable embedding matrix from chunk dicts (id, text, metadata, embedding).
+
+    Rows are grouped by department, and the manifest records each department's
+    [start, end) row range, so a role's search only touches its departments' slices.
+    Vectors are L2-normalized, so a dot product is the cosine similarity. With
+    keep_float32, the unquantized matrix is written too, for re-scoring the top
+    candidates. Only those rows are read from it, but it takes four times the disk
+    of the int8 matrix, so it is off by default. space is the distance space of the
+    source collection (collection_space()), so search distances match Chroma's.
+
+    Each row's id, text and metadata go to a JSON-lines file, with an array of the
+    byte offset of every line, so a search reads only the lines of its hits.
+
+    New files get a fresh version suffix and the manifest is swapped in last. Readers
+    keep their mapped files until they reopen, and files of older versions are removed.
+
+    Returns:
+        Number of indexed chunks per department
+    """
+    by_department = {}
+    for doc in docs:
+        by_department.setdefault(doc["metadata"].get("department", "unknown"), []).append(doc)
+
+    ordered = [doc for department in sorted(by_department) for doc in by_department[department]]
+    ranges = {}
+    start = 0
+    for department in sorted(by_department):
+        ranges[department] = [start, start + len(by_department[department])]
+        start += len(by_department[department])
+
+    if ordered:
+        vectors = np.asarray([doc["embedding"] for doc in ordered], dtype=np.float32).reshape(len(ordered), -1)
+    else:
+        # nothing ingested yet: an empty index that every query answers with no hits
+        vectors = np.zeros((0, 0), dtype=np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True) + 1e-12
+    quantized, scales = _quantize(vectors, dtype)
+
+    index_dir.mkdir(parents=True, exist_ok=True)
+    version = uuid.uuid4().hex[:12]
+    files = {
+        "vectors": f"vectors-{version}.npy",
+        "scales": f"scales-{version}.npy",
+        "access": f"access-{version}.npy",
+        "rows": f"rows-{version}.jsonl",
+        "offsets": f"offsets-{version}.npy",
+    }
+    np.save(index_dir / files["vectors"], quantized)
+    np.save(index_dir / files["scales"], scales)
+    np.save(index_dir / files["access"], np.asarray(
+        [doc["metadata"].get("access_mask", 0) for doc in ordered], dtype=np.int64
+    ))
+    if keep_float32:
+        files["float32"] = f"float32-{version}.npy"
+        np.save(index_dir / files["float32"], vectors)
+    offsets = [0]
+    with open(index_dir / files["rows"], "wb") as f:
+        for doc in ordered:
+            line = json.dumps(
+                {"id": doc["id"], "document": doc["text"], "metadata": doc["metadata"]},
+                ensure_ascii=False, separators=(",", ":"),
+            ).encode("utf-8") + b"\n"
+            f.write(line)
+            offsets.append(offsets[-1] + len(line))
+    np.save(index_dir / files["offsets"], np.asarray(offsets, dtype=np.int64))
+
+    manifest = {
+        "version": version,
+        "dtype": dtype,
+        "space": space,
+        "dim": int(vectors.shape[1]) if len(vectors) else 0,
+        "count": len(ordered),
+        "departments": ranges,
+        "files": files,
+    }
+    tmp_path = index_dir / f"{QUANTIZED_MANIFEST}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, index_dir / QUANTIZED_MANIFEST)
+
+    current = set(files.values())
+    for path in index_dir.glob("*-*.*"):
+        if path.name not in current:
+            path.unlink()
+
+    return {department: end - begin for department, (begin, end) in ranges.items()}
+
+
+def index_is_current(index_dir: Path) -> bool:
+    """
+    Whether index_dir holds an index this version can read (rows with byte offsets).
+    """
+    try:
+        with open(Path(index_dir) / QUANTIZED_MANIFEST, "r", encoding="utf-8") as f:
+            return "offsets" in json.load(f)["files"]
+    except FileNotFoundError:
+        return False
+
+
+class _Snapshot:
+    def __init__(self, index_dir: Path, manifest: Dict[str, Any]):
+        files = manifest["files"]
+        if "offsets" not in files:
+            raise ValueError(f"{index_dir} was written by an older version; re-run ingestion to rebuild it")
+        self.version = manifest["version"]
+        self.space = manifest.get("space", "cosine")
+        self.departments = {d: tuple(r) for d, r in manifest["departments"].items()}
+        self.vectors = np.load(index_dir / files["vectors"], mmap_mode="r")
+        self.scales = np.load(index_dir / files["scales"], mmap_mode="r")
+        self.access = np.load(index_dir / files["access"], mmap_mode="r")
+        self.float32 = np.load(index_dir / files["float32"], mmap_mode="r") if "float32" in files else None
+        self.count = manifest["count"]
+        self.offsets = np.load(index_dir / files["offsets"], mmap_mode="r")
+        # an empty file cannot be memory-mapped
+        self.rows = np.memmap(index_dir / files["rows"], dtype=np.uint8, mode="r") if self.count else None
+
+    def row(self, position: int) -> Dict[str, Any]:
+        """
+        id, document and metadata of one row, read from the mapped rows file.
+        """
+        begin, end = int(self.offsets[position]), int(self.offsets[position + 1])
+        return json.loads(self.rows[begin:end].tobytes())
+
+
+class QuantizedIndex:
+    """
+    Exact role-restricted vector search over the memory-mapped matrix written by
+    build_quantized_index(), as an alternative to the Chroma collection.
+
+    A role's departments are contiguous row ranges, so a query is a few blocked
+    dot products over only those rows. The rows' access masks (an array next to
+    the vectors) are then checked against the role's mask in one vectorized AND.
+    int8 rows take a quarter of float32's memory. When the float32 matrix is
+    present, the best rescore_factor * n_results candidates are re-scored with
+    it, so rounding error does not change the final order. Texts and metadata
+    stay on disk; only the rows of returned hits are read.
+    """
+
+    def __init__(
+        self,
+        index_dir: Path,
+        registry,
+        embedding_function: Optional[Callable] = None,
+        rescore_factor: int = 4,
+    ):
+        self.index_dir = Path(index_dir)
+        self.embedding_function = embedding_function
+        # retrieval.RoleRegistry: the role's departments and its access mask
+        self.registry = registry
+        self.rescore_factor = rescore_factor
+        self._snapshot = None
+        self._mtime = None
+        self._lock = threading.Lock()
+
+    def _current(self) -> Optional[_Snapshot]:
+        manifest_path = self.index_dir / QUANTIZED_MANIFEST
+        try:
+            mtime = manifest_path.stat().st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+        if mtime != self._mtime:
+            with self._lock:
+                if mtime != self._mtime:
+                    with open(manifest_path, "r", encoding="utf-8") as f:
+                        self._snapshot = _Snapshot(self.index_dir, json.load(f))
+                    self._mtime = mtime
+        return self._snapshot
+
+    def available(self) -> bool:
+        return (self.index_dir / QUANTIZED_MANIFEST).exists()
+
+    def count(self) -> int:
+        snapshot = self._current()
+        return snapshot.count if snapshot is not None else 0
+
+    def departments_for(self, role: str) -> List[str]:
+        return self.registry.get(role, [])
+
+    def _scores(self, snapshot: _Snapshot, begin: int, end: int, queries: np.ndarray) -> np.ndarray:
+        scores = np.empty((len(queries), end - begin), dtype=np.float32)
+        for start in range(begin, end, _BLOCK_ROWS):
+            stop = min(start + _BLOCK_ROWS, end)
+            block = np.asarray(snapshot.vectors[start:stop], dtype=np.float32)
+            scores[:, start - begin:stop - begin] = (queries @ block.T) * snapshot.scales[start:stop]
+        return scores
+
+    def query(
+        self,
+        role: str,
+        n_results: int,
+        query_texts: Optional[List[str]] = None,
+        query_embeddings: Optional[List[Any]] = None,
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        Return the n_results closest authorized hits per query. Distances are in the
+        space of the collection the index was built from, so distance cutoffs mean the
+        same thing in every VECTOR_STORE_MODE.
+
+        Args:
+            role: Role of the user making the query
+            n_results: Number of hits wanted per query
+            query_texts: Query strings, embedded with embedding_function
+            query_embeddings: Precomputed query embeddings
+
+        Returns:
+            One list of hits per query, in the same shape as src.retrieval.query_authorized
+        """
+        if query_embeddings is None:
+            query_embeddings = self.embedding_function(query_texts)
+
+        queries = np.asarray(query_embeddings, dtype=np.float32).reshape(len(query_embeddings), -1)
+        queries /= np.linalg.norm(queries, axis=1, keepdims=True) + 1e-12
+
+        snapshot = self._current()
+        ranges = [] if snapshot is None else [
+            snapshot.departments[d] for d in self.departments_for(role) if d in snapshot.departments
+        ]
+        if not ranges or n_results <= 0:
+            return [[] for _ in queries]
+
+        rows = np.concatenate([np.arange(begin, end) for begin, end in ranges])
+        scores = np.concatenate([self._scores(snapshot, begin, end, queries) for begin, end in ranges], axis=1)
+        # departments decide the ranges; the masks guard against a stale role mapping
+        allowed = self.registry.allowed(role, snapshot.access[rows])
+        if not allowed.all():
+            rows, scores = rows[allowed], scores[:, allowed]
+            if not len(rows):
+                return [[] for _ in queries]
+
+        n_candidates = min(len(rows), n_results * (self.rescore_factor if snapshot.float32 is not None else 1))
+        results = []
+        for q in range(len(queries)):
+            top = np.argpartition(-scores[q], n_candidates - 1)[:n_candidates]
+            candidates = rows[top]
+            similarity = scores[q, top]
+            if snapshot.float32 is not None:
+                # mmapped fancy indexing reads only these rows
+                order = np.argsort(candidates)
+                candidates, similarity = candidates[order], np.asarray(snapshot.float32[candidates[order]]) @ queries[q]
+
+            best = np.argsort(-similarity)[:n_results]
+            results.append([
+                {**snapshot.row(position), "distance": float(similarity_to_distance(score, snapshot.space))}
+                for position, score in zip(candidates[best], similarity[best])
+            ])
+        return results
@@ -1,13 +1,19 @@
 # python
 import chromadb
 from chromadb.utils import embedding_functions
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterable, Optional
+import json
+import logging
 import os
+import threading
 from pathlib import Path
 from dotenv import load_dotenv
+import numpy as np
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 # Role definitions matching ingest.py
 ROLE_HIERARCHY = {
     "Employee_Level": ["general"],
@@ -24,11 +30,320 @@ DEFAULT_DATA_DIR = Path(__file__).resolve().parents[1] / "data"
 ROOT_DATA_DIR = Path(_ROOT_DATA_DIR_ENV) if _ROOT_DATA_DIR_ENV else DEFAULT_DATA_DIR
 CHROMA_DB_PATH = ROOT_DATA_DIR / "chroma_db"
 
-ef = embedding_functions.SentenceTransformerEmbeddingFunction(model_name="all-MiniLM-L6-v2")
+# Role registry written by ingest.py next to the Chroma files
+ACCESS_FILE = "access.json"
+# Chroma stores metadata integers as signed 64-bit, so one bit stays unused
+MAX_ACCESS_GROUPS = 63
+
+# Must match the model the chunks were embedded with (EMBEDDING_MODEL in chunker.py)
+EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+
+_embedding_function = None
+_embedding_lock = threading.Lock()
+
+
+def get_embedding_function():
+    """
+    The process-wide sentence-transformer embedding function, loaded on first use
+    rather than at import, and shared with the API (app/utils/vector_store.py).
+    """
+    global _embedding_function
+    if _embedding_function is None:
+        with _embedding_lock:
+            if _embedding_function is None:
+                _embedding_function = embedding_functions.SentenceTransformerEmbeddingFunction(
+                    model_name=EMBEDDING_MODEL
+                )
+    return _embedding_function
+
+
+def embedding_model_loaded() -> bool:
+    return _embedding_function is not None
+
+
+class RoleRegistry:
+    """
+    Role-based access as bitmasks.
+
+    Each access group (a department) owns a bit position, and each chunk carries one
+    integer ``access_mask`` with its group's bit. A role's mask ORs the bits of the
+    groups it may read, so an access check is ``chunk_mask & role_mask != 0``, done
+    for a whole array of candidates at once.
+
+    Bit positions are append-only. A new group takes the next free bit and existing
+    chunk masks never change, so adding a role or changing what a role reads only
+    rewrites the registry file. The file is re-read when it changes, so running
+    processes see the new roles without a restart.
+
+    It also answers ``get(role, default)`` with the role's groups, so it can stand in
+    for the ROLE_HIERARCHY dict wherever departments are looked up.
+
+    Without the file, the directory was ingested before access masks existed and its
+    chunks carry one ``role_<Role>`` flag per role instead; ``legacy`` is then True
+    and query_authorized() filters on those flags.
+    """
+
+    def __init__(self, path: Path, default_roles: Optional[Dict[str, List[str]]] = None):
+        self.path = Path(path)
+        # used until ingest.py has written the file
+        self.default_roles = default_roles or {}
+        self._groups = {}
+        self._roles = dict(self.default_roles)
+        self._role_masks = {}
+        self._mtime = None
+        self._warned_legacy = False
+        self._lock = threading.Lock()
+
+    def _refresh(self) -> None:
+        try:
+            mtime = self.path.stat().st_mtime_ns
+        except FileNotFoundError:
+            return
+
+        if mtime != self._mtime:
+            with self._lock:
+                if mtime != self._mtime:
+                    with open(self.path, "r", encoding="utf-8") as f:
+                        data = json.load(f)
+                    self._set(data["groups"], data["roles"])
+                    self._mtime = mtime
+
+    def _set(self, groups: Dict[str, int], roles: Dict[str, List[str]]) -> None:
+        self._groups = groups
+        self._roles = roles
+        self._role_masks = {
+            role: sum(1 << groups[g] for g in set(role_groups) if g in groups)
+            for role, role_groups in roles.items()
+        }
+
+    @property
+    def legacy(self) -> bool:
+        """
+        True while the registry file does not exist (see the class docstring).
+        """
+        self._refresh()
+        if self._mtime is not None:
+            return False
+        if not self._warned_legacy:
+            self._warned_legacy = True
+            logger.warning(
+                f"No role registry at {self.path}: filtering on the role_* flags of chunks ingested "
+                f"before access masks. Re-run ingestion to switch to access masks."
+            )
+        return True
+
+    def roles(self) -> Dict[str, List[str]]:
+        self._refresh()
+        return dict(self._roles)
+
+    def groups(self) -> Dict[str, int]:
+        self._refresh()
+        return dict(self._groups)
+
+    def get(self, role: str, default: Any = None) -> Any:
+        self._refresh()
+        return self._roles.get(role, default)
+
+    def __contains__(self, role: str) -> bool:
+        self._refresh()
+        return role in self._roles
+
+    def group_mask(self, group: str) -> int:
+        self._refresh()
+        if group not in self._groups:
+            raise KeyError(f"Access group '{group}' has no bit in {self.path}; run ingestion to register it")
+        return 1 << self._groups[group]
+
+    def role_mask(self, role: str) -> int:
+        """
+        OR of the bits of every group the role may read; 0 for unknown roles.
+        """
+        self._refresh()
+        return self._role_masks.get(role, 0)
+
+    def group_masks(self, role: str) -> List[int]:
+        """
+        The single-group masks a role may read, for Chroma's ``$in`` operator
+        (Chroma has no bitwise filter, and every chunk belongs to exactly one group).
+        """
+        mask = self.role_mask(role)
+        return [1 << bit for bit in sorted(self._groups.values()) if mask >> bit & 1]
+
+    def allowed(self, role: str, masks: Iterable[int]) -> np.ndarray:
+        """
+        Boolean array: which of the given chunk access masks the role may read.
+        """
+        return (np.asarray(masks, dtype=np.int64) & np.int64(self.role_mask(role))) != 0
+
+    def roles_for_mask(self, mask: int) -> List[str]:
+        self._refresh()
+        return [role for role, role_mask in self._role_masks.items() if role_mask & mask]
+
+    def register(self, roles: Dict[str, List[str]]) -> None:
+        """
+        Set the groups of the given roles (other roles in the file are kept) and give
+        every group that has no bit yet the next free one. Writes the file atomically.
+        """
+        with self._lock:
+            data = {"groups": {}, "roles": {}}
+            if self.path.exists():
+                with open(self.path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+
+            groups, merged = data["groups"], {**data["roles"], **roles}
+            for group in sorted({g for role_groups in merged.values() for g in role_groups}):
+                if group not in groups:
+                    if len(groups) >= MAX_ACCESS_GROUPS:
+                        raise ValueError(f"At most {MAX_ACCESS_GROUPS} access groups fit in a chunk mask")
+                    groups[group] = max(groups.values(), default=-1) + 1
+
+            self._write(groups, merged)
+
+    def remove_role(self, role: str) -> None:
+        """
+        Drop a role from the file; chunk masks and group bits are untouched.
+        """
+        self._refresh()
+        with self._lock:
+            self._write(self._groups, {r: g for r, g in self._roles.items() if r != role})
+
+    def _write(self, groups: Dict[str, int], roles: Dict[str, List[str]]) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_name(f"{self.path.name}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"groups": groups, "roles": roles}, f, indent=2)
+        os.replace(tmp_path, self.path)
+        self._set(groups, roles)
+        self._mtime = self.path.stat().st_mtime_ns
+
+
+# Shared by query_authorized() and the API (app/utils/vector_store.py)
+access_registry = RoleRegistry(CHROMA_DB_PATH / ACCESS_FILE, default_roles=ROLE_HIERARCHY)
+
 
 def _client():
     return chromadb.PersistentClient(path=str(CHROMA_DB_PATH))
 
+_QUERY_INCLUDE = ["documents", "metadatas", "distances"]
+
+
+def role_where(user_role: str, registry: Optional[RoleRegistry] = None) -> Dict[str, Any]:
+    """
+    Chroma ``where`` clause matching the chunks whose ``access_mask`` the role may read
+    (or, for a legacy directory, the chunks flagged ``role_<Role>``).
+    """
+    registry = registry or access_registry
+    if registry.legacy:
+        return {f"role_{user_role}": True}
+    return {"access_mask": {"$in": registry.group_masks(user_role)}}
+
+
+def _authorized(hits: List[Dict[str, Any]], user_role: str, registry: RoleRegistry) -> List[Dict[str, Any]]:
+    if registry.legacy:
+        return [h for h in hits if h["metadata"].get(f"role_{user_role}")]
+    allowed = registry.allowed(user_role, [h["metadata"].get("access_mask", 0) for h in hits])
+    return [h for h, ok in zip(hits, allowed) if ok]
+
+
+def _allowed_roles(metadata: Dict[str, Any], registry: RoleRegistry) -> str:
+    if registry.legacy:
+        return metadata.get("allowed_roles", "")
+    return ",".join(registry.roles_for_mask(metadata.get("access_mask", 0)))
+
+
+def _unpack_hits(res: Dict[str, Any], q: int) -> List[Dict[str, Any]]:
+    ids = res.get("ids", [[]])[q]
+    docs = (res.get("documents") or [[]])[q]
+    metas = (res.get("metadatas") or [[]])[q]
+    dists = (res.get("distances") or [[]])[q] or [None] * len(ids)
+
+    return [
+        {"id": i, "document": d, "metadata": m or {}, "distance": dist}
+        for i, d, m, dist in zip(ids, docs, metas, dists)
+    ]
+
+
+def query_authorized(
+    collection,
+    user_role: str,
+    n_results: int,
+    query_texts: Optional[List[str]] = None,
+    query_embeddings: Optional[List[Any]] = None,
+    registry: Optional[RoleRegistry] = None,
+) -> List[List[Dict[str, Any]]]:
+    """
+    Return up to n_results hits per query, restricted to chunks the role may read.
+
+    The role's access groups are sent to Chroma as a ``where`` filter, so the index only ranks
+    authorized chunks and a single round trip normally returns exactly n_results.
+    Very selective filters can make HNSW under-fill (or raise); those queries fall
+    back to an unfiltered search that doubles its over-fetch and post-filters until
+    it is filled or the role has no more authorized chunks to give.
+
+    Args:
+        collection: Chroma collection to search
+        user_role: User's role (e.g., "Finance_Team")
+        n_results: Number of authorized hits wanted per query
+        query_texts: Query strings (embedded by the collection)
+        query_embeddings: Precomputed query embeddings, used instead of query_texts
+        registry: Role registry of the collection's directory (default: the one under CHROMA_DB_PATH)
+
+    Returns:
+        One list of hits per query, each hit a dict with id, document, metadata and distance
+    """
+    queries = query_embeddings if query_embeddings is not None else query_texts
+    registry = registry or access_registry
+    if not (user_role in registry if registry.legacy else registry.role_mask(user_role)):
+        return [[] for _ in queries]
+
+    query_kwargs = (
+        {"query_embeddings": query_embeddings}
+        if query_embeddings is not None
+        else {"query_texts": query_texts}
+    )
+
+    try:
+        res = collection.query(
+            **query_kwargs,
+            n_results=n_results,
+            where=role_where(user_role, registry),
+            include=_QUERY_INCLUDE,
+        )
+        hits = [_unpack_hits(res, q) for q in range(len(queries))]
+    except Exception as e:
+        logger.warning(f"Filtered query failed for role '{user_role}', falling back to post-filtering: {e}")
+        hits = [[] for _ in queries]
+
+    pending = [q for q, h in enumerate(hits) if len(h) < n_results]
+    if not pending:
+        return hits
+
+    # Under-filled: only worth widening if the role can actually see more chunks. The
+    # count stops at n_results, so this reads a few IDs, never the whole authorized set.
+    authorized_total = len(collection.get(where=role_where(user_role, registry), limit=n_results, include=[])["ids"])
+    pending = [q for q in pending if len(hits[q]) < authorized_total]
+
+    total = collection.count()
+    fetch_count = n_results * 2
+    while pending:
+        fetch_count = min(fetch_count * 2, total)
+        res = collection.query(
+            **{k: [v[q] for q in pending] for k, v in query_kwargs.items()},
+            n_results=fetch_count,
+            include=_QUERY_INCLUDE,
+        )
+
+        still_pending = []
+        for pos, q in enumerate(pending):
+            authorized = _authorized(_unpack_hits(res, pos), user_role, registry)
+            hits[q] = authorized[:n_results]
+            if len(hits[q]) < authorized_total and fetch_count < total:
+                still_pending.append(q)
+        pending = still_pending
+
+    return hits
+
+
 def retrieve_docs(user_query: str, user_role: str, n_results: int = 10) -> List[Dict[str, Any]]:
     """
     Retrieve documents based on user query and role-based access control.
@@ -36,54 +351,31 @@ def retrieve_docs(user_query: str, user_role: str, n_results: int = 10) -> List[
     Args:
         user_query: The search query
         user_role: User's role (e.g., "Finance_Team", "Employee_Level", "God_Tier_Admins")
-        n_results: Maximum number of results to return (will fetch more to filter by role)
+        n_results: Maximum number of results to return
 
     Returns:
         List of documents accessible to the user's role
     """
     collection = _client().get_or_create_collection(
         name="corporate_documents",
-        embedding_function=ef,
+        embedding_function=get_embedding_function(),
     )
 
-    # Fetch more results than needed since we'll filter by role
-    fetch_count = n_results * 3
-
-    res = collection.query(
-        query_texts=[user_query],
-        n_results=fetch_count,
-        include=["documents", "metadatas", "distances"],
-    )
+    hits = query_authorized(collection, user_role, n_results, query_texts=[user_query])[0]
 
     results = []
-    docs = res.get("documents", [[]])[0]
-    metas = res.get("metadatas", [[]])[0]
-    ids = res.get("ids", [[]])[0]
-    dists = res.get("distances", [[]])[0] if "distances" in res else [None] * len(docs)
-
-    # Filter results based on role permissions
-    for i in range(len(docs)):
-        meta = metas[i] or {}
-
-        # Check if user has access to this document
-        role_flag = f"role_{user_role}"
-        has_access = meta.get(role_flag, False)
-
-        if has_access:
-            results.append({
-                "id": ids[i],
-                "document": docs[i],
-                "source": meta.get("source"),
-                "section": meta.get("section"),
-                "sub_hierarchy": meta.get("sub_hierarchy"),
-                "department": meta.get("department"),
-                "distance": dists[i],
-                "allowed_roles": meta.get("allowed_roles", ""),
-            })
-
-            # Stop when we have enough results
-            if len(results) >= n_results:
-                break
+    for hit in hits:
+        meta = hit["metadata"]
+        results.append({
+            "id": hit["id"],
+            "document": hit["document"],
+            "source": meta.get("source"),
+            "section": meta.get("section"),
+            "sub_hierarchy": meta.get("sub_hierarchy"),
+            "department": meta.get("department"),
+            "distance": hit["distance"],
+            "allowed_roles": _allowed_roles(meta, access_registry),
+        })
 
     return results
 
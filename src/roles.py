@@ -0,0 +1,87 @@
+import argparse
+import json
+import os
+from src.retrieval import ACCESS_FILE, CHROMA_DB_PATH, ROLE_HIERARCHY, ROOT_DATA_DIR, RoleRegistry
+from src.snapshots import (
+    SNAPSHOTS_DIR, create_snapshot, current_snapshot, finish_snapshot, list_snapshots, prune_snapshots,
+    publish_snapshot,
+)
+
+# Finished snapshots kept on disk after a role change (as for src/main.py --snapshot)
+SNAPSHOT_KEEP = int(os.getenv("SNAPSHOT_KEEP", "3"))
+
+
+def live_registry() -> RoleRegistry:
+    """
+    Registry of the directory the API serves: the live snapshot, or chroma_db/ without snapshots.
+    """
+    live = current_snapshot(ROOT_DATA_DIR / SNAPSHOTS_DIR)
+    db_dir = ROOT_DATA_DIR / SNAPSHOTS_DIR / live if live else CHROMA_DB_PATH
+    return RoleRegistry(db_dir / ACCESS_FILE, default_roles=ROLE_HIERARCHY)
+
+
+def change_roles(change, keep: int = SNAPSHOT_KEEP) -> RoleRegistry:
+    """
+    Apply change(registry) to the role registry the API serves.
+
+    A published snapshot is never written to, so with snapshots the change goes into a
+    copy of the live one, which is then published; the API swaps to it like to any new
+    ingestion. Without snapshots, chroma_db/access.json is rewritten in place (the API
+    re-reads it when it changes).
+
+    Returns:
+        The changed registry
+    """
+    root = ROOT_DATA_DIR / SNAPSHOTS_DIR
+    live = current_snapshot(root)
+    if live is None:
+        registry = RoleRegistry(CHROMA_DB_PATH / ACCESS_FILE, default_roles=ROLE_HIERARCHY)
+        change(registry)
+        return registry
+
+    path = create_snapshot(root, root / live, copy_base=True)
+    registry = RoleRegistry(path / ACCESS_FILE, default_roles=ROLE_HIERARCHY)
+    change(registry)
+    info = next((s for s in list_snapshots(root) if s["name"] == live), {})
+    finish_snapshot(path, {
+        "base": live,
+        "partitioned": info.get("partitioned", False),
+        "chunks": info.get("chunks"),
+        "roles_changed": True,
+    })
+    publish_snapshot(root, path.name)
+    prune_snapshots(root, keep)
+    return registry
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="List, add or remove roles in the role registry (access.json of the served index). "
+                    "Chunks store only a department bitmask, so no re-ingestion is needed."
+    )
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("list", help="print every role with its departments and mask")
+    add = sub.add_parser("add", help="add a role, or replace the departments of an existing one")
+    add.add_argument("role")
+    add.add_argument("departments", nargs="+")
+    remove = sub.add_parser("remove", help="remove a role")
+    remove.add_argument("role")
+    args = parser.parse_args()
+    access_registry = live_registry()
+
+    if args.command == "add":
+        unknown = set(args.departments) - set(access_registry.groups())
+        if unknown:
+            parser.error(f"no chunks are ingested for: {', '.join(sorted(unknown))}")
+        access_registry = change_roles(lambda registry: registry.register({args.role: args.departments}))
+    elif args.command == "remove":
+        access_registry = change_roles(lambda registry: registry.remove_role(args.role))
+
+    print(json.dumps({
+        role: {"departments": groups, "mask": access_registry.role_mask(role)}
+        for role, groups in access_registry.roles().items()
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+import json
+import os
+import shutil
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+# Under ROOT_DATA_DIR: one complete Chroma directory (with its BM25, quantized and HR
+# files) per ingestion run, and CURRENT naming the one the API serves
+SNAPSHOTS_DIR = "snapshots"
+CURRENT_FILE = "CURRENT"
+# Written last into a snapshot directory; only snapshots that have it can be activated
+SNAPSHOT_INFO_FILE = "SNAPSHOT.json"
+# The role registry is carried over to every new snapshot, so roles added by hand survive
+ACCESS_FILE = "access.json"
+
+
+def current_snapshot(root: Path) -> Optional[str]:
+    """
+    Name of the live snapshot, or None when no snapshot was ever published
+    (the API then serves the legacy chroma_db/ directory).
+    """
+    try:
+        return (Path(root) / CURRENT_FILE).read_text(encoding="utf-8").strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def create_snapshot(root: Path, base_dir: Optional[Path] = None, copy_base: bool = False) -> Path:
+    """
+    Create a new, unpublished snapshot directory to ingest into.
+
+    Names sort by creation time. The role registry of base_dir is copied over, and
+    with copy_base the whole base directory, so an incremental run only re-embeds
+    what changed since the snapshot it started from.
+
+    Args:
+        root: The snapshots directory
+        base_dir: Chroma directory currently served, if any
+        copy_base: Copy all of base_dir instead of only its role registry
+
+    Returns:
+        Path of the new snapshot directory
+    """
+    root = Path(root)
+    root.mkdir(parents=True, exist_ok=True)
+    name = f"{time.strftime('%Y%m%dT%H%M%S', time.gmtime())}-{uuid.uuid4().hex[:6]}"
+    path = root / name
+
+    if base_dir is not None and copy_base and Path(base_dir).is_dir():
+        shutil.copytree(base_dir, path, ignore=shutil.ignore_patterns(SNAPSHOT_INFO_FILE, "*.tmp"))
+    else:
+        path.mkdir()
+        if base_dir is not None and (Path(base_dir) / ACCESS_FILE).exists():
+            shutil.copy2(Path(base_dir) / ACCESS_FILE, path / ACCESS_FILE)
+    return path
+
+
+def finish_snapshot(path: Path, info: Dict[str, Any]) -> None:
+    """
+    Mark a snapshot as complete; info (chunk counts, mode) is kept for listings.
+    """
+    tmp_path = Path(path) / f"{SNAPSHOT_INFO_FILE}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"name": Path(path).name, "finished_at": time.time(), **info}, f, indent=2)
+    os.replace(tmp_path, Path(path) / SNAPSHOT_INFO_FILE)
+
+
+def publish_snapshot(root: Path, name: str) -> None:
+    """
+    Point CURRENT at a finished snapshot. The file is replaced atomically, so readers
+    see either the old name or the new one.
+    """
+    root = Path(root)
+    if not (root / name / SNAPSHOT_INFO_FILE).exists():
+        raise ValueError(f"Snapshot '{name}' does not exist or did not finish")
+    tmp_path = root / f"{CURRENT_FILE}.tmp"
+    tmp_path.write_text(name, encoding="utf-8")
+    os.replace(tmp_path, root / CURRENT_FILE)
+
+
+def list_snapshots(root: Path) -> List[Dict[str, Any]]:
+    """
+    Every snapshot directory, oldest first, with its info and whether it is live.
+    Unfinished ones (an ingestion still running, or one that failed) have finished=False.
+    """
+    root = Path(root)
+    if not root.is_dir():
+        return []
+    live = current_snapshot(root)
+    snapshots = []
+    for path in sorted(p for p in root.iterdir() if p.is_dir()):
+        info_path = path / SNAPSHOT_INFO_FILE
+        info = json.loads(info_path.read_text(encoding="utf-8")) if info_path.exists() else {}
+        snapshots.append({**info, "name": path.name, "finished": info_path.exists(), "live": path.name == live})
+    return snapshots
+
+
+def prune_snapshots(root: Path, keep: int, min_age_s: float = 3600.0) -> List[str]:
+    """
+    Delete all but the newest keep finished snapshots, never the live one. Unfinished
+    directories are only removed once they are min_age_s old, so a running ingestion
+    is left alone. The API keeps serving requests that started before a swap from
+    the previous snapshot, so keep should be at least 2.
+
+    Returns:
+        Names of the deleted snapshots
+    """
+    root = Path(root)
+    snapshots = list_snapshots(root)
+    finished = [s["name"] for s in snapshots if s["finished"]]
+    keep_names = set(finished[-keep:]) if keep > 0 else set()
+    keep_names.add(current_snapshot(root))
+
+    deleted = []
+    now = time.time()
+    for snapshot in snapshots:
+        name = snapshot["name"]
+        if name in keep_names:
+            continue
+        path = root / name
+        if not snapshot["finished"] and now - path.stat().st_mtime < min_age_s:
+            continue
+        shutil.rmtree(path, ignore_errors=True)
+        deleted.append(name)
+    return deleted
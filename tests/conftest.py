@@ -0,0 +1,199 @@
+import hashlib
+import os
+import re
+import sys
+import tempfile
+from pathlib import Path
+import chromadb
+import numpy as np
+import pytest
+from chromadb import EmbeddingFunction
+
+ROOT = Path(__file__).resolve().parents[1]
+# src/ modules import each other as top-level modules (python src/main.py)
+sys.path[:0] = [str(ROOT), str(ROOT / "src")]
+
+# Settings are read at import: keep the tests off the repo's data/, the network and background threads
+os.environ["ROOT_DATA_DIR"] = tempfile.mkdtemp(prefix="rag-tests-")
+os.environ["LLM_BACKEND"] = "local"
+os.environ["WARMUP"] = "false"
+os.environ["SNAPSHOT_POLL_SECONDS"] = "0"
+os.environ["LOCAL_LLM_LATENCY_MS"] = "0"
+os.environ["LOCAL_LLM_JITTER_MS"] = "0"
+# ingestion keeps extracted sections as they are instead of re-cutting them with the model's tokenizer
+os.environ["CHUNK_MAX_TOKENS"] = "0"
+
+DEPARTMENTS = ["general", "finance", "marketing", "hr", "engineering"]
+
+
+def embed(texts, dim=64):
+    """
+    Deterministic bag-of-words embedding (hashed words, unit length): texts sharing
+    words are close, so tests can reason about which chunk a query finds.
+    """
+    vectors = np.zeros((len(texts), dim), dtype=np.float32)
+    for row, text in enumerate(texts):
+        for word in re.findall(r"\w+", text.lower()):
+            vectors[row, int(hashlib.md5(word.encode()).hexdigest(), 16) % dim] += 1.0
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return (vectors / np.where(norms == 0, 1, norms)).tolist()
+
+
+class HashEmbeddingFunction(EmbeddingFunction):
+    """
+    embed() as a Chroma embedding function, for collections and services that embed texts themselves.
+    """
+
+    def __init__(self):
+        pass
+
+    def __call__(self, input):
+        return embed(list(input))
+
+    @staticmethod
+    def name() -> str:
+        return "hash-test"
+
+    def get_config(self):
+        return {}
+
+    @staticmethod
+    def build_from_config(config):
+        return HashEmbeddingFunction()
+
+
+@pytest.fixture
+def registry(tmp_path):
+    from src.retrieval import ACCESS_FILE, ROLE_HIERARCHY, RoleRegistry
+
+    registry = RoleRegistry(tmp_path / ACCESS_FILE)
+    registry.register(ROLE_HIERARCHY)
+    return registry
+
+
+def make_chunks(per_department=4):
+    return [
+        {
+            "id": f"{department}-{i}",
+            "text": f"{department} document {i} about {department} topic number {i}",
+            "metadata": {"department": department, "source": f"{department}.md", "sub_hierarchy": f"Section {i}"},
+        }
+        for department in DEPARTMENTS
+        for i in range(per_department)
+    ]
+
+
+@pytest.fixture
+def collection(tmp_path, registry):
+    """
+    A Chroma collection of make_chunks() with access masks from registry and embed() embeddings.
+    """
+    chunks = make_chunks()
+    collection = chromadb.PersistentClient(path=str(tmp_path / "chroma")).get_or_create_collection(
+        name="corporate_documents", embedding_function=None,
+    )
+    collection.add(
+        ids=[c["id"] for c in chunks],
+        documents=[c["text"] for c in chunks],
+        embeddings=embed([c["text"] for c in chunks]),
+        metadatas=[
+            {**c["metadata"], "access_mask": registry.group_mask(c["metadata"]["department"])} for c in chunks
+        ],
+    )
+    return collection
+
+
+@pytest.fixture
+def router(tmp_path):
+    """
+    make_chunks() in one collection per department behind a DepartmentRouter, a store
+    that applies ROLE_HIERARCHY itself (no role registry or snapshot needed).
+    """
+    from app.utils.vector_store import DepartmentRouter
+    from src.retrieval import ROLE_HIERARCHY
+
+    client = chromadb.PersistentClient(path=str(tmp_path / "partitions"))
+    embedding_function = HashEmbeddingFunction()
+    for chunk in make_chunks():
+        department = chunk["metadata"]["department"]
+        client.get_or_create_collection(
+            name=f"corporate_documents_{department}", embedding_function=embedding_function,
+        ).add(ids=[chunk["id"]], documents=[chunk["text"]], metadatas=[chunk["metadata"]])
+    return DepartmentRouter(client, "corporate_documents", embedding_function, ROLE_HIERARCHY)
+
+
+@pytest.fixture
+def api(router, monkeypatch):
+    """
+    A TestClient of the app whose RAG service searches the router fixture with the local LLM,
+    so no embedding model is loaded.
+    """
+    from fastapi.testclient import TestClient
+    from app.main import app
+    from app.routers import rag
+    from app.services.rag_service import RAGService
+    from app.utils.cache import AnswerCache
+
+    monkeypatch.setattr(rag, "rag_service", RAGService(router, rag.llm, answer_cache=AnswerCache()))
+    with TestClient(app) as client:
+        yield client
+
+
+DOCUMENTS = {
+    "general/handbook.md": "# Handbook\n\n## Leave Policy\n\nEmployees get 24 days of paid leave a year.\n\n"
+                           "## Working Hours\n\nCore hours are from 10 to 4 on weekdays.\n",
+    "finance/report.md": "# Quarterly Report\n\n## Revenue\n\nQ3 revenue grew 12 percent to 4.2 million.\n\n"
+                         "## Costs\n\nVendor costs fell after the PCI-DSS audit closed.\n",
+    "engineering/architecture.md": "# Architecture\n\n## Services\n\nThe gateway routes requests to the ledger "
+                                   "service.\n",
+}
+
+
+class Ingestion:
+    """
+    src.ingest pointed at a private data directory, embedding with embed() and recording
+    the texts it embeds and the size of each embedding call.
+    """
+
+    def __init__(self, module, data_dir):
+        self.module = module
+        self.data_dir = data_dir
+        self.embedded = []
+        self.batch_sizes = []
+
+    def write(self, name, text):
+        path = self.data_dir / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(text, encoding="utf-8")
+        return path
+
+    def embedding_function(self, model_name=None):
+        ingestion = self
+
+        class Recording(HashEmbeddingFunction):
+            def __call__(self, input):
+                ingestion.embedded.extend(input)
+                ingestion.batch_sizes.append(len(input))
+                return super().__call__(input)
+
+        return Recording()
+
+
+@pytest.fixture
+def ingestion(tmp_path, monkeypatch):
+    from src import ingest
+
+    data_dir = tmp_path / "data"
+    ingestion = Ingestion(ingest, data_dir)
+    for name, text in DOCUMENTS.items():
+        ingestion.write(name, text)
+
+    monkeypatch.setattr(ingest, "ROOT_DATA_DIR", data_dir)
+    # the sentence-transformer is swapped for embed(); everything else is the real pipeline
+    monkeypatch.setattr(ingest.embedding_functions, "SentenceTransformerEmbeddingFunction", ingestion.embedding_function)
+    # use_db_path() rebinds these and the environment; restore them afterwards
+    monkeypatch.setattr(ingest, "DB_PATH", ingest.DB_PATH)
+    monkeypatch.setattr(ingest, "access_registry", ingest.access_registry)
+    monkeypatch.setenv("INGEST_DB_DIR", str(data_dir / "chroma_db"))
+    ingest.use_db_path(data_dir / "chroma_db")
+    return ingestion
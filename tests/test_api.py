@@ -0,0 +1,19 @@
+import json
+
+QUERY = "finance document 1 about finance topic number 1"
+
+
+def _lines(response):
+    return [json.loads(line) for line in response.text.splitlines()]
+
+
+def test_query_stream_returns_ndjson_events(api):
+    response = api.post("/rag/query/stream", json={"role": "Finance_Team", "query": QUERY})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    events = _lines(response)
+    assert events[0] == {"type": "sources", "sources": ["finance.md"]}
+    assert events[-1]["type"] == "done"
+    answer = "".join(e["text"] for e in events if e["type"] == "token").strip()
+    assert answer == api.post("/rag/query", json={"role": "Finance_Team", "query": QUERY}).json()["answer"]
@@ -0,0 +1,85 @@
+import asyncio
+import json
+from app.services.rag_service import RAGService
+from tests.conftest import embed
+from tests.test_rag_service import local_llm
+
+ITEMS = [
+    ("Finance_Team", "finance document 1 about finance topic number 1"),
+    ("Employee_Level", "general document 2 about general topic number 2"),
+    ("Finance_Team", "general document 3 about general topic number 3"),
+]
+
+
+class _Embedder:
+    def __init__(self):
+        self.calls = []
+
+    def embed(self, texts):
+        self.calls.append(list(texts))
+        return embed(texts)
+
+
+def _collect(service, items, **kwargs):
+    async def run():
+        return [result async for result in service.abatch(items, **kwargs)]
+
+    return sorted(asyncio.run(run()), key=lambda r: r["index"])
+
+
+def test_batch_embeds_once_and_searches_once_per_role(router):
+    embedder = _Embedder()
+    service = RAGService(router, local_llm(), embedder=embedder)
+    searches = []
+    search = service._search
+    service._search = lambda role, n, **query: searches.append(role) or search(role, n, **query)
+
+    results = _collect(service, ITEMS)
+
+    assert embedder.calls == [[query for _, query in ITEMS]]
+    assert sorted(searches) == ["Employee_Level", "Finance_Team"]
+    assert [r["sources"] for r in results] == [["finance.md"], ["general.md"], ["general.md"]]
+
+
+def test_batch_answers_match_single_queries(router):
+    service = RAGService(router, local_llm())
+
+    results = _collect(service, ITEMS, max_concurrency=2)
+
+    for (role, query), result in zip(ITEMS, results):
+        assert (result["role"], result["query"]) == (role, query)
+        assert result["answer"] == asyncio.run(service.aquery(role, query))[0]
+
+
+def test_a_failing_item_does_not_fail_the_batch(router):
+    service = RAGService(router, local_llm())
+    search = service._search
+
+    def flaky(role, n, **query):
+        if role == "Employee_Level":
+            raise RuntimeError("index unavailable")
+        return search(role, n, **query)
+
+    service._search = flaky
+    results = _collect(service, ITEMS)
+
+    assert results[1] == {"index": 1, "role": "Employee_Level", "query": ITEMS[1][1], "error": "index unavailable"}
+    assert "answer" in results[0] and "answer" in results[2]
+
+
+def test_batch_endpoint_streams_one_line_per_item(api):
+    payload = {"items": [{"role": role, "query": query} for role, query in ITEMS], "max_concurrency": 2}
+
+    response = api.post("/rag/batch", json=payload)
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    results = [json.loads(line) for line in response.text.splitlines()]
+    assert sorted(r["index"] for r in results) == [0, 1, 2]
+    assert all(r["sources"] and r["answer"] for r in results)
+
+
+def test_batch_endpoint_validates_its_limits(api):
+    response = api.post("/rag/batch", json={"items": [], "max_concurrency": 0})
+
+    assert response.status_code == 422
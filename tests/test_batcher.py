@@ -0,0 +1,111 @@
+import asyncio
+from contextlib import contextmanager
+from app.utils.batcher import QueryBatcher
+from app.utils.cache import QueryEmbeddingCache
+from tests.conftest import embed
+
+
+class _Recorder:
+    def __init__(self, snapshots=None):
+        self.embed_calls = []
+        self.searches = []
+        self.snapshots = snapshots
+
+    def embedder(self):
+        def embed_texts(texts):
+            self.embed_calls.append(list(texts))
+            return embed(texts)
+        return QueryEmbeddingCache(embed_texts)
+
+    def search(self, role, n_results, query_embeddings):
+        snapshot = self.snapshots.pinned if self.snapshots is not None else None
+        self.searches.append((role, len(query_embeddings), n_results, snapshot))
+        if role == "Broken":
+            raise RuntimeError("search failed")
+        return [[{"id": f"{role}-{snapshot}-{i}"} for i in range(n_results)] for _ in query_embeddings]
+
+
+class _Snapshots:
+    """
+    The part of SnapshotManager the batcher uses.
+    """
+
+    def __init__(self):
+        self.live = "v1"
+        self.pinned = None
+
+    def active(self):
+        return self.pinned or self.live
+
+    @contextmanager
+    def pin(self, snapshot):
+        previous, self.pinned = self.pinned, snapshot
+        try:
+            yield snapshot
+        finally:
+            self.pinned = previous
+
+
+def test_concurrent_searches_share_one_embedding_call_and_one_search_per_role():
+    recorder = _Recorder()
+    batcher = QueryBatcher(recorder.search, recorder.embedder(), max_wait_ms=20)
+
+    async def run():
+        return await asyncio.gather(
+            batcher.search("HR_Team", "leave policy", 2),
+            batcher.search("Finance_Team", "budget", 3),
+            batcher.search("HR_Team", "payroll", 1),
+        )
+
+    hr_first, finance, hr_second = asyncio.run(run())
+
+    assert len(recorder.embed_calls) == 1
+    assert sorted(recorder.embed_calls[0]) == ["budget", "leave policy", "payroll"]
+    assert sorted(recorder.searches) == [("Finance_Team", 1, 3, None), ("HR_Team", 2, 2, None)]
+    assert [len(hr_first), len(finance), len(hr_second)] == [2, 3, 1]
+    assert batcher.stats()["batch_size_histogram"] == {3: 1}
+
+
+def test_a_full_batch_is_dispatched_without_waiting():
+    recorder = _Recorder()
+    batcher = QueryBatcher(recorder.search, recorder.embedder(), max_wait_ms=10_000, max_batch_size=2)
+
+    async def run():
+        return await asyncio.wait_for(asyncio.gather(
+            batcher.search("HR_Team", "a", 1), batcher.search("HR_Team", "b", 1),
+        ), timeout=5)
+
+    assert len(asyncio.run(run())) == 2
+    assert batcher.stats()["batches"] == 1
+
+
+def test_a_failed_search_fails_every_caller_in_the_batch():
+    recorder = _Recorder()
+    batcher = QueryBatcher(recorder.search, recorder.embedder(), max_wait_ms=20)
+
+    async def run():
+        return await asyncio.gather(
+            batcher.search("Broken", "a", 1), batcher.search("HR_Team", "b", 1), return_exceptions=True,
+        )
+
+    results = asyncio.run(run())
+    assert all(isinstance(r, RuntimeError) for r in results)
+
+
+def test_each_caller_is_searched_on_the_snapshot_it_pinned():
+    snapshots = _Snapshots()
+    recorder = _Recorder(snapshots)
+    batcher = QueryBatcher(recorder.search, recorder.embedder(), max_wait_ms=20, snapshots=snapshots)
+
+    async def run():
+        old = asyncio.ensure_future(batcher.search("HR_Team", "a", 1))
+        await asyncio.sleep(0)
+        snapshots.live = "v2"
+        new = asyncio.ensure_future(batcher.search("HR_Team", "b", 1))
+        return await old, await new
+
+    old, new = asyncio.run(run())
+
+    assert old[0]["id"] == "HR_Team-v1-0"
+    assert new[0]["id"] == "HR_Team-v2-0"
+    assert sorted(s[3] for s in recorder.searches) == ["v1", "v2"]
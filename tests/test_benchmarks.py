@@ -0,0 +1,70 @@
+import random
+import sys
+from tests.conftest import ROOT
+
+# benchmark scripts import each other as top-level modules (python benchmarks/bench_rag.py)
+sys.path.insert(0, str(ROOT / "benchmarks"))
+
+from bench_rag import _latency_summary, compare  # noqa: E402
+from synthetic import QUESTIONS, generate_corpus, generate_workload, parse_role_mix, vary  # noqa: E402
+
+REPORT = "# FinSolve Technologies Report\n\nIn 2024 FinSolve grew revenue by 12.5 percent to 420 million.\n"
+ROLES = {"Employee_Level": ["general"], "Finance_Team": ["general", "finance"]}
+
+
+def test_vary_renames_the_company_and_scales_figures_but_keeps_years():
+    varied = vary(REPORT, random.Random(0))
+
+    assert "FinSolve" not in varied
+    assert "2024" in varied
+    assert "12.5" not in varied and "420" not in varied
+    assert vary(REPORT, random.Random(0)) == varied
+
+
+def test_generate_corpus_is_reproducible(tmp_path):
+    source = tmp_path / "data"
+    (source / "finance").mkdir(parents=True)
+    (source / "finance" / "report.md").write_text(REPORT, encoding="utf-8")
+    (source / "hr").mkdir()
+    (source / "hr" / "hr_data.csv").write_text("employee_id\nE1\n", encoding="utf-8")
+
+    assert generate_corpus(source, tmp_path / "a", copies=3, seed=5) == {"finance": 3}
+    generate_corpus(source, tmp_path / "b", copies=3, seed=5)
+
+    files = sorted(p.relative_to(tmp_path / "a") for p in (tmp_path / "a").rglob("*.*"))
+    assert [str(p) for p in files] == [
+        "finance/report_syn00000.md", "finance/report_syn00001.md", "finance/report_syn00002.md", "hr/hr_data.csv",
+    ]
+    assert all((tmp_path / "a" / p).read_bytes() == (tmp_path / "b" / p).read_bytes() for p in files)
+
+
+def test_generate_workload_is_reproducible_and_stays_in_the_roles_departments():
+    headings = {"finance": ["Revenue"], "general": ["Leave Policy"]}
+    mix = parse_role_mix("Employee_Level=3,Finance_Team=1", ROLES)
+
+    workload = generate_workload(ROLES, headings, 200, mix, seed=1)
+
+    assert workload == generate_workload(ROLES, headings, 200, mix, seed=1)
+    employee_queries = {q for role, q in workload if role == "Employee_Level"}
+    assert employee_queries <= set(QUESTIONS["general"]) | {"What does the policy say about Leave Policy?"}
+    assert 100 < sum(role == "Employee_Level" for role, _ in workload) < 190
+
+
+def test_parse_role_mix_defaults_to_equal_weights():
+    assert parse_role_mix("", ROLES) == {"Employee_Level": 1.0, "Finance_Team": 1.0}
+    assert parse_role_mix("Finance_Team=2, Employee_Level", ROLES) == {"Finance_Team": 2.0, "Employee_Level": 1.0}
+
+
+def test_compare_reports_ratios_where_higher_is_better():
+    before = {"serve": {"queries_per_sec": 10.0, "latency": {"p50_ms": 200.0}}}
+    after = {"serve": {"queries_per_sec": 20.0, "latency": {"p50_ms": 100.0}}}
+
+    table = compare(before, after)
+
+    assert table["serve.queries_per_sec"]["ratio"] == 2.0
+    assert table["serve.latency.p50_ms"]["ratio"] == 2.0
+
+
+def test_latency_summary():
+    assert _latency_summary([]) == {"n": 0}
+    assert _latency_summary([0.001, 0.003])["p50_ms"] == 2.0
@@ -0,0 +1,116 @@
+import json
+import pytest
+from src.bm25 import IDF_FILE, BM25Index, build_indexes, tokenize
+from tests.conftest import make_chunks
+
+
+@pytest.fixture
+def index(tmp_path, registry):
+    chunks = make_chunks()
+    chunks.append({
+        "id": "finance-id",
+        "text": "Reimbursement approved by FINEMP1006 under PCI-DSS rules",
+        "metadata": {"department": "finance", "source": "finance.md", "sub_hierarchy": "Approvals"},
+    })
+    for chunk in chunks:
+        chunk["metadata"]["access_mask"] = registry.group_mask(chunk["metadata"]["department"])
+    build_indexes(chunks, tmp_path / "bm25")
+    return BM25Index(tmp_path / "bm25", registry=registry)
+
+
+def test_tokenize_keeps_ids_whole_and_indexes_their_parts():
+    assert tokenize("What is the PCI-DSS scope for FINEMP1006?") == ["pci-dss", "pci", "dss", "scope", "finemp1006"]
+
+
+def test_build_indexes_writes_one_file_per_department_and_the_idf(index):
+    files = sorted(p.name for p in index.index_dir.glob("*.json"))
+
+    assert files == sorted([f"{d}.json" for d in ("general", "finance", "marketing", "hr", "engineering")] + [IDF_FILE])
+    payload = json.loads((index.index_dir / "finance.json").read_text())
+    assert len(payload["ids"]) == 5
+
+
+def test_build_indexes_removes_departments_without_chunks(index, tmp_path):
+    build_indexes([c for c in make_chunks() if c["metadata"]["department"] == "general"], index.index_dir)
+
+    assert not (index.index_dir / "finance.json").exists()
+    assert (index.index_dir / "general.json").exists()
+
+
+def test_search_finds_exact_terms(index):
+    hits = index.search("Finance_Team", ["general", "finance"], "Who approved under FINEMP1006?", 3)
+
+    assert hits[0]["id"] == "finance-id"
+    assert hits[0]["distance"] is None
+    assert hits[0]["bm25"] > 0
+    assert hits[0]["bm25_match"] == pytest.approx(1.0, abs=1e-4)
+
+
+def test_search_respects_the_role_mask(index):
+    # the role is handed every department, but its mask still keeps finance chunks out
+    departments = ["general", "finance", "marketing", "hr", "engineering"]
+    hits = index.search("Employee_Level", departments, "finance topic FINEMP1006", 10)
+
+    assert hits
+    assert {hit["metadata"]["department"] for hit in hits} == {"general"}
+
+
+def test_bm25_match_is_the_share_of_query_idf_matched(index):
+    [hit] = index.search("Finance_Team", ["finance"], "FINEMP1006 payroll", 1)
+    assert hit["bm25_match"] == pytest.approx(1.0, abs=1e-4)  # "payroll" is in no chunk, so it has no IDF
+
+    [hit] = index.search("Finance_Team", ["finance"], "FINEMP1006 general", 1)
+    assert 0 < hit["bm25_match"] < 1
+
+
+def test_search_without_terms_returns_nothing(index):
+    assert index.search("Finance_Team", ["finance"], "what is the", 5) == []
+
+
+def _hit(chunk_id, distance=None, **fields):
+    return {"id": chunk_id, "document": chunk_id, "metadata": {}, "distance": distance, **fields}
+
+
+def test_reciprocal_rank_fusion_ranks_chunks_both_retrievers_found_first():
+    from app.services.rag_service import _reciprocal_rank_fusion
+
+    vector = [_hit("a", 0.1), _hit("b", 0.2), _hit("c", 0.3)]
+    lexical = [_hit("c", bm25=5.0), _hit("d", bm25=4.0)]
+
+    fused = _reciprocal_rank_fusion([vector, lexical], k=60)
+
+    assert [h["id"] for h in fused] == ["c", "a", "b", "d"]
+    assert fused[0]["rrf"] == pytest.approx(1 / 63 + 1 / 61)
+    # a chunk found by both keeps its vector distance and its BM25 score
+    assert (fused[0]["distance"], fused[0]["bm25"]) == (0.3, 5.0)
+    assert fused[3]["distance"] is None
+
+
+def test_hits_pass_on_distance_or_lexical_match():
+    from app.services.rag_service import RAGService
+
+    service = RAGService(None, None, min_lexical_match=0.5)
+
+    assert service._relevant(_hit("a", 0.4), 0.5, None)
+    assert not service._relevant(_hit("a", 0.9), 0.5, None)
+    assert service._relevant(_hit("b", bm25=1.0, bm25_match=0.6), 0.5, None)
+    assert not service._relevant(_hit("b", bm25=1.0, bm25_match=0.4), 0.5, None)
+    # the top fused chunk is kept when the vector search found it too
+    assert service._relevant(_hit("c", 0.9, bm25=1.0, bm25_match=0.1), 0.5, "c")
+    assert not service._relevant(_hit("d", bm25=1.0, bm25_match=0.1), 0.5, "d")
+
+
+def test_hybrid_fuses_vector_hits_with_authorized_bm25_hits(index, registry, monkeypatch):
+    from app.services import rag_service
+
+    monkeypatch.setattr(rag_service, "access_registry", registry)
+    service = rag_service.RAGService(None, None, lexical_index=index)
+
+    hits = service._hybrid("Finance_Team", "FINEMP1006 reimbursement", [_hit("general-0", 0.4)], 5)
+
+    # each list's top hit scores the same; ties keep the vector hit first
+    assert [h["id"] for h in hits] == ["general-0", "finance-id"]
+    assert all("rrf" in h for h in hits)
+    assert service._hybrid("Employee_Level", "FINEMP1006 reimbursement", [_hit("general-0", 0.4)], 5) == [
+        _hit("general-0", 0.4)
+    ]
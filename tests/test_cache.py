@@ -0,0 +1,127 @@
+from app.utils.cache import AnswerCache, LRUCache, QueryEmbeddingCache, SemanticCache, normalize_query
+
+
+class _CountingEmbedder:
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, texts):
+        self.calls.append(list(texts))
+        return [[float(len(t))] for t in texts]
+
+
+def test_lru_evicts_least_recently_used():
+    cache = LRUCache(max_size=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    cache.get("a")
+    cache.put("c", 3)
+
+    assert cache.get("a") == 1
+    assert cache.get("b") is None
+    assert cache.get("c") == 3
+    assert cache.stats()["hits"] == 3
+    assert cache.stats()["misses"] == 1
+
+
+def test_lru_expires_entries_after_ttl(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr("app.utils.cache.time.monotonic", lambda: now[0])
+    cache = LRUCache(max_size=4, ttl_seconds=10)
+    cache.put("a", 1)
+
+    now[0] += 9
+    assert cache.get("a") == 1
+    now[0] += 2
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+
+def test_normalize_query_ignores_case_and_spacing():
+    assert normalize_query("  What is   the\tLeave Policy? ") == "what is the leave policy?"
+
+
+def test_embedding_cache_embeds_each_distinct_miss_once():
+    embedder = _CountingEmbedder()
+    cache = QueryEmbeddingCache(embedder, max_size=8)
+
+    first = cache.embed(["Leave policy", "leave  POLICY", "budget"])
+    second = cache.embed(["budget", "leave policy", "payroll"])
+
+    assert embedder.calls == [["budget", "leave policy"], ["payroll"]]
+    assert first == [[12.0], [12.0], [6.0]]
+    assert second == [[6.0], [12.0], [7.0]]
+    assert cache.stats()["hits"] == 2
+
+
+def test_answer_cache_is_scoped_to_the_role():
+    cache = AnswerCache()
+    cache.put("Finance_Team", "Q3 revenue?", ["a", "b"], "finance answer")
+
+    assert cache.get("Finance_Team", "q3  revenue?", ["b", "a"]) == "finance answer"
+    assert cache.get("Employee_Level", "Q3 revenue?", ["a", "b"]) is None
+    assert cache.get("Finance_Team", "Q3 revenue?", ["a"]) is None
+
+
+def test_answer_cache_misses_after_a_snapshot_swap():
+    version = ["v1"]
+    cache = AnswerCache(version_fn=lambda: version[0])
+    cache.put("HR_Team", "leave policy", ["a"], "old answer")
+
+    version[0] = "v2"
+    assert cache.get("HR_Team", "leave policy", ["a"]) is None
+    cache.put("HR_Team", "leave policy", ["a"], "new answer")
+
+    # a request still running on the old snapshot keeps its own entry
+    version[0] = "v1"
+    assert cache.get("HR_Team", "leave policy", ["a"]) == "old answer"
+    assert cache.stats()["version"] == "v1"
+
+
+def test_answer_cache_misses_after_the_role_loses_access():
+    masks = {"Finance_Team": 0b11}
+    cache = AnswerCache(access_fn=lambda role: masks.get(role, 0))
+    cache.put("Finance_Team", "budget", ["a"], "answer")
+
+    masks["Finance_Team"] = 0b01
+    assert cache.get("Finance_Team", "budget", ["a"]) is None
+
+
+def test_semantic_cache_returns_answers_of_close_queries_only():
+    cache = SemanticCache(threshold=0.9)
+    cache.add("HR_Team", [1.0, 0.0, 0.0], "leave answer", llm_seconds=2.5)
+
+    assert cache.lookup("HR_Team", [0.95, 0.1, 0.0]) == "leave answer"
+    assert cache.lookup("HR_Team", [0.5, 0.5, 0.5]) is None
+    assert cache.lookup("Finance_Team", [1.0, 0.0, 0.0]) is None
+
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"]) == (1, 2)
+    assert stats["saved_llm_seconds"] == 2.5
+    assert sum(stats["similarity_histogram"].values()) == 2
+
+
+def test_semantic_cache_overwrites_the_oldest_entry_when_full():
+    cache = SemanticCache(threshold=0.99, max_entries_per_role=2)
+    for i, vector in enumerate([[1, 0, 0], [0, 1, 0], [0, 0, 1]]):
+        cache.add("HR_Team", vector, f"answer {i}")
+
+    assert cache.lookup("HR_Team", [1, 0, 0]) is None
+    assert cache.lookup("HR_Team", [0, 0, 1]) == "answer 2"
+    assert cache.stats()["entries"] == {"HR_Team": 2}
+
+
+def test_semantic_cache_keeps_buffers_of_recent_versions_only():
+    version = ["v1"]
+    cache = SemanticCache(threshold=0.9, version_fn=lambda: version[0])
+    cache.add("HR_Team", [1, 0], "v1 answer")
+
+    version[0] = "v2"
+    assert cache.lookup("HR_Team", [1, 0]) is None
+    version[0] = "v1"
+    assert cache.lookup("HR_Team", [1, 0]) == "v1 answer"
+
+    version[0] = "v3"
+    cache.lookup("HR_Team", [1, 0])
+    version[0] = "v1"
+    assert cache.lookup("HR_Team", [1, 0]) is None
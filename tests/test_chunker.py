@@ -0,0 +1,91 @@
+import re
+from src.chunker import chunking_settings, clean_lines, rechunk
+
+
+class _WordTokenizer:
+    """
+    One token per whitespace-separated word, plus [CLS]/[SEP]: token counts are word counts.
+    """
+
+    def num_special_tokens_to_add(self):
+        return 2
+
+    def __call__(self, lines, add_special_tokens=False, return_offsets_mapping=False):
+        offsets = [[m.span() for m in re.finditer(r"\S+", line)] for line in lines]
+        return {
+            "offset_mapping": offsets,
+            "input_ids": [list(range(len(spans))) for spans in offsets],
+        }
+
+
+def _item(section, content, subsection=None):
+    return {"section": section, "subsection": subsection, "subsubsection": None, "content": content}
+
+
+def _words(n, start=0):
+    return " ".join(f"w{i}" for i in range(start, start + n))
+
+
+def test_clean_lines_drops_blanks_fences_and_rules():
+    assert clean_lines(["", "  text  ", "```", "---", "a --- b", "more"]) == ["text", "more"]
+
+
+def test_rechunk_is_a_no_op_without_a_budget():
+    items = [_item("A", ["one"])]
+    assert rechunk(items, max_tokens=0) == items
+
+
+def test_long_sections_are_split_with_overlap():
+    items = [_item("Policy", [_words(25)])]
+
+    chunks = rechunk(items, max_tokens=12, overlap_tokens=3, min_tokens=0, tokenizer=_WordTokenizer())
+
+    words = [chunk["content"][0].split() for chunk in chunks]
+    assert all(len(w) <= 10 for w in words)
+    for prev, nxt in zip(words, words[1:]):
+        assert prev[-3:] == nxt[:3]
+    assert words[0][0] == "w0" and words[-1][-1] == "w24"
+    assert all(chunk["section"] == "Policy" for chunk in chunks)
+
+
+def test_splits_prefer_line_ends():
+    items = [_item("Policy", [_words(6), _words(6, start=6)])]
+
+    chunks = rechunk(items, max_tokens=10, overlap_tokens=0, min_tokens=0, tokenizer=_WordTokenizer())
+
+    assert [chunk["content"] for chunk in chunks] == [[_words(6)], [_words(6, start=6)]]
+
+
+def test_small_sections_merge_within_their_top_level_section():
+    items = [
+        _item("Leave", ["Annual leave is 24 days."], subsection="Annual"),
+        _item("Leave", ["Sick leave is 10 days."], subsection="Sick"),
+        _item("Payroll", ["Salaries are paid monthly."]),
+    ]
+
+    chunks = rechunk(items, max_tokens=50, overlap_tokens=0, min_tokens=20, tokenizer=_WordTokenizer())
+
+    assert len(chunks) == 2
+    assert chunks[0]["section"] == "Leave" and chunks[0]["subsection"] is None
+    assert chunks[0]["content"] == ["Annual", "Annual leave is 24 days.", "Sick", "Sick leave is 10 days."]
+    assert chunks[1]["section"] == "Payroll"
+
+
+def test_merges_never_exceed_the_budget():
+    items = [_item("Leave", [_words(6)], subsection="A"), _item("Leave", [_words(6)], subsection="B")]
+
+    chunks = rechunk(items, max_tokens=12, overlap_tokens=0, min_tokens=8, tokenizer=_WordTokenizer())
+
+    assert [chunk["subsection"] for chunk in chunks] == ["A", "B"]
+
+
+def test_bare_headings_fold_into_their_subsection():
+    items = [_item("Leave", []), _item("Leave", ["Annual leave is 24 days."], subsection="Annual")]
+
+    chunks = rechunk(items, max_tokens=50, overlap_tokens=0, min_tokens=0, tokenizer=_WordTokenizer())
+
+    assert chunks == [_item("Leave", ["Annual leave is 24 days."], subsection="Annual")]
+
+
+def test_chunking_settings_are_recorded():
+    assert set(chunking_settings()) == {"model", "max_tokens", "overlap_tokens", "min_tokens"}
@@ -0,0 +1,24 @@
+import pytest
+from src.retrieval import ROLE_HIERARCHY
+from tests.conftest import embed
+
+
+@pytest.mark.parametrize("role", sorted(ROLE_HIERARCHY))
+def test_searches_only_the_roles_partitions(router, role):
+    hits = router.query(role, 20, query_texts=["finance document"])[0]
+
+    assert {h["metadata"]["department"] for h in hits} == set(ROLE_HIERARCHY[role])
+
+
+def test_merges_partitions_by_distance(router):
+    hits = router.query("God_Tier_Admins", 3, query_embeddings=embed(["marketing document 1", "hr topic number 3"]))
+
+    assert [len(q) for q in hits] == [3, 3]
+    assert hits[0][0]["id"] == "marketing-1"
+    assert hits[1][0]["id"] == "hr-3"
+    for q in hits:
+        assert [h["distance"] for h in q] == sorted(h["distance"] for h in q)
+
+
+def test_unknown_role_searches_nothing(router):
+    assert router.query("Intern", 5, query_texts=["finance"]) == [[]]
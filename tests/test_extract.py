@@ -0,0 +1,78 @@
+import pytest
+from src.extract import ingest_file, iter_sections, read_chunked_report, write_chunked_report
+
+MARKDOWN = """Preamble before any section is dropped.
+
+# Employee Handbook
+
+Welcome text.
+
+## Leave Policy
+
+Employees get 24 days of paid leave.
+--------------------------------
+
+### Sick Leave
+
+Up to 12 days with a certificate.
+
+Benefits:
+---
+Health cover for the whole family.
+
+#### Deep heading stays text
+
+# Code of Conduct
+
+```
+keep fences
+```
+"""
+
+
+@pytest.fixture
+def markdown(tmp_path):
+    path = tmp_path / "general" / "handbook.md"
+    path.parent.mkdir()
+    path.write_text(MARKDOWN, encoding="utf-8")
+    return path
+
+
+def test_sections_follow_the_heading_hierarchy(markdown):
+    sections = ingest_file(markdown)
+
+    assert [(s["section"], s["subsection"], s["subsubsection"]) for s in sections] == [
+        ("Employee Handbook", None, None),
+        ("Employee Handbook", "Leave Policy", None),
+        ("Employee Handbook", "Leave Policy", "Sick Leave"),
+        ("Employee Handbook", "Benefits", None),
+        ("Code of Conduct", None, None),
+    ]
+
+
+def test_content_drops_separators_and_keeps_deep_headings_as_text(markdown):
+    sections = ingest_file(markdown)
+
+    assert sections[1]["content"] == ["", "Employees get 24 days of paid leave.", ""]
+    assert "#### Deep heading stays text" in sections[3]["content"]
+    assert "```" in sections[4]["content"]
+    assert all("Preamble" not in line for s in sections for line in s["content"])
+
+
+def test_sections_are_streamed(markdown):
+    sections = iter_sections(markdown)
+
+    assert next(sections)["section"] == "Employee Handbook"
+
+
+@pytest.mark.parametrize("fmt", ["json", "jsonl"])
+def test_chunked_reports_round_trip(markdown, fmt):
+    sections = ingest_file(markdown)
+    other = write_chunked_report(markdown, sections, fmt="jsonl" if fmt == "json" else "json")
+
+    path = write_chunked_report(markdown, iter(sections), fmt=fmt)
+
+    assert path.suffix == f".{fmt}"
+    assert read_chunked_report(path) == sections
+    # only one report per markdown file is ingested
+    assert not other.exists()
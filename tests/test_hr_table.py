@@ -0,0 +1,83 @@
+import pytest
+from src.hr_table import HR_COLUMNS, HR_TABLE_FILE, HRTable, build_hr_table, read_hr_rows
+
+ROWS = [
+    ("E1", "Asha Rao", "Data Analyst", "Finance", "Pune", 100.0, 90.0),
+    ("E2", "Ben Iyer", "Credit Officer", "Finance", "Mumbai", 200.0, 80.0),
+    ("E3", "Chen Das", "Recruiter", "HR", "Pune", 300.0, 100.0),
+]
+
+
+@pytest.fixture
+def table(tmp_path):
+    csv_path = tmp_path / "hr_data.csv"
+    lines = [",".join(HR_COLUMNS)]
+    for employee_id, name, role, department, location, salary, attendance in ROWS:
+        values = {column: "" for column in HR_COLUMNS}
+        values.update(employee_id=employee_id, full_name=name, role=role, department=department,
+                      location=location, salary=str(salary), attendance_pct=str(attendance))
+        lines.append(",".join(values.values()))
+    csv_path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+    db_path = tmp_path / HR_TABLE_FILE
+    build_hr_table(read_hr_rows(csv_path), db_path, ["HR_Team", "God_Tier_Admins"])
+    return HRTable(db_path)
+
+
+def test_read_hr_rows_types_the_cells(table, tmp_path):
+    rows = read_hr_rows(tmp_path / "hr_data.csv")
+
+    assert rows[0]["salary"] == 100.0
+    assert rows[0]["leave_balance"] is None
+    assert rows[0]["department"] == "Finance"
+
+
+def test_parse_question_recognizes_aggregates(table):
+    assert table.parse_question("What is the average attendance by department?") == {
+        "function": "avg", "column": "attendance_pct", "group_by": "department", "filters": {},
+    }
+    assert table.parse_question("How many employees are in Pune?")["filters"] == {"location": "Pune"}
+    assert table.parse_question("Highest salary among Data Analysts")["filters"] == {"role": "Data Analyst"}
+
+
+def test_policy_and_prose_questions_are_left_to_the_documents(table):
+    assert table.parse_question("What is the minimum attendance required by policy?") is None
+    assert table.parse_question("How many sick days do employees get?") is None
+    assert table.parse_question("Who is the CEO?") is None
+
+
+def test_answer_runs_the_aggregate(table):
+    answer = table.answer("HR_Team", "How many employees are there?")
+    assert answer.splitlines() == ["HR records (all employees): count of employees", "- count of employees: 3 employees"]
+
+    grouped = table.answer("HR_Team", "Average salary per department")
+    assert "- Finance: 150.00 (2 employees)" in grouped
+    assert "- HR: 300.00 (1 employees)" in grouped
+
+
+def test_roles_without_hr_access_get_nothing(table):
+    assert table.answer("Finance_Team", "How many employees are there?") is None
+    with pytest.raises(PermissionError):
+        table.aggregate("Finance_Team", "count")
+
+
+def test_registry_decides_access_when_given(table, registry):
+    registry.register({"People_Ops": ["general", "hr"]})
+    table = HRTable(table.db_path, registry=registry)
+
+    assert table.can_read("People_Ops")
+    assert not table.can_read("Finance_Team")
+
+
+def test_missing_table_answers_nothing(tmp_path):
+    assert HRTable(tmp_path / "missing.sqlite").answer("HR_Team", "How many employees are there?") is None
+
+
+def test_rag_service_ranks_table_answers_first(table):
+    from app.services.rag_service import RAGService
+
+    service = RAGService(None, None, hr_table=table)
+
+    [hit] = service._table_hits("HR_Team", "How many employees are there?")
+    assert hit["distance"] == 0.0 and hit["metadata"]["department"] == "hr"
+    assert service._table_hits("Finance_Team", "How many employees are there?") == []
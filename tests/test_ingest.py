@@ -0,0 +1,101 @@
+import json
+import chromadb
+from src.ingest import _batched
+
+
+def _stored(ingestion, name="corporate_documents"):
+    client = chromadb.PersistentClient(path=str(ingestion.module.DB_PATH))
+    return client.get_collection(name).get(include=["documents", "metadatas"])
+
+
+def _version(ingestion):
+    return (ingestion.module.DB_PATH / ingestion.module.INGEST_VERSION_FILE).read_text()
+
+
+def test_first_incremental_run_ingests_everything(ingestion):
+    ingestion.module.run_incremental_ingestion()
+
+    stored = _stored(ingestion)
+    assert sorted(ingestion.embedded) == sorted(stored["documents"])
+    manifest = json.loads((ingestion.module.DB_PATH / ingestion.module.MANIFEST_FILE).read_text())
+    assert sorted(manifest["files"]) == ["engineering/architecture.md", "finance/report.md", "general/handbook.md"]
+    assert sorted(stored["ids"]) == sorted(i for entry in manifest["files"].values() for i in entry["chunks"])
+
+
+def test_unchanged_files_are_not_embedded_again(ingestion):
+    ingestion.module.run_incremental_ingestion()
+    version = _version(ingestion)
+    ingestion.embedded.clear()
+
+    ingestion.module.run_incremental_ingestion()
+
+    assert ingestion.embedded == []
+    assert _version(ingestion) == version
+
+
+def test_only_changed_sections_are_embedded(ingestion):
+    ingestion.module.run_incremental_ingestion()
+    before = set(_stored(ingestion)["ids"])
+    ingestion.embedded.clear()
+
+    ingestion.write("finance/report.md", "# Quarterly Report\n\n## Revenue\n\nQ3 revenue grew 12 percent to 4.2 million.\n\n"
+                                         "## Costs\n\nVendor costs rose after the new contract.\n")
+    ingestion.module.run_incremental_ingestion()
+
+    stored = _stored(ingestion)
+    assert ingestion.embedded == ["Vendor costs rose after the new contract."]
+    assert len(set(stored["ids"]) - before) == 1
+    assert len(before - set(stored["ids"])) == 1
+
+
+def test_chunks_of_deleted_files_are_removed(ingestion):
+    ingestion.module.run_incremental_ingestion()
+    kept = [m["department"] for m in _stored(ingestion)["metadatas"] if m["department"] != "engineering"]
+
+    (ingestion.data_dir / "engineering/architecture.md").unlink()
+    ingestion.module.run_incremental_ingestion()
+
+    stored = _stored(ingestion)
+    assert sorted(m["department"] for m in stored["metadatas"]) == sorted(kept)
+
+
+def test_pipeline_embeds_in_fixed_size_batches(ingestion):
+    written = ingestion.module.run_pipeline(workers=2, batch_size=3)
+
+    stored = _stored(ingestion)
+    assert written == len(stored["ids"]) == len(ingestion.embedded)
+    assert all(size == 3 for size in ingestion.batch_sizes[:-1])
+    assert 0 < ingestion.batch_sizes[-1] <= 3
+
+
+def test_pipeline_matches_incremental_ingestion(ingestion):
+    ingestion.module.run_pipeline(workers=2)
+    pipelined = sorted(_stored(ingestion)["ids"])
+
+    (ingestion.module.DB_PATH / ingestion.module.MANIFEST_FILE).unlink()
+    ingestion.module.run_incremental_ingestion()
+
+    assert sorted(_stored(ingestion)["ids"]) == pipelined
+
+
+def test_pipeline_rerun_deletes_chunks_of_removed_files(ingestion):
+    ingestion.module.run_pipeline(workers=1)
+    (ingestion.data_dir / "finance/report.md").unlink()
+
+    ingestion.module.run_pipeline(workers=1)
+
+    assert "finance" not in {m["department"] for m in _stored(ingestion)["metadatas"]}
+
+
+def test_processed_files_keep_input_order(ingestion):
+    paths = sorted(ingestion.data_dir.glob("*/*.md"))
+    # parser processes only read the role registry, the pipeline writes it first
+    ingestion.module._register_access()
+
+    keys = [key for key, _, _ in ingestion.module.iter_processed_files(paths, workers=2)]
+
+    assert keys == [f"{p.parent.name}/{p.name}" for p in paths]
+
+
+def test_batched_splits_an_iterator_into_fixed_size_lists():
+    assert list(_batched(iter(range(7)), 3)) == [[0, 1, 2], [3, 4, 5], [6]]
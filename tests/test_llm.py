@@ -0,0 +1,159 @@
+import asyncio
+import pytest
+from app.utils.llm import LLMBackend, LLMClient, LocalBackend, llm_from_env
+
+
+class _ScriptedBackend(LLMBackend):
+    """
+    Raises the scripted errors in turn, then answers; async calls wait delays[i] seconds first.
+    """
+    name = "scripted"
+
+    def __init__(self, errors=(), delays=(), pieces=("a ", "b")):
+        self.errors = list(errors)
+        self.delays = list(delays)
+        self.pieces = pieces
+        self.calls = 0
+
+    def _next(self):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return f"answer {self.calls}"
+
+    def generate(self, prompt, timeout_s):
+        return self._next()
+
+    async def agenerate(self, prompt, timeout_s):
+        call = self.calls
+        if call < len(self.delays):
+            self.calls += 1
+            await asyncio.sleep(self.delays[call])
+            return f"answer {call + 1}"
+        return self._next()
+
+    async def astream(self, prompt):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        for piece in self.pieces:
+            yield piece
+            await asyncio.sleep(0)
+
+
+class _Status(Exception):
+    def __init__(self, code):
+        super().__init__(f"HTTP {code}")
+        self.code = code
+
+
+def _client(backend, **kwargs):
+    return LLMClient(backend, backoff_base_s=0, **kwargs)
+
+
+def test_retryable_errors_are_retried():
+    client = _client(_ScriptedBackend(errors=[TimeoutError(), _Status(503)]), max_retries=2)
+
+    assert client("prompt") == "answer 3"
+    stats = client.stats()
+    assert (stats["calls"], stats["retries"], stats["timeouts"], stats["failures"]) == (1, 2, 1, 0)
+
+
+def test_other_errors_fail_at_once():
+    backend = _ScriptedBackend(errors=[_Status(400)])
+    client = _client(backend, max_retries=2)
+
+    with pytest.raises(_Status):
+        client("prompt")
+    assert backend.calls == 1
+    assert client.stats()["failures"] == 1
+
+
+def test_async_calls_retry_until_the_limit():
+    client = _client(_ScriptedBackend(errors=[ConnectionError()] * 3), max_retries=2)
+
+    with pytest.raises(ConnectionError):
+        asyncio.run(client.agenerate("prompt"))
+    assert client.stats()["retries"] == 2
+
+
+def test_a_slow_call_is_hedged_and_the_first_answer_wins():
+    client = _client(_ScriptedBackend(delays=[1.0, 0.0]), hedge_after_ms=20)
+
+    assert asyncio.run(asyncio.wait_for(client.agenerate("prompt"), 0.5)) == "answer 2"
+    assert (client.hedges, client.hedge_wins) == (1, 1)
+
+
+def test_no_hedge_is_sent_while_every_slot_is_busy():
+    client = _client(_ScriptedBackend(delays=[0.1]), hedge_after_ms=10, max_concurrency=1)
+
+    assert asyncio.run(client.agenerate("prompt")) == "answer 1"
+    assert client.hedges == 0
+
+
+def test_cancelled_calls_give_their_slots_back():
+    client = _client(_ScriptedBackend(delays=[10.0, 10.0]), hedge_after_ms=10, max_concurrency=2)
+
+    async def run():
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(client.agenerate("prompt"), 0.1)
+        # cancelled attempts release their slots the next time they run
+        await asyncio.sleep(0.01)
+        return client._async_slots._value
+
+    assert asyncio.run(run()) == 2
+
+
+def test_streams_yield_pieces_and_record_the_call():
+    client = _client(_ScriptedBackend(errors=[_Status(429)]))
+
+    async def collect():
+        return [piece async for piece in client.astream("prompt")]
+
+    assert asyncio.run(collect()) == ["a ", "b"]
+    stats = client.stats()
+    assert (stats["calls"], stats["retries"], stats["failures"]) == (1, 1, 0)
+
+
+def test_an_abandoned_stream_releases_its_slot_and_counts_as_failed():
+    client = _client(_ScriptedBackend(pieces=["a "] * 10), max_concurrency=1)
+
+    async def read_one():
+        stream = client.astream("prompt")
+        await stream.__anext__()
+        await stream.aclose()
+        return client._async_slots._value
+
+    assert asyncio.run(read_one()) == 1
+    assert (client.calls, client.failures) == (1, 1)
+
+
+def test_local_backend_answers_from_the_context_chunks():
+    backend = LocalBackend(latency_ms=0, jitter_ms=0)
+    prompt = "CONTEXT:\n[Chunk 1]\nLeave is 24 days. More text.\n[Chunk 2]\nPayroll runs monthly.\n"
+
+    answer = backend.generate(prompt, timeout_s=1)
+
+    assert answer.splitlines()[1:] == ["- Leave is 24 days.", "- Payroll runs monthly."]
+    assert backend.generate(prompt, timeout_s=1) == answer
+
+
+def test_local_backend_latency_replays_from_the_seed():
+    first, second = LocalBackend(seed=7, tail_rate=0.5, tail_ms=100), LocalBackend(seed=7, tail_rate=0.5, tail_ms=100)
+
+    assert [first._latency_s() for _ in range(5)] == [second._latency_s() for _ in range(5)]
+
+
+def test_llm_from_env(monkeypatch):
+    monkeypatch.setenv("LLM_BACKEND", "local")
+    monkeypatch.setenv("LLM_HEDGE_AFTER_MS", "250")
+    monkeypatch.setenv("LLM_MAX_CONCURRENCY", "4")
+
+    client = llm_from_env()
+
+    assert client.backend.name == "local"
+    assert (client.hedge_after_ms, client.max_concurrency) == (250.0, 4)
+
+    monkeypatch.setenv("LLM_BACKEND", "other")
+    with pytest.raises(ValueError):
+        llm_from_env()
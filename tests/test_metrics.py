@@ -0,0 +1,68 @@
+import asyncio
+from app.utils.concurrency import run_blocking
+from app.utils.metrics import MetricsRegistry, current_role_label, labelled_role, role_label
+
+
+def test_counters_render_in_prometheus_text_format():
+    registry = MetricsRegistry()
+    counter = registry.counter("rag_things_total", "Things.", ("kind",))
+    counter.inc(kind="a")
+    counter.inc(2, kind="a")
+    counter.inc(0, kind="b")
+
+    assert registry.render().splitlines() == [
+        "# HELP rag_things_total Things.",
+        "# TYPE rag_things_total counter",
+        'rag_things_total{kind="a"} 3',
+    ]
+
+
+def test_histograms_are_cumulative():
+    registry = MetricsRegistry()
+    histogram = registry.histogram("rag_seconds", "Latency.", ("stage",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 5.0):
+        histogram.observe(value, stage="llm")
+
+    lines = registry.render().splitlines()
+    assert 'rag_seconds_bucket{stage="llm",le="0.1"} 1' in lines
+    assert 'rag_seconds_bucket{stage="llm",le="1.0"} 2' in lines
+    assert 'rag_seconds_bucket{stage="llm",le="+Inf"} 3' in lines
+    assert 'rag_seconds_count{stage="llm"} 3' in lines
+
+
+def test_collectors_are_read_at_scrape_time():
+    registry = MetricsRegistry()
+    hits = [1]
+    registry.register_collector(lambda: [("rag_cache_hits_total", "Hits.", {"cache": "answers"}, hits[0])])
+    hits[0] = 5
+
+    assert 'rag_cache_hits_total{cache="answers"} 5' in registry.render()
+
+
+def test_unknown_roles_share_one_label():
+    roles = {"HR_Team": ["general", "hr"]}
+
+    assert role_label("HR_Team", roles) == "HR_Team"
+    assert role_label("made-up role", roles) == "unknown"
+
+
+def test_stage_labels_follow_the_request_into_worker_threads():
+    async def run():
+        with labelled_role("HR_Team"):
+            return await run_blocking(current_role_label)
+
+    assert current_role_label() == "all"
+    assert asyncio.run(run()) == "HR_Team"
+
+
+def test_metrics_endpoint_reports_requests_and_stages(api):
+    api.post("/rag/query", json={"role": "Finance_Team", "query": "finance document 1"})
+
+    response = api.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    text = response.text
+    assert 'rag_request_seconds_count{endpoint="query",' in text
+    assert 'rag_stage_seconds_count{stage="vector_search",' in text
+    assert 'rag_llm_events_total{event="calls"}' in text
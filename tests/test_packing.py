@@ -0,0 +1,68 @@
+from app.utils.packing import ContextStats, collapse_near_duplicates, pack_by_relevance, rank_relevance, simhash
+
+HANDBOOK = "Employees get twenty four days of paid annual leave every calendar year, accrued monthly."
+
+
+def test_everything_is_kept_when_it_fits():
+    assert pack_by_relevance([10, 20, 30], rank_relevance(3), budget=64, granularity=1) == [0, 1, 2]
+
+
+def test_knapsack_skips_a_large_chunk_for_several_smaller_ones():
+    # stopping at the first chunk that does not fit would keep only chunk 0
+    chosen = pack_by_relevance([60, 50, 20, 20], rank_relevance(4), budget=100, granularity=1)
+
+    assert chosen == [0, 2, 3]
+
+
+def test_the_pinned_best_chunk_is_kept_over_two_later_ones():
+    token_counts = [80, 40, 40]
+
+    assert pack_by_relevance(token_counts, rank_relevance(3), budget=100, granularity=1) == [1, 2]
+    assert pack_by_relevance(token_counts, rank_relevance(3), budget=100, granularity=1, pinned=1) == [0]
+
+
+def test_a_pinned_chunk_larger_than_the_budget_is_skipped():
+    assert pack_by_relevance([200, 40, 40], rank_relevance(3), budget=100, granularity=1, pinned=1) == [1, 2]
+
+
+def test_rounded_token_counts_never_exceed_the_budget():
+    token_counts = [17, 17, 17, 17, 17, 17]
+    chosen = pack_by_relevance(token_counts, rank_relevance(6), budget=64, granularity=16)
+
+    assert sum(token_counts[i] for i in chosen) <= 64
+    assert len(chosen) == 2  # each chunk rounds up to 32 tokens
+
+
+def test_near_duplicates_collapse_to_the_first_copy():
+    edited = HANDBOOK.replace("monthly.", "monthly!")
+    other = "The finance team closes the books on the fifth working day of each month."
+
+    assert bin(simhash(HANDBOOK) ^ simhash(edited)).count("1") <= 3
+    assert collapse_near_duplicates([HANDBOOK, other, edited]) == ([HANDBOOK, other], 1)
+
+
+def test_context_stats_totals_saved_tokens():
+    stats = ContextStats()
+    stats.record(prompt_tokens=120, candidate_tokens=300, context_tokens=100, near_duplicates=1, dropped_for_budget=2)
+    stats.record(prompt_tokens=80, candidate_tokens=100, context_tokens=100, near_duplicates=0, dropped_for_budget=0)
+
+    summary = stats.stats()
+    assert summary["prompts"] == 2
+    assert summary["mean_prompt_tokens"] == 100
+    assert summary["tokens_saved"] == 200
+    assert (summary["near_duplicates_collapsed"], summary["chunks_dropped_for_budget"]) == (1, 2)
+
+
+def test_prompt_keeps_the_best_chunk_and_respects_the_budget():
+    from app.services.rag_service import RAGService
+
+    best = "Leave policy: " + " ".join(["annual"] * 70)
+    smaller = [f"Smaller chunk {i} about office hours and holidays, more or less." for i in range(4)]
+    service = RAGService(None, None, context_token_budget=120)
+    service.count_tokens = lambda text: len(text.split())
+
+    _, prompt, _ = service._prepare_prompt([best, *smaller, best], "leave?")
+
+    assert "[Chunk 1]\nLeave policy:" in prompt
+    assert prompt.count("Leave policy:") == 1
+    assert service.context_stats.stats()["chunks_dropped_for_budget"] > 0
@@ -0,0 +1,105 @@
+import json
+import numpy as np
+import pytest
+from src.quantized_index import (
+    QUANTIZED_MANIFEST, QuantizedIndex, build_quantized_index, index_is_current, similarity_to_distance,
+)
+from tests.conftest import DEPARTMENTS, embed, make_chunks
+
+
+def _docs(registry, chunks, embeddings):
+    return [
+        {**chunk, "metadata": {**chunk["metadata"], "access_mask": registry.group_mask(chunk["metadata"]["department"])},
+         "embedding": embedding}
+        for chunk, embedding in zip(chunks, embeddings)
+    ]
+
+
+@pytest.fixture
+def index(tmp_path, registry):
+    chunks = make_chunks()
+    build_quantized_index(_docs(registry, chunks, embed([c["text"] for c in chunks])), tmp_path / "quantized")
+    return QuantizedIndex(tmp_path / "quantized", registry, embedding_function=embed)
+
+
+def test_build_groups_rows_by_department(index):
+    manifest = json.loads((index.index_dir / QUANTIZED_MANIFEST).read_text())
+
+    assert manifest["count"] == 4 * len(DEPARTMENTS)
+    assert manifest["departments"]["engineering"] == [0, 4]
+    assert np.load(index.index_dir / manifest["files"]["vectors"]).dtype == np.int8
+    assert index_is_current(index.index_dir)
+
+
+def test_query_returns_only_the_roles_departments(index):
+    [hits] = index.query("Finance_Team", 8, query_texts=["finance document 1 about finance topic number 1"])
+
+    assert hits[0]["id"] == "finance-1"
+    assert hits[0]["distance"] == pytest.approx(0.0, abs=0.01)
+    assert {h["metadata"]["department"] for h in hits} == {"general", "finance"}
+
+
+def test_unknown_roles_get_nothing(index):
+    assert index.query("Nobody", 5, query_texts=["finance"]) == [[]]
+
+
+def test_access_masks_guard_against_a_stale_role_mapping(index, registry):
+    registry.register({"Finance_Team": ["general"]})
+
+    class _StaleRoles:
+        def get(self, role, default=None):
+            return ["general", "finance"]
+
+        def allowed(self, role, masks):
+            return registry.allowed(role, masks)
+
+    index.registry = _StaleRoles()
+    [hits] = index.query("Finance_Team", 8, query_texts=["finance document 1"])
+    assert {h["metadata"]["department"] for h in hits} == {"general"}
+
+
+def test_int8_recall_against_exact_search(tmp_path, registry):
+    rng = np.random.default_rng(0)
+    chunks = [
+        {"id": f"doc-{i}", "text": f"doc {i}", "metadata": {"department": DEPARTMENTS[i % len(DEPARTMENTS)]}}
+        for i in range(500)
+    ]
+    vectors = rng.normal(size=(500, 32)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    queries = rng.normal(size=(20, 32)).astype(np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+
+    docs = _docs(registry, chunks, vectors.tolist())
+    exact = np.argsort(-(queries @ vectors.T), axis=1)[:, :10]
+    for keep_float32, min_recall in ((False, 0.9), (True, 1.0)):
+        index_dir = tmp_path / f"q{keep_float32}"
+        build_quantized_index(docs, index_dir, keep_float32=keep_float32)
+        results = QuantizedIndex(index_dir, registry).query("God_Tier_Admins", 10, query_embeddings=queries.tolist())
+
+        found = [{int(h["id"].split("-")[1]) for h in hits} for hits in results]
+        recall = np.mean([len(f & set(e)) / 10 for f, e in zip(found, exact)])
+        assert recall >= min_recall
+
+
+def test_distances_match_the_collection_space():
+    assert similarity_to_distance(1.0, "l2") == 0.0
+    assert similarity_to_distance(0.0, "l2") == 2.0
+    assert similarity_to_distance(0.25, "cosine") == 0.75
+
+
+def test_an_empty_index_answers_with_no_hits(tmp_path, registry):
+    build_quantized_index([], tmp_path / "quantized")
+    index = QuantizedIndex(tmp_path / "quantized", registry)
+
+    assert index.count() == 0
+    assert index.query("God_Tier_Admins", 5, query_embeddings=[[1.0, 0.0]]) == [[]]
+
+
+def test_rebuilds_remove_the_previous_files(index, registry):
+    before = {p.name for p in index.index_dir.iterdir()}
+    chunks = make_chunks(per_department=1)
+    build_quantized_index(_docs(registry, chunks, embed([c["text"] for c in chunks])), index.index_dir)
+
+    after = {p.name for p in index.index_dir.iterdir()}
+    assert before & after == {QUANTIZED_MANIFEST}
+    assert index.count() == len(DEPARTMENTS)
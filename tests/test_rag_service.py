@@ -0,0 +1,116 @@
+import asyncio
+import contextvars
+import time
+from app.services.rag_service import RAGService
+from app.utils.cache import AnswerCache
+from app.utils.concurrency import run_blocking
+from app.utils.llm import LLMClient, LocalBackend
+
+QUERY = "finance document 1 about finance topic number 1"
+
+
+def local_llm(latency_ms=0.0):
+    return LLMClient(LocalBackend(latency_ms=latency_ms, jitter_ms=0.0))
+
+
+def test_query_answers_from_the_roles_chunks(router):
+    service = RAGService(router, local_llm())
+
+    answer, sources = service.query("Finance_Team", QUERY)
+
+    assert sources[0] == "finance.md"
+    assert "finance document 1" in answer
+
+
+def test_aquery_matches_query(router):
+    service = RAGService(router, local_llm())
+
+    assert asyncio.run(service.aquery("Finance_Team", QUERY)) == service.query("Finance_Team", QUERY)
+
+
+def test_concurrent_aqueries_overlap_their_llm_calls(router):
+    service = RAGService(router, local_llm(latency_ms=200))
+
+    async def run():
+        return await asyncio.gather(*(service.aquery("Finance_Team", QUERY) for _ in range(8)))
+
+    started = time.perf_counter()
+    answers = asyncio.run(run())
+
+    assert len({answer for answer, _ in answers}) == 1
+    # one after another this takes 8 x 200 ms
+    assert time.perf_counter() - started < 1.0
+
+
+def test_plain_callable_llm_runs_off_the_event_loop(router):
+    loop_threads = []
+
+    def llm(prompt):
+        try:
+            asyncio.get_running_loop()
+            loop_threads.append(True)
+        except RuntimeError:
+            pass
+        return "answer"
+
+    answer, _ = asyncio.run(RAGService(router, llm).aquery("Finance_Team", QUERY))
+
+    assert answer == "answer"
+    assert loop_threads == []
+
+
+def test_run_blocking_carries_the_callers_context():
+    var = contextvars.ContextVar("var", default=None)
+
+    async def run():
+        var.set("pinned")
+        return await run_blocking(var.get)
+
+    assert asyncio.run(run()) == "pinned"
+
+
+def test_unknown_role_gets_no_documents(router):
+    answer, sources = asyncio.run(RAGService(router, local_llm()).aquery("Intern", QUERY))
+
+    assert sources == []
+    assert answer == "No documents available to generate an answer."
+
+
+class _FailingStream:
+    """
+    An LLM whose stream breaks after its first piece.
+    """
+
+    def __call__(self, prompt):
+        return "answer"
+
+    async def astream(self, prompt):
+        yield "partial"
+        raise ValueError("stream broke")
+
+
+async def _events(service, role, query):
+    return [event async for event in service.astream_query(role, query)]
+
+
+def test_stream_sends_sources_then_tokens_then_done(router):
+    service = RAGService(router, local_llm(), answer_cache=AnswerCache())
+
+    first = asyncio.run(_events(service, "Finance_Team", QUERY))
+    second = asyncio.run(_events(service, "Finance_Team", QUERY))
+
+    for events in (first, second):
+        assert events[0] == {"type": "sources", "sources": ["finance.md"]}
+        assert {e["type"] for e in events[1:-1]} == {"token"}
+    assert first[-1]["type"] == "done" and first[-1]["cached"] is False and first[-1]["prompt_tokens"] > 0
+    assert second[-1] == {"type": "done", "cached": True, "prompt_tokens": 0}
+    assert "".join(e["text"] for e in first[1:-1]).strip() == service.query("Finance_Team", QUERY)[0]
+
+
+def test_stream_reports_a_broken_llm_stream_in_band(router):
+    events = asyncio.run(_events(RAGService(router, _FailingStream()), "Finance_Team", QUERY))
+
+    text = "".join(e["text"] for e in events if e["type"] == "token")
+    assert text.startswith("partial")
+    assert len(text) > len("partial")
+    assert events[-1]["type"] == "done"
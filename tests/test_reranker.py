@@ -0,0 +1,110 @@
+import asyncio
+import threading
+import time
+from app.utils.reranker import CrossEncoderReranker
+
+
+class _LengthModel:
+    """
+    Cross-encoder stand-in: longer documents score higher, after an optional delay.
+    """
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.batches = []
+
+    def predict(self, pairs, batch_size=32):
+        self.batches.append(len(pairs))
+        time.sleep(self.delay)
+        return [float(len(doc)) for _, doc in pairs]
+
+
+def _reranker(model, **kwargs):
+    reranker = CrossEncoderReranker(**kwargs)
+    reranker._model = model
+    return reranker
+
+
+def _hits(*documents):
+    return [{"id": f"c{i}", "document": doc, "metadata": {}, "distance": 0.1 * i} for i, doc in enumerate(documents)]
+
+
+def test_rerank_orders_by_score_in_one_batch():
+    model = _LengthModel()
+    reranker = _reranker(model, budget_ms=1000)
+
+    reranked = reranker.rerank("q", _hits("a", "ccc", "bb"), top_k=2)
+
+    assert [h["id"] for h in reranked] == ["c1", "c2"]
+    assert reranked[0]["rerank_score"] == 3.0
+    assert model.batches == [3]
+    assert reranker.stats()["reranked"] == 1
+
+
+def test_min_score_drops_weak_candidates():
+    reranker = _reranker(_LengthModel(), budget_ms=1000, min_score=2.0)
+
+    assert [h["id"] for h in reranker.rerank("q", _hits("a", "ccc", "bb"), top_k=3)] == ["c1", "c2"]
+
+
+def test_over_budget_passes_fall_back_to_retrieval_order():
+    reranker = _reranker(_LengthModel(delay=0.2), budget_ms=20)
+    hits = _hits("a", "ccc", "bb")
+
+    assert reranker.rerank("q", hits, top_k=2) == hits[:2]
+    assert reranker.stats()["fallbacks"] == 1
+
+
+def test_async_rerank_falls_back_on_the_budget_too():
+    reranker = _reranker(_LengthModel(delay=0.2), budget_ms=20)
+    hits = _hits("a", "ccc", "bb")
+
+    assert asyncio.run(reranker.arerank("q", hits, top_k=2)) == hits[:2]
+    assert asyncio.run(_reranker(_LengthModel(), budget_ms=1000).arerank("q", hits, top_k=1))[0]["id"] == "c1"
+
+
+def test_batch_size_is_capped_from_the_observed_cost_per_pair():
+    model = _LengthModel()
+    reranker = _reranker(model, budget_ms=100, max_candidates=20)
+    reranker._ms_per_pair = 25.0
+
+    reranked = reranker.rerank("q", _hits(*"abcdefgh"), top_k=8)
+
+    assert model.batches == [4]
+    # candidates past the budget keep their order behind the reranked ones
+    assert [h["id"] for h in reranked[4:]] == ["c4", "c5", "c6", "c7"]
+
+
+def test_busy_reranker_falls_back_at_once():
+    release = threading.Event()
+
+    class _Blocking(_LengthModel):
+        def predict(self, pairs, batch_size=32):
+            release.wait(5)
+            return super().predict(pairs, batch_size)
+
+    reranker = _reranker(_Blocking(), budget_ms=2000, max_pending=1)
+    hits = _hits("a", "ccc")
+    first = threading.Thread(target=reranker.rerank, args=("q", hits, 2))
+    first.start()
+    while reranker.stats()["pending"] == 0:
+        time.sleep(0.001)
+
+    started = time.perf_counter()
+    assert reranker.rerank("q", hits, top_k=2) == hits
+    assert time.perf_counter() - started < 0.5
+    assert reranker.stats()["busy_fallbacks"] == 1
+
+    release.set()
+    first.join()
+
+
+def test_failing_model_falls_back():
+    class _Broken:
+        def predict(self, pairs, batch_size=32):
+            raise RuntimeError("model failed")
+
+    reranker = _reranker(_Broken(), budget_ms=1000)
+    hits = _hits("a", "ccc")
+
+    assert reranker.rerank("q", hits, top_k=1) == hits[:1]
@@ -0,0 +1,67 @@
+import pytest
+from src.retrieval import ROLE_HIERARCHY, query_authorized
+from tests.conftest import embed
+
+
+class _UnfilteredOnly:
+    """
+    A collection whose filtered query raises, as HNSW can for very selective filters.
+    """
+
+    def __init__(self, collection):
+        self.collection = collection
+        self.gets = []
+
+    def query(self, **kwargs):
+        if "where" in kwargs:
+            raise RuntimeError("filtered search failed")
+        return self.collection.query(**kwargs)
+
+    def get(self, **kwargs):
+        self.gets.append(kwargs)
+        return self.collection.get(**kwargs)
+
+    def count(self):
+        return self.collection.count()
+
+
+@pytest.mark.parametrize("role", sorted(ROLE_HIERARCHY))
+def test_hits_are_limited_to_the_roles_departments(collection, registry, role):
+    hits = query_authorized(collection, role, 10, query_embeddings=embed(["finance document topic"]), registry=registry)[0]
+
+    assert hits
+    assert {h["metadata"]["department"] for h in hits} <= set(ROLE_HIERARCHY[role])
+    assert len(hits) == min(10, 4 * len(ROLE_HIERARCHY[role]))
+
+
+def test_hits_are_ordered_by_distance(collection, registry):
+    hits = query_authorized(collection, "God_Tier_Admins", 5, query_embeddings=embed(["hr document 2"]), registry=registry)[0]
+
+    distances = [h["distance"] for h in hits]
+    assert distances == sorted(distances)
+    assert hits[0]["id"] == "hr-2"
+
+
+def test_unknown_role_gets_nothing(collection, registry):
+    assert query_authorized(collection, "Intern", 5, query_embeddings=embed(["finance"]), registry=registry) == [[]]
+
+
+def test_failed_filtered_query_falls_back_to_post_filtering(collection, registry):
+    wrapped = _UnfilteredOnly(collection)
+
+    hits = query_authorized(
+        wrapped, "Finance_Team", 6, query_embeddings=embed(["engineering document", "hr document"]), registry=registry,
+    )
+
+    assert [len(h) for h in hits] == [6, 6]
+    assert all(h["metadata"]["department"] in ("general", "finance") for q in hits for h in q)
+
+
+def test_fallback_count_check_reads_at_most_n_results_ids(collection, registry):
+    wrapped = _UnfilteredOnly(collection)
+
+    # Employee_Level reads 4 chunks, fewer than asked for: the search widens until none are left
+    hits = query_authorized(wrapped, "Employee_Level", 10, query_embeddings=embed(["finance"]), registry=registry)[0]
+
+    assert sorted(h["id"] for h in hits) == [f"general-{i}" for i in range(4)]
+    assert [g["limit"] for g in wrapped.gets] == [10]
@@ -0,0 +1,110 @@
+import json
+import chromadb
+import pytest
+from src import roles
+from src.retrieval import ACCESS_FILE, ROLE_HIERARCHY, RoleRegistry, query_authorized, role_where
+from src.snapshots import SNAPSHOTS_DIR, create_snapshot, current_snapshot, finish_snapshot, list_snapshots, publish_snapshot
+from tests.conftest import embed, make_chunks
+
+
+def test_role_masks_or_the_bits_of_their_groups(registry):
+    groups = registry.groups()
+
+    assert sorted(groups.values()) == list(range(5))
+    assert registry.role_mask("Finance_Team") == registry.group_mask("general") | registry.group_mask("finance")
+    assert registry.role_mask("Intern") == 0
+    assert registry.allowed("Finance_Team", [registry.group_mask("finance"), registry.group_mask("hr")]).tolist() == [
+        True, False,
+    ]
+    assert registry.roles_for_mask(registry.group_mask("hr")) == ["HR_Team", "God_Tier_Admins"]
+
+
+def test_group_bits_are_append_only(registry):
+    before = registry.groups()
+    registry.register({"Legal_Team": ["general", "legal"]})
+
+    after = registry.groups()
+    assert {g: after[g] for g in before} == before
+    assert after["legal"] == max(before.values()) + 1
+
+
+def test_removing_a_role_keeps_the_group_bits(registry):
+    before = registry.groups()
+    registry.remove_role("HR_Team")
+
+    assert "HR_Team" not in registry
+    assert registry.role_mask("HR_Team") == 0
+    assert registry.groups() == before
+
+
+def test_other_processes_see_changes_to_the_file(registry):
+    reader = RoleRegistry(registry.path)
+    assert "Legal_Team" not in reader
+
+    registry.register({"Legal_Team": ["general"]})
+
+    assert reader.get("Legal_Team") == ["general"]
+
+
+def test_chroma_filter_uses_one_mask_per_group(registry):
+    assert role_where("Finance_Team", registry) == {
+        "access_mask": {"$in": sorted([registry.group_mask("general"), registry.group_mask("finance")])}
+    }
+
+
+def test_without_the_file_chunks_are_filtered_on_legacy_role_flags(tmp_path):
+    registry = RoleRegistry(tmp_path / ACCESS_FILE, default_roles=ROLE_HIERARCHY)
+    chunks = make_chunks(per_department=2)
+    collection = chromadb.PersistentClient(path=str(tmp_path / "legacy")).get_or_create_collection(
+        name="corporate_documents", embedding_function=None,
+    )
+    collection.add(
+        ids=[c["id"] for c in chunks],
+        documents=[c["text"] for c in chunks],
+        embeddings=embed([c["text"] for c in chunks]),
+        metadatas=[
+            {**c["metadata"], **{f"role_{role}": c["metadata"]["department"] in groups
+                                 for role, groups in ROLE_HIERARCHY.items()}}
+            for c in chunks
+        ],
+    )
+
+    assert registry.legacy
+    assert role_where("HR_Team", registry) == {"role_HR_Team": True}
+    hits = query_authorized(collection, "HR_Team", 10, query_embeddings=embed(["hr document"]), registry=registry)[0]
+    assert {h["metadata"]["department"] for h in hits} == {"general", "hr"}
+
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(roles, "ROOT_DATA_DIR", tmp_path)
+    monkeypatch.setattr(roles, "CHROMA_DB_PATH", tmp_path / "chroma_db")
+    return tmp_path
+
+
+def test_change_roles_rewrites_chroma_db_without_snapshots(data_dir):
+    registry = roles.change_roles(lambda r: r.register({"Legal_Team": ["general"]}))
+
+    assert registry.path == data_dir / "chroma_db" / ACCESS_FILE
+    assert json.loads(registry.path.read_text())["roles"]["Legal_Team"] == ["general"]
+
+
+def test_change_roles_publishes_a_new_snapshot(data_dir):
+    root = data_dir / SNAPSHOTS_DIR
+    live = create_snapshot(root)
+    RoleRegistry(live / ACCESS_FILE).register(ROLE_HIERARCHY)
+    (live / "chroma.sqlite3").write_text("index")
+    finish_snapshot(live, {"chunks": 20})
+    publish_snapshot(root, live.name)
+
+    registry = roles.change_roles(lambda r: r.register({"Legal_Team": ["general"]}))
+
+    new = current_snapshot(root)
+    assert new != live.name
+    assert registry.path == root / new / ACCESS_FILE
+    assert (root / new / "chroma.sqlite3").read_text() == "index"
+    # the published snapshot is never written to
+    assert "Legal_Team" not in RoleRegistry(live / ACCESS_FILE)
+    info = next(s for s in list_snapshots(root) if s["name"] == new)
+    assert (info["base"], info["chunks"], info["roles_changed"]) == (live.name, 20, True)
+    assert roles.live_registry().get("Legal_Team") == ["general"]
@@ -0,0 +1,127 @@
+import os
+import tempfile
+import threading
+from multiprocessing.connection import AuthenticationError
+import pytest
+from app.utils import vector_store
+from app.utils.search_service import (
+    SearchServer, SearchServiceClient, check_address, parse_address, require_authkey,
+)
+from app.utils.vector_store import DepartmentRouter, SnapshotManager
+from src.snapshots import create_snapshot, finish_snapshot, publish_snapshot
+from tests.conftest import embed
+
+AUTHKEY = "test-secret"
+
+
+class _RecordingStore(DepartmentRouter):
+    """
+    Answers every search with the name of the snapshot it was served from.
+    """
+
+    def __init__(self):
+        self.calls = []
+
+    def query(self, role, n_results, query_texts=None, query_embeddings=None):
+        if role == "Broken":
+            raise KeyError(role)
+        self.calls.append(len(query_embeddings[0]))
+        return [[{"id": vector_store.snapshots.active().name, "role": role}] for _ in query_embeddings]
+
+
+@pytest.fixture
+def snapshot_names(tmp_path, monkeypatch):
+    """
+    Two finished snapshots, the first one live, behind a SnapshotManager the service uses.
+    """
+    root = tmp_path / "snapshots"
+    names = []
+    for _ in range(2):
+        path = create_snapshot(root)
+        finish_snapshot(path, {})
+        names.append(path.name)
+    publish_snapshot(root, names[0])
+    monkeypatch.setattr(vector_store, "snapshots", SnapshotManager(root, tmp_path / "chroma_db"))
+    return names
+
+
+@pytest.fixture
+def service(snapshot_names):
+    # a short private (0700) directory: socket paths are limited to ~100 characters. It is
+    # left in the tests' data directory, since the listener removes its socket at exit
+    directory = tempfile.mkdtemp(prefix="ss-", dir=os.environ["ROOT_DATA_DIR"])
+    address = os.path.join(directory, "search.sock")
+    store = _RecordingStore()
+    server = SearchServer(address, embed, store, authkey=AUTHKEY)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    client = SearchServiceClient(address, AUTHKEY, connect_timeout_s=5, request_timeout_s=5)
+    return client, server, store
+
+
+def test_parse_address():
+    assert parse_address("127.0.0.1:7000") == ("127.0.0.1", 7000)
+    assert parse_address(":7000") == ("127.0.0.1", 7000)
+    assert parse_address("/run/rag/search.sock") == "/run/rag/search.sock"
+
+
+def test_an_authkey_is_required():
+    with pytest.raises(ValueError):
+        require_authkey("")
+    assert require_authkey("secret") == b"secret"
+
+
+def test_addresses_others_could_reach_are_refused(tmp_path):
+    check_address(("127.0.0.1", 7000))
+    check_address(("10.0.0.5", 7000), allow_remote=True)
+    with pytest.raises(ValueError):
+        check_address(("10.0.0.5", 7000))
+
+    shared = tmp_path / "shared"
+    shared.mkdir(mode=0o755)
+    shared.chmod(0o755)
+    with pytest.raises(ValueError):
+        check_address(str(shared / "search.sock"))
+
+
+def test_client_embeds_and_searches_through_the_service(service):
+    client, server, store = service
+
+    assert client(["leave policy"]) == embed(["leave policy"])
+    [hits] = client.query("HR_Team", 3, query_texts=["leave policy"])
+
+    assert hits[0]["role"] == "HR_Team"
+    assert store.calls == [64]  # the service embedded the text itself
+
+
+def test_the_service_searches_the_snapshot_the_worker_names(service, snapshot_names):
+    client, _, _ = service
+    live, newer = snapshot_names
+
+    assert client.query("HR_Team", 1, query_embeddings=[[1.0]])[0][0]["id"] == live
+    assert client.query("HR_Team", 1, query_embeddings=[[1.0]], snapshot=newer)[0][0]["id"] == newer
+    # a pruned or unknown snapshot falls back to the live one
+    assert client.query("HR_Team", 1, query_embeddings=[[1.0]], snapshot="gone")[0][0]["id"] == live
+
+
+def test_errors_are_reported_to_the_caller_and_counted(service):
+    client, _, _ = service
+
+    with pytest.raises(RuntimeError, match="KeyError"):
+        client.query("Broken", 1, query_embeddings=[[1.0]])
+    # the connection survives the error
+    client(["again"])
+
+    stats = client.stats()
+    assert stats["calls"] == 2
+    assert stats["service"]["errors"] == 1
+    assert stats["service"]["requests"] == 3  # including the stats request itself
+    assert stats["idle_connections"] == 1
+
+
+def test_a_wrong_authkey_is_rejected(service):
+    client, _, _ = service
+    intruder = SearchServiceClient(str(client.address), "wrong", connect_timeout_s=1)
+
+    with pytest.raises(AuthenticationError):
+        intruder(["text"])
+    assert client(["text"]) == embed(["text"])
@@ -0,0 +1,209 @@
+import os
+import time
+import pytest
+from app.utils.cache import AnswerCache
+from app.utils.vector_store import INGEST_VERSION_FILE, SnapshotManager
+from src.snapshots import (
+    CURRENT_FILE, create_snapshot, current_snapshot, finish_snapshot, list_snapshots, prune_snapshots,
+    publish_snapshot,
+)
+
+
+def _snapshot(root, version):
+    path = create_snapshot(root)
+    (path / INGEST_VERSION_FILE).write_text(version, encoding="utf-8")
+    finish_snapshot(path, {"chunks": 1})
+    return path.name
+
+
+@pytest.fixture
+def root(tmp_path):
+    return tmp_path / "snapshots"
+
+
+@pytest.fixture
+def manager(root, tmp_path):
+    old = _snapshot(root, "v1")
+    publish_snapshot(root, old)
+    return SnapshotManager(root, tmp_path / "chroma_db")
+
+
+def test_only_finished_snapshots_can_be_published(root):
+    unfinished = create_snapshot(root)
+
+    with pytest.raises(ValueError):
+        publish_snapshot(root, unfinished.name)
+    assert current_snapshot(root) is None
+
+    name = _snapshot(root, "v1")
+    publish_snapshot(root, name)
+    assert current_snapshot(root) == name
+    assert [(s["name"], s["finished"], s["live"]) for s in list_snapshots(root)] == sorted(
+        [(unfinished.name, False, False), (name, True, True)]
+    )
+
+
+def test_prune_keeps_the_newest_and_the_live_snapshot(root):
+    # names made within one second sort by their random suffix, so order them as prune does
+    names = sorted(_snapshot(root, f"v{i}") for i in range(4))
+    publish_snapshot(root, names[0])
+    running = create_snapshot(root)
+
+    assert prune_snapshots(root, keep=2) == [names[1]]
+    assert [s["name"] for s in list_snapshots(root)] == sorted([names[0], names[2], names[3], running.name])
+
+    # a failed run's leftover directory is removed once it is old enough
+    old = time.time() - 7200
+    os.utime(running, (old, old))
+    assert prune_snapshots(root, keep=2) == [running.name]
+
+
+def test_without_snapshots_the_legacy_directory_is_served(tmp_path):
+    manager = SnapshotManager(tmp_path / "snapshots", tmp_path / "chroma_db")
+
+    assert manager.current().name == "chroma_db"
+    assert manager.refresh() is False
+
+
+def test_a_swap_lets_pinned_requests_finish_on_the_old_snapshot(manager, root):
+    old = manager.current()
+    with manager.pin() as pinned:
+        new = _snapshot(root, "v2")
+        publish_snapshot(root, new)
+        assert manager.refresh()
+
+        # the running request still reads the old snapshot; new ones get the new one
+        assert manager.active() is pinned is old
+        assert manager.current().name == new
+        assert not old.closed
+        assert manager.stats()["draining"] == {old.name: 1}
+
+    assert old.closed
+    assert manager.stats()["draining"] == {}
+    with manager.pin() as pinned:
+        assert pinned.name == new
+
+
+def test_pinning_a_closed_snapshot_pins_the_live_one(manager, root):
+    old = manager.current()
+    publish_snapshot(root, _snapshot(root, "v2"))
+    manager.refresh()
+
+    assert old.closed
+    with manager.pin(old) as pinned:
+        assert pinned is manager.current()
+
+
+def test_caches_miss_after_a_swap(manager, root):
+    cache = AnswerCache(version_fn=lambda: manager.active().version)
+    cache.put("HR_Team", "leave policy", ["a"], "v1 answer")
+
+    with manager.pin():
+        publish_snapshot(root, _snapshot(root, "v2"))
+        manager.refresh()
+        # a request that started before the swap still gets its answer
+        assert cache.get("HR_Team", "leave policy", ["a"]) == "v1 answer"
+
+    assert manager.active().version == "v2"
+    assert cache.get("HR_Team", "leave policy", ["a"]) is None
+
+
+def test_activate_rolls_back_and_publishes(manager, root):
+    old = manager.current().name
+    publish_snapshot(root, _snapshot(root, "v2"))
+    manager.refresh()
+
+    assert manager.activate(old).name == old
+    assert current_snapshot(root) == old
+    assert manager.swaps == 2
+
+
+def test_activate_refuses_unknown_and_unfinished_snapshots(manager, root):
+    with pytest.raises(ValueError):
+        manager.activate("missing")
+    with pytest.raises(ValueError):
+        manager.activate(create_snapshot(root).name)
+
+
+def test_a_snapshot_that_fails_to_warm_up_is_not_published(manager, root):
+    live = manager.current().name
+    new = _snapshot(root, "v2")
+
+    def warm(snapshot):
+        raise RuntimeError("index is corrupt")
+
+    manager.warm = warm
+    with pytest.raises(RuntimeError):
+        manager.activate(new)
+    assert manager.current().name == live
+    assert current_snapshot(root) == live
+
+
+def test_the_service_can_open_a_snapshot_before_swapping_to_it(manager, root):
+    new = _snapshot(root, "v2")
+
+    opened = manager.snapshot(new)
+    assert opened.name == new and manager.current().name != new
+    assert manager.snapshot(new) is opened
+    assert manager.snapshot("pruned-long-ago") is manager.current()
+
+    publish_snapshot(root, new)
+    manager.refresh()
+    # the swap reuses the snapshot opened by name instead of opening it twice
+    assert manager.current() is opened
+
+
+def test_full_snapshot_ingestion_publishes_a_new_snapshot(ingestion):
+    root = ingestion.data_dir / "snapshots"
+
+    first = ingestion.module.run_snapshot_ingestion(keep=2)
+    second = ingestion.module.run_snapshot_ingestion(keep=2)
+
+    assert current_snapshot(root) == second.name
+    info = {s["name"]: s for s in list_snapshots(root)}
+    assert info[first.name]["finished"] and info[second.name]["chunks"] == info[first.name]["chunks"] > 0
+
+
+def test_an_empty_ingestion_leaves_the_live_snapshot_alone(ingestion):
+    root = ingestion.data_dir / "snapshots"
+    live = ingestion.module.run_snapshot_ingestion()
+    for path in ingestion.data_dir.glob("*/*.md"):
+        path.unlink()
+
+    assert ingestion.module.run_snapshot_ingestion() is None
+    assert (root / CURRENT_FILE).read_text() == live.name
+    assert [s["name"] for s in list_snapshots(root)] == [live.name]
+
+
+@pytest.fixture
+def admin(api, manager, monkeypatch):
+    from app.routers import admin
+
+    monkeypatch.setattr(admin, "snapshots", manager)
+    monkeypatch.setattr(admin, "ADMIN_TOKEN", "secret")
+    return admin
+
+
+def test_admin_endpoints_need_the_token(api, admin, monkeypatch):
+    assert api.get("/admin/snapshots").status_code == 403
+    assert api.get("/admin/snapshots", headers={"X-Admin-Token": "wrong"}).status_code == 403
+
+    monkeypatch.setattr(admin, "ADMIN_TOKEN", None)
+    response = api.get("/admin/snapshots", headers={"X-Admin-Token": "secret"})
+    assert response.status_code == 403
+    assert "disabled" in response.json()["detail"]
+
+
+def test_admin_endpoints_list_reload_and_activate(api, admin, manager, root):
+    headers = {"X-Admin-Token": "secret"}
+    old = manager.current().name
+
+    assert api.get("/admin/snapshots", headers=headers).json()["live"] == old
+
+    new = _snapshot(root, "v2")
+    publish_snapshot(root, new)
+    reloaded = api.post("/admin/snapshots/reload", headers=headers).json()
+    assert (reloaded["swapped"], reloaded["live"]) == (True, new)
+
+    assert api.post(f"/admin/snapshots/{old}/activate", headers=headers).json()["live"] == old
+    assert api.post("/admin/snapshots/missing/activate", headers=headers).status_code == 404
@@ -0,0 +1,97 @@
+import threading
+import time
+from app.utils.vector_store import LazyResource, SnapshotResource, resolve
+from app.utils.warmup import Readiness
+
+
+class _Slow:
+    def __init__(self):
+        time.sleep(0.05)
+        self.value = 42
+
+    def __call__(self, x):
+        return x + 1
+
+
+def test_lazy_resource_builds_on_first_use_only():
+    built = []
+    resource = LazyResource(lambda: built.append(1) or _Slow())
+
+    assert not resource.loaded and built == []
+    assert resource.value == 42
+    assert resource(1) == 2
+    assert resolve(resource) is resource.get()
+    assert built == [1]
+
+
+def test_concurrent_first_uses_wait_for_one_build():
+    built = []
+    resource = LazyResource(lambda: built.append(1) or _Slow())
+
+    threads = [threading.Thread(target=resource.get) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert built == [1]
+
+
+def test_snapshot_resource_follows_the_active_snapshot():
+    class _Snapshot:
+        def __init__(self, name):
+            self.hr_table = LazyResource(lambda: f"{name} table")
+
+    class _Manager:
+        current = _Snapshot("old")
+
+        def active(self):
+            return self.current
+
+    manager = _Manager()
+    resource = SnapshotResource(manager, "hr_table")
+
+    assert not resource.loaded
+    assert resource.get() == "old table"
+    assert resource.loaded
+
+    manager.current = _Snapshot("new")
+    assert not resource.loaded
+    assert resolve(resource) == "new table"
+
+
+def test_readiness_reports_failed_steps_and_still_runs_the_rest():
+    readiness = Readiness()
+    readiness.mark_imported(1.23456)
+    ran = []
+
+    def broken():
+        raise RuntimeError("model missing")
+
+    readiness.run({"embedding_model": broken, "vector_store": lambda: ran.append("vector_store")})
+
+    status = readiness.status()
+    assert not status["ready"]
+    assert status["error"] == "embedding_model: model missing"
+    assert set(status["warmup_seconds"]) == {"embedding_model", "vector_store"}
+    assert ran == ["vector_store"]
+    assert status["import_seconds"] == 1.235
+
+
+def test_readiness_is_ready_once_every_step_succeeds():
+    readiness = Readiness()
+    readiness.mark_imported(0.1)
+    readiness.run({"bm25_index": lambda: None})
+
+    assert readiness.ready and readiness.ready_after_seconds is not None
+
+
+def test_the_app_starts_without_loading_the_embedding_model(api):
+    from src.retrieval import embedding_model_loaded
+
+    response = api.get("/health/ready")
+
+    # WARMUP=false in the tests: nothing is loaded until a request needs it
+    assert response.status_code == 200
+    assert response.json()["ready"]
+    assert not embedding_model_loaded()
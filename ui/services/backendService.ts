@@ -16,7 +16,7 @@ export const fetchSessions = async (
     onChunk: (text: string) => void
 ) => {
     try {
-        const response = await fetch(`${API_URL}/rag/query`, {
+        const response = await fetch(`${API_URL}/rag/query/stream`, {
             method: "POST",
             headers: {
                 "Content-Type": "application/json",
@@ -27,19 +27,44 @@ export const fetchSessions = async (
             }),
         });
 
-        if (!response.ok) {
+        if (!response.ok || !response.body) {
             throw new Error(`API ERROR: ${response.status} ${response.statusText}`);
         }
 
-        const data = await response.json();
+        // NDJSON events: one "sources", then "token"s as they are generated, then "done"
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffered = "";
+        let answer = "";
+        let sources: string[] = [];
 
-        // Stream the answer text
-        onChunk(data.answer);
+        const handleLine = (line: string) => {
+            if (!line.trim()) return;
+            const event = JSON.parse(line);
+            if (event.type === "sources") {
+                sources = event.sources || [];
+            } else if (event.type === "token") {
+                answer += event.text;
+                onChunk(event.text);
+            } else if (event.type === "error") {
+                throw new Error(`API ERROR: ${event.detail}`);
+            }
+        };
+
+        while (true) {
+            const { done, value } = await reader.read();
+            if (done) break;
+            buffered += decoder.decode(value, { stream: true });
+            const lines = buffered.split("\n");
+            buffered = lines.pop() || "";
+            lines.forEach(handleLine);
+        }
+        handleLine(buffered + decoder.decode());
 
         // Return full response with sources
         return {
-            answer: data.answer,
-            sources: data.sources || []
+            answer,
+            sources
         };
     } catch (error) {
         console.error("Error fetching from backend:", error);